@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark for the FastAPI app.
+
+Drives /upload -> /explain -> /create-rag -> WebSocket chat in-process using
+the bundled judgment PDF and sample JPG, with deterministic fake LLM and
+embedding providers (fake_providers.py). Reports p50/p95/p99 latency,
+throughput and RSS growth per stage (plus the process's peak RSS), and writes
+machine-readable JSON.
+
+Usage:
+    python benchmark.py --iterations 20 --llm-ms 800 --embed-ms 50 --output bench.json
+    python benchmark.py --compare bench_old.json bench_new.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+PDF_FIXTURE = os.path.join(REPO_DIR, "Mr_Vijay_Agarwal_Ors_vs_Harinarayan_G_Bajaj_Ors_on_27_February_2013.PDF")
+JPG_FIXTURE = os.path.join(REPO_DIR, "FMRnxSTagAEkdiX.jpg")
+
+CHAT_QUESTIONS = [
+    "Who are the parties in this case?",
+    "What was the date of the judgment?",
+    "Which sections of which Act were discussed?",
+    "What was the court's final decision?",
+]
+
+
+# ------------------ Measurement helpers ------------------ #
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (only ever grows)."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> float:
+    """Resident set size right now; where /proc is missing, falls back to the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.rss_delta_mb = 0.0
+
+    def record(self, func, *args, **kwargs):
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.errors += 1
+            print(f"  {self.name} error: {e}")
+            result = None
+        elapsed = time.perf_counter() - start
+        self.latencies_ms.append(elapsed * 1000)
+        self.wall_seconds += elapsed
+        # Largest RSS growth across one call of this stage, sampled around it
+        self.rss_delta_mb = max(self.rss_delta_mb, current_rss_mb() - rss_before)
+        return result
+
+    def summary(self) -> Dict:
+        count = len(self.latencies_ms)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(self.latencies_ms, 50), 3),
+            "p95_ms": round(percentile(self.latencies_ms, 95), 3),
+            "p99_ms": round(percentile(self.latencies_ms, 99), 3),
+            "mean_ms": round(sum(self.latencies_ms) / count, 3) if count else 0.0,
+            "throughput_per_s": round(count / self.wall_seconds, 3) if self.wall_seconds else 0.0,
+            "rss_delta_mb": round(self.rss_delta_mb, 1),
+        }
+
+
+# ------------------ App setup ------------------ #
+def load_app(llm_ms: float, embed_ms: float, jitter_ms: float, seed: int):
+    """
+    Imports main.py with fake providers patched in, so no network calls happen.
+    """
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+    from fake_providers import FakeLatency, FakeChatModel, FakeEmbeddings, make_fake_gemini_api
+    import enhanced_tools
+    import rag_updated
+    import main
+
+    llm_latency = FakeLatency(llm_ms, jitter_ms, seed=seed)
+    embed_latency = FakeLatency(embed_ms, jitter_ms / 4, seed=seed + 1)
+
+    enhanced_tools._call_gemini_api = make_fake_gemini_api(llm_latency)
+    rag_updated.get_llm = lambda: FakeChatModel(latency=llm_latency)
+    rag_updated.get_embeddings = lambda: FakeEmbeddings(latency=embed_latency)
+    main.get_embeddings = rag_updated.get_embeddings
+    main.llama_llm = FakeChatModel(latency=llm_latency)  # get_llama_llm() returns it as-is
+    return main.app
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+# ------------------ Benchmark ------------------ #
+def run_benchmark(iterations: int, llm_ms: float, embed_ms: float, jitter_ms: float, seed: int) -> Dict:
+    from fastapi.testclient import TestClient
+
+    app = load_app(llm_ms, embed_ms, jitter_ms, seed)
+    client = TestClient(app)
+    stages = {name: StageStats(name) for name in
+              ["upload_pdf", "upload_jpg", "explain_pdf", "explain_jpg", "create_rag", "chat"]}
+
+    def upload(path: str, content_type: str) -> str:
+        with open(path, "rb") as f:
+            response = client.post("/upload", files={"file": (os.path.basename(path), f, content_type)})
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    def post(url: str):
+        response = client.post(url)
+        response.raise_for_status()
+        return response.json()
+
+    def chat(session_id: str):
+        with client.websocket_connect(f"/ws/{session_id}") as websocket:
+            websocket.receive_text()  # ready message
+            for question in CHAT_QUESTIONS:
+                websocket.send_text(question)
+                answer = websocket.receive_text()
+                if answer.startswith("Error"):
+                    raise RuntimeError(answer)
+
+    for i in range(iterations):
+        print(f"Iteration {i + 1}/{iterations}")
+        pdf_session = stages["upload_pdf"].record(upload, PDF_FIXTURE, "application/pdf")
+        jpg_session = stages["upload_jpg"].record(upload, JPG_FIXTURE, "image/jpeg")
+        if pdf_session:
+            stages["explain_pdf"].record(post, f"/explain/{pdf_session}")
+            created = stages["create_rag"].record(post, f"/create-rag/{pdf_session}")
+            if created:
+                stages["chat"].record(chat, pdf_session)
+            client.delete(f"/session/{pdf_session}")
+        if jpg_session:
+            stages["explain_jpg"].record(post, f"/explain/{jpg_session}")
+            client.delete(f"/session/{jpg_session}")
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"iterations": iterations, "llm_ms": llm_ms, "embed_ms": embed_ms,
+                   "jitter_ms": jitter_ms, "seed": seed, "chat_questions": len(CHAT_QUESTIONS)},
+        "stages": {name: stats.summary() for name, stats in stages.items()},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def print_report(results: Dict):
+    print(f"\nRevision {results['revision']}  ({results['config']})")
+    print(f"{'stage':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'RSS +MB':>10}{'errors':>8}")
+    for name, stats in results["stages"].items():
+        print(f"{name:<14}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+              f"{stats['throughput_per_s']:>10.2f}{stats['rss_delta_mb']:>10.1f}{stats['errors']:>8}")
+    print(f"Process peak RSS: {results['peak_rss_mb']:.1f} MB")
+
+
+def compare(old_path: str, new_path: str):
+    """Prints the change in p50/p95 per stage between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['revision']} -> {new['revision']}")
+    print(f"{'stage':<14}{'p50 old':>10}{'p50 new':>10}{'change':>9}{'p95 old':>10}{'p95 new':>10}{'change':>9}")
+    for name, stats in new["stages"].items():
+        before = old["stages"].get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms"):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            cells.append(f"{before[key]:>10.1f}{stats[key]:>10.1f}{change:>+8.1f}%")
+        print(f"{name:<14}{''.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark with fake providers.")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="Simulated LLM latency per call.")
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="Simulated embedding latency per call.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on LLM latency.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = os.path.abspath(args.output) if args.output else None
+    results = run_benchmark(args.iterations, args.llm_ms, args.embed_ms, args.jitter_ms, args.seed)
+    print_report(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
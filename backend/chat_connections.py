@@ -0,0 +1,171 @@
+"""
+WebSocket connections for the chat, several per session.
+
+Two protocols share /ws/{session_id}:
+
+    text (default, the original protocol)
+        client -> "What is the case number?"
+        server -> "Bot: ..." / "Error: ..."; one question at a time
+
+    json (/ws/{session_id}?protocol=json)
+        client -> {"type": "question", "id": "q1", "text": "..."}
+                  {"type": "cancel", "id": "q1"}
+                  {"type": "pong"}
+        server -> {"type": "ready", "connection_id": ..., "max_in_flight": 4, "heartbeat_seconds": 20}
+                  {"type": "answer", "id": "q1", "question": ..., "answer": ..., "route": ..., "origin": ...}
+                  {"type": "error", "id": "q1", "detail": ...}
+                  {"type": "cancelled", "id": "q1"}
+                  {"type": "ping", "ts": ...}
+
+JSON clients can pipeline up to WS_MAX_IN_FLIGHT questions; answers arrive as
+they finish, in any order, and go to every JSON connection of the session
+(other tabs see the question and the answer, tagged with the asking
+connection's id). Frames are queued per connection (WS_SEND_QUEUE). A client
+that leaves its queue full for WS_SEND_TIMEOUT seconds is disconnected, and it
+does not hold up the other connections. A connection is closed after two missed
+heartbeats while it has nothing in flight.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from uuid import uuid4
+from typing import Dict, List, Optional, Union
+
+from metrics import register, Counter, Gauge
+
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+
+# Close codes
+NORMAL_CLOSURE = 1000
+GOING_AWAY = 1001
+TRY_AGAIN_LATER = 1013
+
+WS_CONNECTIONS = register(Gauge("legal_ai_ws_connections", "Open chat WebSocket connections by protocol."))
+WS_SERVER_CLOSES = register(Counter("legal_ai_ws_server_closes_total",
+                                    "Chat connections closed by the server, by reason (slow_consumer/heartbeat)."))
+
+logger = logging.getLogger(__name__)
+
+Frame = Union[str, dict]
+
+
+class ChatConnection:
+    """One socket: an outbound queue drained by a sender task, and the questions it has in flight."""
+
+    def __init__(self, websocket, session_id: str, protocol: str = "text"):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.protocol = protocol
+        self.id = uuid4().hex[:12]
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+        self.in_flight = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def _send_loop(self):
+        while True:
+            frame = await self.outbox.get()
+            if frame is None:
+                return
+            try:
+                await self.websocket.send_text(json.dumps(frame) if isinstance(frame, dict) else frame)
+            except Exception:
+                # The socket is gone; the receive loop will notice and clean up
+                self.closed = True
+                return
+
+    async def send(self, frame: Frame) -> bool:
+        """Queues a frame. Disconnects the client (and returns False) if its queue stays full."""
+        if self.closed:
+            return False
+        try:
+            await asyncio.wait_for(self.outbox.put(frame), WS_SEND_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Closing slow chat connection", extra={"connection_id": self.id})
+            WS_SERVER_CLOSES.inc(reason="slow_consumer")
+            await self.close(TRY_AGAIN_LATER, flush=False)
+            return False
+
+    async def close(self, code: int = NORMAL_CLOSURE, flush: bool = True):
+        """Stops the sender (after sending what is queued, when flush) and closes the socket."""
+        self.closed = True
+        current = asyncio.current_task()
+        for task in list(self.tasks.values()):
+            if task is not current:
+                task.cancel()
+        sender, self._sender = self._sender, None
+        if sender is None:
+            return
+        if flush and not sender.done():
+            try:
+                self.outbox.put_nowait(None)
+                await asyncio.wait_for(sender, WS_SEND_TIMEOUT)
+            except (asyncio.QueueFull, asyncio.TimeoutError):
+                sender.cancel()
+        else:
+            sender.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # already closed by the client
+
+
+class ConnectionManager:
+    """All chat connections, grouped by session."""
+
+    def __init__(self):
+        self.active_connections: Dict[str, Dict[str, ChatConnection]] = {}
+
+    async def connect(self, websocket, session_id: str, protocol: str = "text") -> ChatConnection:
+        await websocket.accept()
+        connection = ChatConnection(websocket, session_id, protocol)
+        connection.start()
+        self.active_connections.setdefault(session_id, {})[connection.id] = connection
+        WS_CONNECTIONS.inc(protocol=protocol)
+        return connection
+
+    def disconnect(self, connection: ChatConnection):
+        connections = self.active_connections.get(connection.session_id, {})
+        if connections.pop(connection.id, None) is not None:
+            WS_CONNECTIONS.dec(protocol=connection.protocol)
+        if not connections:
+            self.active_connections.pop(connection.session_id, None)
+
+    def connections(self, session_id: str, protocol: Optional[str] = None) -> List[ChatConnection]:
+        return [c for c in self.active_connections.get(session_id, {}).values()
+                if protocol is None or c.protocol == protocol]
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    async def send_personal_message(self, message: str, session_id: str):
+        """Text message to every text-protocol connection of a session."""
+        await asyncio.gather(*(c.send(message) for c in self.connections(session_id, "text")))
+
+    async def broadcast(self, session_id: str, frame: dict):
+        """JSON frame to every JSON connection of a session; a slow one doesn't delay the others."""
+        await asyncio.gather(*(c.send(frame) for c in self.connections(session_id, "json")))
+
+
+async def heartbeat(connection: ChatConnection):
+    """Pings a JSON connection and closes it after two silent intervals with nothing in flight."""
+    while not connection.closed:
+        await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+        idle = time.monotonic() - connection.last_seen
+        if idle > 2 * WS_HEARTBEAT_SECONDS and not connection.tasks:
+            logger.info("Closing silent chat connection", extra={"connection_id": connection.id})
+            WS_SERVER_CLOSES.inc(reason="heartbeat")
+            await connection.close(GOING_AWAY)
+            return
+        await connection.send({"type": "ping", "ts": time.time()})
@@ -0,0 +1,203 @@
+"""
+Bounded per-session chat memory.
+
+    memory = ChatMemory(compact=summarize_turns)
+    query = memory.rewrite("and what about the appellant?")   # local, no LLM
+    history = memory.history()                                 # never more than HISTORY_TOKENS
+    memory.add_turn(question, answer)
+
+Recent turns are kept verbatim up to RECENT_TOKENS. Older turns wait in
+`pending` until COMPACT_BATCH_TURNS of them have piled up, then a background
+worker folds the batch into a rolling summary of at most SUMMARY_TOKENS with
+one model call, so compaction costs one call per batch rather than per turn and
+no chat message waits for it. history() is the summary, as many of the latest
+pending turns as fit, and the recent turns, never more than HISTORY_TOKENS, so
+the prompt size stays flat however long the conversation runs.
+
+Follow-up questions ("and the respondents?", "what about it?") are rewritten
+locally for retrieval by adding the content words of the previous question.
+"""
+import os
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from metrics import register, Counter
+from token_budget import count_tokens, truncate_to_budget
+
+RECENT_TOKENS = int(os.getenv("CHAT_RECENT_TOKENS", "800"))
+SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "400"))
+HISTORY_TOKENS = RECENT_TOKENS + SUMMARY_TOKENS
+COMPACT_BATCH_TURNS = max(1, int(os.getenv("CHAT_COMPACT_BATCH", "4")))
+MAX_ANSWER_TOKENS = 300  # a long answer is stored cut down; the document is in the index anyway
+MAX_FOLLOW_UP_WORDS = 10
+
+FOLLOW_UP = re.compile(r"^(and|also|but|so|then|what about|how about|same|and what about|what of)\b|"
+                       r"\b(it|its|they|them|their|this|that|these|those|he|she|him|her|his|the same|above|"
+                       r"former|latter|there)\b", re.IGNORECASE)
+STOP_WORDS = set("""
+a an the of to in on at for by with and or is are was were be been does do did what which where who whom why how
+when this that it its they them their there about also so then same please tell me can you i we any
+""".split())
+_WORDS = re.compile(r"[A-Za-z0-9][A-Za-z0-9().'/-]*")
+
+logger = logging.getLogger(__name__)
+
+MEMORY_COMPACTIONS = register(Counter("legal_ai_chat_memory_compactions_total",
+                                      "Chat history compactions by method (llm/local) and outcome."))
+QUERY_REWRITES = register(Counter("legal_ai_chat_query_rewrites_total", "Follow-up chat questions rewritten locally."))
+
+_compaction_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def compaction_prompt(summary: str, turns: str) -> str:
+    return f"""
+    You maintain a running summary of a conversation about a legal document. Update the summary
+    with the new exchanges below. Keep the questions asked, the facts established in the answers
+    (names, dates, amounts, sections, page numbers) and anything the user said they care about.
+    Drop pleasantries. Write at most {SUMMARY_TOKENS * 3 // 4} words.
+
+    Current Summary:
+    {summary or "(none)"}
+
+    New Exchanges:
+    {turns}
+    """
+
+
+def format_turns(turns: List[Dict]) -> str:
+    return "\n".join(f"User: {turn['question']}\nAssistant: {turn['answer']}" for turn in turns)
+
+
+def local_compaction(summary: str, turns: List[Dict]) -> str:
+    """No-LLM fallback: keep the latest questions and the first sentence of each answer."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        first_sentence = re.split(r"(?<=[.!?])\s", turn["answer"].strip(), maxsplit=1)[0]
+        lines.append(f"Asked: {turn['question']} Answer: {first_sentence}")
+    return truncate_to_budget("\n".join(lines), SUMMARY_TOKENS)
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _compaction_pool
+    with _pool_lock:
+        if _compaction_pool is None:
+            _compaction_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-compaction")
+        return _compaction_pool
+
+
+class ChatMemory:
+    """History of one chat session. Thread-safe."""
+
+    def __init__(self, compact: Optional[Callable[[str], str]] = None):
+        """`compact` turns compaction_prompt() into a new summary (an LLM call); None compacts locally."""
+        self.compact = compact
+        self.summary = ""
+        self.recent: List[Dict] = []
+        self.pending: List[Dict] = []  # moved out of `recent`, not yet in `summary`
+        self.turns = 0
+        self._compacting = False
+        self._lock = threading.Lock()
+
+    # ------------------ Writing ------------------ #
+    def add_turn(self, question: str, answer: str):
+        answer = truncate_to_budget(answer, MAX_ANSWER_TOKENS)
+        turn = {"question": question, "answer": answer, "tokens": count_tokens(question) + count_tokens(answer) + 4}
+        with self._lock:
+            self.recent.append(turn)
+            self.turns += 1
+            while len(self.recent) > 1 and sum(t["tokens"] for t in self.recent) > RECENT_TOKENS:
+                self.pending.append(self.recent.pop(0))
+            start = len(self.pending) >= COMPACT_BATCH_TURNS and not self._compacting
+            if start:
+                self._compacting = True
+        if start:
+            _pool().submit(self._compact_pending)
+
+    def _compact_pending(self):
+        """Folds pending turns into the summary, a batch per call. Runs on the background worker."""
+        while True:
+            with self._lock:
+                turns, summary = list(self.pending), self.summary
+                if len(turns) < COMPACT_BATCH_TURNS:
+                    self._compacting = False
+                    return
+            method, outcome = "local", "ok"
+            new_summary = None
+            if self.compact is not None:
+                method = "llm"
+                try:
+                    reply = self.compact(compaction_prompt(summary, format_turns(turns))).strip()
+                    if reply and not reply.startswith(("An error occurred", "API Key Missing")):
+                        new_summary = truncate_to_budget(reply, SUMMARY_TOKENS)
+                except Exception:
+                    logger.exception("Chat history compaction failed, compacting locally")
+                if new_summary is None:
+                    outcome = "fallback"
+            if new_summary is None:
+                new_summary = local_compaction(summary, turns)
+            MEMORY_COMPACTIONS.inc(method=method, outcome=outcome)
+            with self._lock:
+                self.summary = new_summary
+                del self.pending[:len(turns)]
+
+    # ------------------ Reading ------------------ #
+    def history(self) -> str:
+        """Summary, latest pending turns and recent turns, at most HISTORY_TOKENS; empty for a new chat."""
+        with self._lock:
+            summary, pending, recent = self.summary, list(self.pending), list(self.recent)
+        parts = []
+        if summary:
+            parts.append("Summary of earlier conversation:\n" + truncate_to_budget(summary, SUMMARY_TOKENS))
+        # Turns not yet compacted fill whatever the summary and recent turns leave, newest first
+        room = HISTORY_TOKENS - sum(count_tokens(part) for part in parts) - sum(t["tokens"] for t in recent)
+        uncompacted = []
+        for turn in reversed(pending):
+            if turn["tokens"] > room:
+                break
+            uncompacted.insert(0, turn)
+            room -= turn["tokens"]
+        if uncompacted or recent:
+            parts.append(format_turns(uncompacted + recent))
+        return truncate_to_budget("\n\n".join(parts), HISTORY_TOKENS)
+
+    def prompt_history(self) -> str:
+        """history() as a section to append to the RAG system prompt ("" for a new chat)."""
+        history = self.history()
+        if not history:
+            return ""
+        return "\n\nConversation so far (use it to understand follow-up questions):\n" + history
+
+    def last_question(self) -> Optional[str]:
+        with self._lock:
+            return self.recent[-1]["question"] if self.recent else None
+
+    def rewrite(self, question: str) -> str:
+        """
+        Standalone version of a follow-up question for retrieval: the question plus
+        the previous question's content words it doesn't already contain.
+        Questions that don't look like follow-ups are returned unchanged.
+        """
+        previous = self.last_question()
+        words = question.split()
+        if not previous or len(words) > MAX_FOLLOW_UP_WORDS or not FOLLOW_UP.search(question):
+            return question
+        present = {word.lower() for word in _WORDS.findall(question)}
+        context = []
+        for word in _WORDS.findall(previous):
+            key = word.lower().strip(".'()/-")
+            if key and key not in STOP_WORDS and key not in present and len(key) > 2 and word not in context:
+                context.append(word.strip("?.,'"))
+        if not context:
+            return question
+        QUERY_REWRITES.inc()
+        return f"{question.rstrip()} (regarding: {' '.join(context)})"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"turns": self.turns, "recent_turns": len(self.recent), "pending_turns": len(self.pending),
+                    "summary_tokens": count_tokens(self.summary),
+                    "recent_tokens": sum(t["tokens"] for t in self.recent)}
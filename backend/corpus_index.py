@@ -0,0 +1,558 @@
+"""
+Persistent, sharded IVF (inverted file) index for the judgment library.
+
+Layout of an index directory:
+
+    manifest.json          shard list, dimension, id counter
+    documents.json         doc_id -> {"ranges": [[first_id, last_id], ...], "hash": ...}
+    tombstones.npy         ids deleted but not yet compacted away
+    shard_00001/
+        vectors.npy        float16, L2-normalised, rows grouped by IVF list (memory-mapped)
+        ids.npy            int64 chunk id per row
+        centroids.npy      float32 IVF centroids for this shard
+        list_offsets.npy   row offsets of each IVF list (nlist + 1)
+        meta.jsonl         {"text", "metadata"} per row
+        meta_offsets.npy   byte offset of each row in meta.jsonl
+
+Shards are immutable once written. New chunks are buffered in memory and
+flushed as a new shard; deletes are tombstones. A background thread merges
+small shards and drops tombstoned rows (compaction). Each shard trains its
+own centroids, so shards never need to agree on a global clustering.
+
+One process at a time may open an index for writing (write.lock, e.g.
+ingest.py); readers such as the server open it with read_only=True and pick
+up the writer's flushes as the manifest changes.
+"""
+import os
+import json
+import time
+import math
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FLUSH_SIZE = 20000          # buffered chunks before writing a new shard
+MAX_SHARDS = 8              # merge the smallest shards when there are more than this
+MAX_SHARD_SIZE = 250000     # merges never produce shards bigger than this
+TOMBSTONE_RATIO = 0.2       # rewrite a shard once this share of its rows is deleted
+DEFAULT_NPROBE = 16
+MAX_TRAIN_SAMPLES = 100000
+REFRESH_SECONDS = 5         # how often read-only instances look for a newer manifest
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means on a sample of the (normalised) vectors.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > MAX_TRAIN_SAMPLES:
+        sample = vectors[rng.choice(len(vectors), MAX_TRAIN_SAMPLES, replace=False)]
+    sample = np.asarray(sample, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        # Re-seed empty lists with random points so no list stays dead
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalise(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch: int = 65536) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+        out[start:start + batch] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+# ------------------ Shard ------------------ #
+class Shard:
+    """One immutable, memory-mapped IVF shard."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.meta_offsets = np.load(os.path.join(path, "meta_offsets.npy"), mmap_mode="r")
+        self._meta_lock = threading.Lock()
+        self._meta_file = open(os.path.join(path, "meta.jsonl"), "rb")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def write(cls, path: str, vectors: np.ndarray, ids: np.ndarray, records: List[Any]) -> "Shard":
+        """
+        Cluster the rows, sort them by IVF list and write a new shard directory.
+        `records` are dicts, or raw meta.jsonl lines when copied from another shard.
+        """
+        vectors = _normalise(vectors)
+        nlist = max(1, min(4096, int(math.sqrt(len(vectors)))))
+        centroids = _train_centroids(vectors, nlist) if nlist > 1 else vectors.mean(axis=0, keepdims=True)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "vectors.npy"), vectors[order].astype(np.float16))
+        np.save(os.path.join(tmp, "ids.npy"), np.asarray(ids, dtype=np.int64)[order])
+        np.save(os.path.join(tmp, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp, "list_offsets.npy"), list_offsets)
+
+        meta_offsets = np.empty(len(order), dtype=np.int64)
+        with open(os.path.join(tmp, "meta.jsonl"), "wb") as f:
+            for row, src in enumerate(order):
+                meta_offsets[row] = f.tell()
+                record = records[src]
+                f.write(record if isinstance(record, bytes) else json.dumps(record).encode("utf-8") + b"\n")
+        np.save(os.path.join(tmp, "meta_offsets.npy"), meta_offsets)
+        os.replace(tmp, path)
+        return cls(path)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int):
+        """Returns (scores, row numbers) of the best k rows among the probed lists."""
+        nlist = len(self.centroids)
+        probe = np.argsort(-(self.centroids @ query))[:min(nprobe, nlist)]
+        rows = np.concatenate([
+            np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in probe
+        ]) if len(probe) else np.empty(0, dtype=np.int64)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32), rows
+
+        # Probed lists are contiguous runs, so this is a handful of sequential mmap reads
+        scores = np.concatenate([
+            np.asarray(self.vectors[self.list_offsets[l]:self.list_offsets[l + 1]], dtype=np.float32) @ query
+            for l in probe
+        ])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+            return scores[top], rows[top]
+        return scores, rows
+
+    def raw_record(self, row: int) -> bytes:
+        with self._meta_lock:
+            self._meta_file.seek(int(self.meta_offsets[row]))
+            return self._meta_file.readline()
+
+    def record(self, row: int) -> dict:
+        return json.loads(self.raw_record(row))
+
+    def dead_rows(self, tombstones: np.ndarray) -> np.ndarray:
+        """Boolean mask of rows whose ids are tombstoned."""
+        return np.isin(self.ids, tombstones)
+
+
+# ------------------ Write lock ------------------ #
+class IndexLocked(RuntimeError):
+    """Raised when another process has the index open for writing."""
+
+
+def _lock_for_writing(path: str):
+    """Exclusive, non-blocking lock on the index directory, held until the file is closed (or the process exits)."""
+    lock_file = open(os.path.join(path, "write.lock"), "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        raise IndexLocked(f"{path} is open for writing by another process; open it with read_only=True to search it")
+    return lock_file
+
+
+# ------------------ Corpus Index ------------------ #
+class CorpusIndex:
+    """
+    Persistent approximate-nearest-neighbour index over many documents.
+
+    Usage:
+        index = CorpusIndex("corpus_index", dim=768)
+        index.add_document("judgment-123", texts, vectors, metadatas, content_hash=sha)
+        index.search(query_vector, k=5)
+        index.delete_document("judgment-123")
+        index.flush()
+
+        CorpusIndex("corpus_index", read_only=True).search(query_vector)  # alongside a writer
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, nprobe: int = DEFAULT_NPROBE,
+                 background_compaction: bool = True, read_only: bool = False):
+        self.path = path
+        self.nprobe = nprobe
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._lock_file = None
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+            self._lock_file = _lock_for_writing(path)
+        self._manifest_mtime = self._manifest_stat()
+        self._refreshed = time.monotonic()
+
+        manifest = self._read_json("manifest.json", {"dim": dim, "shards": [], "next_id": 0, "shard_counter": 0})
+        if dim and manifest["dim"] and manifest["dim"] != dim:
+            raise ValueError(f"Index at {path} has dimension {manifest['dim']}, not {dim}")
+        self.dim = manifest["dim"] or dim
+        self.next_id = manifest["next_id"]
+        self.shard_counter = manifest["shard_counter"]
+        self.shards = [Shard(os.path.join(path, name)) for name in manifest["shards"]]
+        self.documents = self._read_json("documents.json", {})
+        self._hashes = {doc["hash"] for doc in self.documents.values() if doc.get("hash")}
+
+        tombstones_path = os.path.join(path, "tombstones.npy")
+        self.tombstones = set(np.load(tombstones_path).tolist()) if os.path.exists(tombstones_path) else set()
+
+        # In-memory buffer of chunks not yet written to a shard
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_ids: List[int] = []
+        self._pending_records: List[dict] = []
+
+        self._pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        self._stop = threading.Event()
+        self._compactor = None
+        if background_compaction and not read_only:
+            self._compactor = threading.Thread(target=self._compaction_loop, daemon=True)
+            self._compactor.start()
+
+    # ---- persistence helpers ----
+    def _manifest_stat(self) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.path, "manifest.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Corpus index at {self.path} is open read-only")
+
+    def _read_json(self, name: str, default):
+        file_path = os.path.join(self.path, name)
+        if not os.path.exists(file_path):
+            return default
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, name: str, data):
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _save_state(self):
+        """Atomically persist manifest, documents and tombstones. Caller holds the lock."""
+        np.save(os.path.join(self.path, "tombstones.tmp.npy"), np.array(sorted(self.tombstones), dtype=np.int64))
+        os.replace(os.path.join(self.path, "tombstones.tmp.npy"), os.path.join(self.path, "tombstones.npy"))
+        self._write_json("documents.json", self.documents)
+        self._write_json("manifest.json", {
+            "dim": self.dim,
+            "shards": [shard.name for shard in self.shards],
+            "next_id": self.next_id,
+            "shard_counter": self.shard_counter,
+        })
+
+    def _new_shard_path(self) -> str:
+        self.shard_counter += 1
+        return os.path.join(self.path, f"shard_{self.shard_counter:05d}")
+
+    # ---- writes ----
+    def add_document(self, doc_id: str, texts: List[str], vectors, metadatas: Optional[List[dict]] = None,
+                     content_hash: Optional[str] = None):
+        """
+        Adds (or replaces) all chunks of one document.
+        """
+        self._check_writable()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("Expected one vector per text")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        metadatas = metadatas or [{} for _ in texts]
+
+        with self._lock:
+            if doc_id in self.documents:
+                self._tombstone_document(doc_id)
+            first_id = self.next_id
+            self.next_id += len(texts)
+            for i, text in enumerate(texts):
+                metadata = dict(metadatas[i], doc_id=doc_id)
+                self._pending_records.append({"text": text, "metadata": metadata})
+                self._pending_ids.append(first_id + i)
+            self._pending_vectors.append(vectors)
+            self.documents[doc_id] = {"ranges": [[first_id, self.next_id - 1]], "hash": content_hash}
+            if content_hash:
+                self._hashes.add(content_hash)
+
+            if len(self._pending_ids) >= FLUSH_SIZE:
+                self.flush()
+
+    def _tombstone_document(self, doc_id: str):
+        document = self.documents.pop(doc_id)
+        self._hashes.discard(document.get("hash"))
+        for first_id, last_id in document["ranges"]:
+            self.tombstones.update(range(first_id, last_id + 1))
+
+    def delete_document(self, doc_id: str) -> bool:
+        self._check_writable()
+        with self._lock:
+            if doc_id not in self.documents:
+                return False
+            self._tombstone_document(doc_id)
+            self._save_state()
+            return True
+
+    def flush(self):
+        """Writes buffered chunks to a new shard and persists the manifest."""
+        self._check_writable()
+        with self._lock:
+            if self._pending_ids:
+                shard = Shard.write(
+                    self._new_shard_path(),
+                    np.vstack(self._pending_vectors),
+                    np.array(self._pending_ids, dtype=np.int64),
+                    self._pending_records,
+                )
+                self.shards.append(shard)
+                self._pending_vectors, self._pending_ids, self._pending_records = [], [], []
+            self._save_state()
+
+    # ---- reads ----
+    def refresh(self):
+        """
+        Reloads shards, documents and tombstones if the writer has saved a new
+        manifest since. For read-only instances; already-open shards are reused.
+        """
+        mtime = self._manifest_stat()
+        self._refreshed = time.monotonic()
+        if mtime is None or mtime == self._manifest_mtime:
+            return
+        try:
+            manifest = self._read_json("manifest.json", None)
+            documents = self._read_json("documents.json", {})
+            tombstones_path = os.path.join(self.path, "tombstones.npy")
+            tombstones = set(np.load(tombstones_path).tolist()) if os.path.exists(tombstones_path) else set()
+            current = {shard.name: shard for shard in self.shards}
+            shards = [current.get(name) or Shard(os.path.join(self.path, name)) for name in manifest["shards"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Caught between the writer's file replacements; the next refresh retries
+            logger.warning("Could not refresh corpus index: %s", e)
+            return
+        with self._lock:
+            self.dim = self.dim or manifest["dim"]
+            self.next_id = manifest["next_id"]
+            self.shards = shards
+            self.documents = documents
+            self._hashes = {doc["hash"] for doc in documents.values() if doc.get("hash")}
+            self.tombstones = tombstones
+            self._manifest_mtime = mtime
+        logger.info("Corpus index refreshed", extra={"shards": len(shards), "documents": len(documents)})
+
+    def has_hash(self, content_hash: str) -> bool:
+        with self._lock:
+            return content_hash in self._hashes
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(shard) for shard in self.shards) + len(self._pending_ids) - len(self.tombstones)
+
+    def search(self, query_vector, k: int = 5, nprobe: Optional[int] = None,
+               where: Optional[Dict[str, Any]] = None) -> List[dict]:
+        """
+        Returns up to k hits as {"id", "score", "text", "metadata"}, best first.
+        `where` is an optional exact-match filter on metadata, applied after retrieval
+        (the candidate pool is widened to compensate).
+        """
+        if self.read_only and time.monotonic() - self._refreshed > REFRESH_SECONDS:
+            self.refresh()
+        query = _normalise(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        nprobe = nprobe or self.nprobe
+        with self._lock:
+            shards = list(self.shards)
+            tombstones = self.tombstones
+            pending_vectors = np.vstack(self._pending_vectors) if self._pending_vectors else None
+            pending_ids = list(self._pending_ids)
+            pending_records = list(self._pending_records)
+
+        fetch = k * 4 if where else k
+        fetch += min(len(tombstones), fetch)
+
+        candidates = []  # (score, id, shard or None, row)
+        for shard, (scores, rows) in zip(shards, self._pool.map(lambda s: s.search(query, fetch, nprobe), shards)):
+            ids = shard.ids[rows]
+            candidates.extend(zip(scores.tolist(), ids.tolist(), [shard] * len(rows), rows.tolist()))
+        if pending_vectors is not None:
+            scores = _normalise(pending_vectors) @ query
+            candidates.extend((float(s), pending_ids[i], None, i) for i, s in enumerate(scores))
+
+        candidates.sort(key=lambda c: -c[0])
+        hits = []
+        for score, chunk_id, shard, row in candidates:
+            if chunk_id in tombstones:
+                continue
+            record = shard.record(row) if shard is not None else pending_records[row]
+            if where and any(record["metadata"].get(key) != value for key, value in where.items()):
+                continue
+            hits.append({"id": chunk_id, "score": score, "text": record["text"], "metadata": record["metadata"]})
+            if len(hits) == k:
+                break
+        return hits
+
+    # ---- compaction ----
+    def compaction_plan(self) -> List[List[Shard]]:
+        """
+        Groups of shards to rewrite: shards that are mostly tombstones on their
+        own, plus the smallest shards merged together when there are too many.
+        """
+        with self._lock:
+            shards = list(self.shards)
+            tombstones = np.array(sorted(self.tombstones), dtype=np.int64)
+
+        groups = []
+        if len(tombstones):
+            groups = [[shard] for shard in shards
+                      if len(shard) and shard.dead_rows(tombstones).mean() > TOMBSTONE_RATIO]
+        if len(shards) > MAX_SHARDS:
+            rewritten = {shard.name for group in groups for shard in group}
+            smallest = sorted((s for s in shards if s.name not in rewritten), key=len)
+            merge, size = [], 0
+            while smallest and len(shards) - len(merge) + 1 > MAX_SHARDS and size + len(smallest[0]) <= MAX_SHARD_SIZE:
+                shard = smallest.pop(0)
+                merge.append(shard)
+                size += len(shard)
+            if len(merge) > 1:
+                groups.append(merge)
+        return groups
+
+    def compact(self, shards: Optional[List[Shard]] = None):
+        """
+        Rewrites the given shards (default: all of them) as one shard without
+        their tombstoned rows, retraining the centroids. Searches keep using the
+        old shards until the swap.
+        """
+        self._check_writable()
+        with self._compact_lock:
+            with self._lock:
+                shards = list(shards if shards is not None else self.shards)
+                tombstones = np.array(sorted(self.tombstones), dtype=np.int64)
+                new_path = self._new_shard_path()
+            if not shards:
+                return
+
+            vectors, ids, records, dropped = [], [], [], []
+            for shard in shards:
+                dead = shard.dead_rows(tombstones)
+                dropped.append(np.asarray(shard.ids[dead]))
+                rows = np.nonzero(~dead)[0]
+                vectors.append(np.asarray(shard.vectors[rows], dtype=np.float32))
+                ids.append(np.asarray(shard.ids[rows]))
+                records.extend(shard.raw_record(row) for row in rows.tolist())
+
+            merged = None
+            if records:
+                merged = Shard.write(new_path, np.vstack(vectors), np.concatenate(ids), records)
+
+            # Only the tombstones of the snapshot whose rows were dropped are done with;
+            # ids deleted while compacting were copied into the merged shard and stay tombstoned
+            removed = set(np.concatenate(dropped).tolist())
+            with self._lock:
+                # Shards flushed during compaction stay; the rewritten ones are replaced
+                names = {shard.name for shard in shards}
+                self.shards = [s for s in self.shards if s.name not in names] + ([merged] if merged else [])
+                self.tombstones -= removed
+                self._save_state()
+
+            # In-flight searches may still hold the old shards; their open files
+            # and mappings stay valid after the directories are removed.
+            for shard in shards:
+                shutil.rmtree(shard.path, ignore_errors=True)
+            logger.info("Compacted corpus index shards", extra={
+                "shards": len(shards), "merged_into": merged.name if merged else None, "chunks": len(records)})
+
+    def _compaction_loop(self):
+        while not self._stop.wait(30):
+            try:
+                for group in self.compaction_plan():
+                    self.compact(group)
+            except Exception:
+                logger.exception("Error compacting corpus index")
+
+    def close(self):
+        self._stop.set()
+        if not self.read_only:
+            self.flush()
+        self._pool.shutdown(wait=False)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def benchmark(path: str, queries: int = 200, k: int = 5) -> Dict[str, float]:
+    """
+    Measures search latency on an existing index with random queries.
+    """
+    index = CorpusIndex(path, read_only=True)
+    rng = np.random.default_rng(0)
+    timings = []
+    for _ in range(queries):
+        query = rng.standard_normal(index.dim).astype(np.float32)
+        start = time.perf_counter()
+        index.search(query, k=k)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "chunks": len(index),
+        "shards": len(index.shards),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Corpus index maintenance.")
+    parser.add_argument("index_dir", help="Path to the corpus index directory.")
+    parser.add_argument("command", choices=["stats", "compact", "benchmark"])
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        print(json.dumps(benchmark(args.index_dir), indent=2))
+    else:
+        index = CorpusIndex(args.index_dir, background_compaction=False, read_only=args.command == "stats")
+        if args.command == "compact":
+            index.compact()
+        print(json.dumps({"chunks": len(index), "shards": len(index.shards),
+                          "documents": len(index.documents), "tombstones": len(index.tombstones)}, indent=2))
@@ -1,55 +1,107 @@
+import io
 import re
-import requests
 import json
 import os
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-from typing import Dict, Any
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from rate_limiter import get_limiter, estimate_tokens
+from metrics import stage_timer, STAGE_LATENCY
+from text_cleaner import clean_text
+from summary_tree import summarize_pages, SummaryFailed
+from token_budget import (input_budget, fit_to_budget, truncate_to_budget, guard_prompt,
+                          record_usage, PromptTooLarge)
+
+logger = logging.getLogger(__name__)
 
 # ------------------ Convert to Text ------------------ #
-def convert_to_text(file_path: str) -> str:
+def extract_pages(file_path: str) -> List[str]:
     """
-    Converts a document (txt, pdf, jpg/jpeg) to plain text.
+    Raw text of each page of a document (txt, pdf, jpg/jpeg). Raises on failure.
     """
     _, file_extension = os.path.splitext(file_path)
     file_extension = file_extension.lower()
 
     if file_extension == '.txt':
         with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
-
+            return f.read().split('\f')
     elif file_extension == '.pdf':
-        try:
-            document_text = ""
-            with fitz.open(file_path) as pdf_document:
-                for page in pdf_document:
-                    document_text += page.get_text()
-            return document_text
-        except Exception as e:
-            return f"Error processing PDF: {e}"
+        import fitz  # PyMuPDF, imported on first use to keep startup fast
+        with fitz.open(file_path) as pdf_document:
+            return [page.get_text() for page in pdf_document]
+    elif file_extension in ['.jpg', '.jpeg']:
+        from PIL import Image
+        import pytesseract
+        return [pytesseract.image_to_string(Image.open(file_path))]
+    raise ValueError("Unsupported file type.")
+
+def extract_pages_from_bytes(data: bytes, file_extension: str) -> List[str]:
+    """
+    Same as extract_pages, but for a document already held in memory
+    (e.g. a freshly streamed upload), so it is not read back from disk.
+    """
+    file_extension = file_extension.lower()
 
+    if file_extension == '.txt':
+        return data.decode('utf-8').split('\f')
+    elif file_extension == '.pdf':
+        import fitz
+        with fitz.open(stream=data, filetype="pdf") as pdf_document:
+            return [page.get_text() for page in pdf_document]
     elif file_extension in ['.jpg', '.jpeg']:
-        try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text
-        except Exception as e:
-            return f"Error processing image: {e}"
-    else:
+        from PIL import Image
+        import pytesseract
+        return [pytesseract.image_to_string(Image.open(io.BytesIO(data)))]
+    raise ValueError("Unsupported file type.")
+
+def extraction_error(file_extension: str, error: Exception) -> str:
+    """The error text convert_to_text returns for a failed extraction."""
+    if isinstance(error, ValueError) and str(error) == "Unsupported file type.":
         return "Unsupported file type."
+    kind = "PDF" if file_extension.lower() == '.pdf' else "image" if file_extension.lower() in ['.jpg', '.jpeg'] else "file"
+    return f"Error processing {kind}: {error}"
+
+def convert_to_text(file_path: str, clean: bool = True) -> str:
+    """
+    Converts a document (txt, pdf, jpg/jpeg) to plain text.
+    With clean=True, repeated headers/footers, banners, page numbers and extra
+    whitespace are stripped (see text_cleaner.py).
+    """
+    try:
+        pages = extract_pages(file_path)
+    except Exception as e:
+        return extraction_error(os.path.splitext(file_path)[1], e)
+    return clean_text(pages)[0] if clean else "".join(pages)
+
+def convert_bytes_to_text(data: bytes, file_extension: str, clean: bool = True) -> str:
+    """
+    Same as convert_to_text, but for a document already held in memory.
+    """
+    try:
+        pages = extract_pages_from_bytes(data, file_extension)
+    except Exception as e:
+        return extraction_error(file_extension, e)
+    return clean_text(pages)[0] if clean else "".join(pages)
 
 # ------------------ Gemini API Helper ------------------ #
-def _call_gemini_api(prompt: str, model_name: str = "gemini-2.5-flash-preview-05-20") -> str:
+# Override to point at a local stand-in such as mock_providers.py
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+LLAMA_MODEL = "llama3-8b-8192"
+
+def _call_gemini_api(prompt: str, model_name: str = GEMINI_MODEL) -> str:
     """
     Calls the Gemini API to generate content based on a given prompt.
     """
+    import requests
+
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     if not GEMINI_API_KEY:
-        print("Error: Gemini API key is not set. Please set the 'GEMINI_API_KEY' environment variable.")
+        logger.error("Gemini API key is not set. Please set the 'GEMINI_API_KEY' environment variable.")
         return "API Key Missing."
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
+    url = f"{GEMINI_API_BASE}/v1beta/models/{model_name}:generateContent?key={GEMINI_API_KEY}"
 
     payload = {
         "contents": [{"parts": [{"text": prompt}]}]
@@ -58,22 +110,66 @@ def _call_gemini_api(prompt: str, model_name: str = "gemini-2.5-flash-preview-05
     headers = {"Content-Type": "application/json"}
 
     try:
-        response = requests.post(url, data=json.dumps(payload), headers=headers)
+        guard_prompt("gemini", model_name, prompt)
+        limiter = get_limiter("gemini", model_name)
+        with limiter.limit(estimate_tokens(prompt)):
+            response = requests.post(url, data=json.dumps(payload), headers=headers)
         response.raise_for_status()
 
         result = response.json()
         candidate = result.get("candidates", [])[0]
         text = candidate.get("content", {}).get("parts", [])[0].get("text", "")
 
+        limiter.charge(estimate_tokens(text))  # the completion counts against TPM too
+        record_usage("gemini", model_name, estimate_tokens(prompt), estimate_tokens(text))
         return text
 
+    except PromptTooLarge as e:
+        logger.error("Not calling Gemini API: %s", e)
+        return "The document is too large for the model's context window."
+
     except requests.exceptions.RequestException as e:
-        print(f"Error calling Gemini API: {e}")
+        logger.error("Error calling Gemini API: %s", e)
         return "An error occurred while calling the Gemini API."
     except (IndexError, KeyError) as e:
-        print(f"Error parsing Gemini API response: {e}")
+        logger.error("Error parsing Gemini API response: %s", e)
         return "An error occurred while parsing the API response."
 
+# ------------------ Prompt Budgets ------------------ #
+CLASSIFY_INPUT_TOKENS = int(os.getenv("CLASSIFY_INPUT_TOKENS", "1000"))
+
+def condense_prompt(chunk: str) -> str:
+    """Map step for documents too long for one prompt: keep only what an explanation needs."""
+    return f"""
+    The following is one part of a longer legal document. Extract concise notes covering every
+    party, date, amount, legal provision, argument, finding, obligation and deadline it mentions.
+    Keep names, numbers and citations exactly as written. Do not add commentary.
+
+    Document Part:
+    {chunk}
+    """
+
+def fit_document(document_content: str, template: str, llama_llm=None) -> str:
+    """
+    Fits document text into the prompt budget of the model that will receive it
+    (`template` is the prompt without the document). Slight overflows are truncated;
+    larger ones are condensed part by part with the same model (see token_budget.py).
+    """
+    if llama_llm is not None:
+        provider, model = "groq", LLAMA_MODEL
+        condense = lambda chunk: llama_llm.predict(condense_prompt(chunk))
+    else:
+        provider, model = "gemini", GEMINI_MODEL
+        condense = lambda chunk: _call_gemini_api(condense_prompt(chunk))
+
+    text, strategy = fit_to_budget(document_content, input_budget(provider, model, template), condense,
+                                   model=model, chunk_budget=input_budget(provider, model, condense_prompt("")))
+    if strategy != "single":
+        logger.info("Document fitted to prompt budget", extra={"model": model, "strategy": strategy,
+                                                               "tokens_before": estimate_tokens(document_content),
+                                                               "tokens_after": estimate_tokens(text)})
+    return text
+
 # ------------------ Document Classification ------------------ #
 def document_classifier_tool(document_content: str) -> str:
     """
@@ -90,38 +186,28 @@ def document_classifier_tool(document_content: str) -> str:
         "'General Legal Document', 'Other Legal Document'. "
         "Respond with only the category name. If none fit, use 'General Legal Document'."
     )
-    prompt = f"{system_prompt}\n\nDocument Content:\n{document_content[:4000]}"
+    # The opening of a document is enough to classify it
+    document_content = truncate_to_budget(document_content, CLASSIFY_INPUT_TOKENS, keep_tail=False)
+    prompt = f"{system_prompt}\n\nDocument Content:\n{document_content}"
     return _call_gemini_api(prompt).strip()
 
 # ------------------ Summarization ------------------ #
 def summarize_tool(document_content: str, document_type: str = "") -> str:
     """
     Generates a plain-language summary using Gemini API.
+    Long documents are summarised part by part, then the parts are combined (see summary_tree.py).
     """
-    prompt = f"""
-    You are a legal document assistant. Summarize the following document in plain language.
-    Document Type: {document_type}
-    Document Content:
-    {document_content}
-    """
-    return _call_gemini_api(prompt)
+    try:
+        return summarize_pages([document_content], document_type, "medium")
+    except SummaryFailed as e:
+        return str(e)
 
 # ------------------ Enhanced Document Explanation ------------------ #
-def document_explanation_tool(document_content: str, document_type: str, llama_llm) -> str:
-    """
-    Generates a very detailed, comprehensive, yet human-understandable explanation of any document.
-    Uses LLaMA (Groq) for reasoning and Gemini for extra refinement.
+EXPLANATION_TIERS = ("fast", "standard", "refined-streaming")
 
-    Args:
-        document_content: Full text of the document.
-        document_type: Type of document (from classifier).
-        llama_llm: Groq LLaMA instance for reasoning.
-
-    Returns:
-        Very detailed but human-readable explanation of the document.
-    """
-    # Step 1: Enhanced LLaMA reasoning for detailed explanation
-    llama_prompt = f"""
+def explanation_prompt(document_content: str, document_type: str) -> str:
+    """Prompt for the detailed LLaMA draft explanation."""
+    return f"""
     You are an expert legal document analyst and communication specialist. Your task is to provide a very detailed, comprehensive, yet human-understandable explanation of the given document.
 
     Document Type: {document_type}
@@ -159,19 +245,15 @@ def document_explanation_tool(document_content: str, document_type: str, llama_l
     Make sure to cover every significant aspect of this document in detail while keeping it accessible to non-lawyers.
     """
 
-    try:
-        llama_response = llama_llm.predict(llama_prompt)
-    except Exception as e:
-        llama_response = f"Error generating explanation with LLaMA: {e}"
-
-    # Step 2: Enhanced Gemini refinement for clarity and detail
-    gemini_prompt = f"""
+def refinement_prompt(draft: str) -> str:
+    """Prompt for the Gemini pass that expands and polishes a draft explanation."""
+    return f"""
     You are an expert editor specializing in making legal and technical content accessible to general audiences. 
 
     Your task is to enhance and refine the following document explanation to make it even more detailed, clear, and human-readable:
 
     Original Explanation:
-    {llama_response}
+    {draft}
 
     Enhancement Requirements:
     1. **Expand on any areas that seem brief or unclear**
@@ -192,7 +274,90 @@ def document_explanation_tool(document_content: str, document_type: str, llama_l
     Please provide the enhanced, very detailed explanation that maintains accuracy while being highly accessible.
     """
 
-    gemini_response = _call_gemini_api(gemini_prompt)
+def fast_explanation_prompt(document_content: str, document_type: str) -> str:
+    """Prompt for the single-pass "fast" tier: a shorter, structured overview."""
+    return f"""
+    You are an expert legal document analyst. Explain the following document to someone with no legal background.
+
+    Document Type: {document_type}
+    Document Content:
+    {document_content}
 
-    # Step 3: Return enhanced detailed explanation
+    Use short sections with headings: Document Overview, Key Parties, Main Issues, Important Terms,
+    Deadlines and Next Steps. Explain any legal term you use in simple words. Keep it concise.
+    """
+
+def fast_explanation_tool(document_content: str, document_type: str, llama_llm, timings: Optional[dict] = None) -> str:
+    """
+    One model call: a concise explanation straight from LLaMA (Groq), no Gemini refinement.
+    Falls back to Gemini if no LLaMA instance is available.
+    """
+    document_content = fit_document(document_content, fast_explanation_prompt("", document_type), llama_llm)
+    prompt = fast_explanation_prompt(document_content, document_type)
+    start = time.perf_counter()
+    if llama_llm is not None:
+        with stage_timer("llama_fast"):
+            response = llama_llm.predict(prompt)
+    else:
+        with stage_timer("gemini_fast"):
+            response = _call_gemini_api(prompt)
+    if timings is not None:
+        timings["fast_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return response.strip()
+
+def refine_explanation(draft: str, timings: Optional[dict] = None) -> str:
+    """Second pass: Gemini expands and clarifies a draft explanation."""
+    start = time.perf_counter()
+    with stage_timer("gemini_refine"):
+        gemini_response = _call_gemini_api(refinement_prompt(draft))
+    if timings is not None:
+        timings["gemini_refine_ms"] = round((time.perf_counter() - start) * 1000, 1)
     return gemini_response.strip()
+
+def document_explanation_tool(document_content: str, document_type: str, llama_llm,
+                              timings: Optional[dict] = None) -> str:
+    """
+    Generates a very detailed, comprehensive, yet human-understandable explanation of any document.
+    Uses LLaMA (Groq) for reasoning and Gemini for extra refinement.
+
+    Args:
+        document_content: Full text of the document.
+        document_type: Type of document (from classifier).
+        llama_llm: Groq LLaMA instance for reasoning.
+        timings: Optional dict that receives per-stage durations in ms.
+
+    Returns:
+        Very detailed but human-readable explanation of the document.
+    """
+    # Step 1: Enhanced LLaMA reasoning for detailed explanation
+    start = time.perf_counter()
+    try:
+        document_content = fit_document(document_content, explanation_prompt("", document_type), llama_llm)
+        with stage_timer("llama_draft"):
+            llama_response = llama_llm.predict(explanation_prompt(document_content, document_type))
+    except Exception as e:
+        llama_response = f"Error generating explanation with LLaMA: {e}"
+    if timings is not None:
+        timings["llama_draft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Step 2: Enhanced Gemini refinement for clarity and detail
+    return refine_explanation(llama_response, timings)
+
+def stream_draft_explanation(document_content: str, document_type: str, llama_llm, timings: Optional[dict] = None):
+    """
+    Yields the LLaMA draft explanation in chunks as they are generated
+    (for the "refined-streaming" tier; refine the joined draft afterwards).
+    """
+    # Timed by hand: a stage_timer span can't stay open across yields
+    start = time.perf_counter()
+    try:
+        document_content = fit_document(document_content, explanation_prompt("", document_type), llama_llm)
+        for chunk in llama_llm.stream(explanation_prompt(document_content, document_type)):
+            text = getattr(chunk, "content", chunk)
+            if text:
+                yield text
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage="llama_draft")
+        if timings is not None:
+            timings["llama_draft_ms"] = round(elapsed * 1000, 1)
@@ -0,0 +1,302 @@
+"""
+Rule-based fact table for Indian legal documents.
+
+Built once per document from the cleaned page texts, with regexes for what
+most lookup questions ask about:
+
+    kind          examples
+    title         "Mr.Vijay Agarwal & Ors vs Harinarayan G.Bajaj & Ors"
+    party         "Mr.Vijay Agarwal & Ors." (role: appellant)
+    case_number   "APPEAL NO.200 OF 2012", "CHAMBER SUMMONS NO.106 OF 2010"
+    court         "HIGH COURT OF JUDICATURE AT BOMBAY"
+    judge         "D.Y.Chandrachud" (role: "author, bench, coram"; one fact per judge)
+    judgment_date "27 February, 2013" -> 2013-02-27
+    date          any other date, normalised to ISO
+    citation      "(2007) 5 SCC 602", "AIR 1964 SC 11", "2019 SCC OnLine Bom 123"
+    provision     "Section 446(1) of the Companies Act", "Article 137", "Order VI Rule 17"
+    amount        "Rs.20,000/-"
+
+    index = FactIndex.from_pages(pages)
+    index.facts("provision")
+    index.answer("Which sections were cited?")   # no LLM, microseconds
+    -> {"kind": "provision", "answer": "Provisions cited: ...", "facts": [...]}
+
+Every fact keeps its 1-based page and its character offset in the document
+text, so answers can link to /document/{session_id}/text snippets.
+"""
+import re
+import time
+import bisect
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from text_store import join_pages
+
+FACT_KINDS = ["title", "party", "case_number", "court", "judge", "judgment_date", "date", "citation",
+              "provision", "amount"]
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september",
+          "october", "november", "december"]
+_MONTH = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_DATE = (r"\d{1,2}(?:st|nd|rd|th)?\s+(?:day of\s+)?" + _MONTH + r",?\s+\d{4}|" + _MONTH +
+         r"\s+\d{1,2},\s+\d{4}|\d{1,2}[./-]\d{1,2}[./-](?:19|20)\d{2}")
+_PARTY_ROLES = (r"appellants?|petitioners?|plaintiffs?|respondents?|defendants?|applicants?|accused|"
+                r"complainants?|opponents?|opposite part(?:y|ies)|non-applicants?|claimants?|informants?")
+
+PATTERNS = {
+    "title": re.compile(r"^(?P<value>(?P<first>[^\n]{2,120}?)\s+(?:vs\.?|v\.|versus)\s+(?P<second>[^\n]{2,120}?))"
+                        r"\s+on\s+(?P<date>\d{1,2}\s+" + _MONTH + r",?\s+\d{4})\s*$",
+                        re.IGNORECASE | re.MULTILINE),
+    "party": re.compile(r"^(?P<value>[^\n.][^\n]{1,150}?)\s*(?:\.{2,}|…|-{2,})\s*(?P<role>" + _PARTY_ROLES +
+                        r")\s*\.?\s*$", re.IGNORECASE | re.MULTILINE),
+    "case_number": re.compile(r"\b(?P<value>(?:(?:civil|criminal|writ|first|second|special leave|letters patent|"
+                              r"original|company|arbitration|commercial|miscellaneous|review|transfer)\s+)?"
+                              r"(?:appeal|petition|suit|chamber summons|application|case|revision|reference|"
+                              r"notice of motion|slp|w\.?p\.?|crl?\.?\s?a\.?|cr?ol)\s*(?:\([a-z.]+\)\s*)?"
+                              r"no\.?\s*\d+(?:[-/]\d+)?\s+of\s+\d{4})", re.IGNORECASE),
+    "court": re.compile(r"\b(?P<value>(?:supreme court of india|high court of [a-z ]+?(?: at [a-z]+)?|"
+                        r"[a-z]+ high court|(?:district|sessions|family|city civil) court(?: at [a-z]+)?|"
+                        r"national company law (?:appellate )?tribunal|[a-z ]{0,30}tribunal))\s*$",
+                        re.IGNORECASE | re.MULTILINE),
+    "judge": re.compile(r"^(?P<role>author|bench|coram)\s*:\s*(?P<value>[^\n]+(?:\n[^\n:]{2,60}\bJJ?\.)?)$",
+                        re.IGNORECASE | re.MULTILINE),
+    "judgment_date": re.compile(r"\b(?:dated\s*:|date of (?:judgment|order|decision)\s*:?|pronounced on\s*:?|"
+                                r"decided on\s*:?|judgment (?:pronounced|delivered) on\s*:?)\s*(?P<value>" + _DATE + ")",
+                                re.IGNORECASE),
+    "date": re.compile(r"\b(?P<value>" + _DATE + r")\b", re.IGNORECASE),
+    "citation": re.compile(r"(?P<value>[(\[](?:19|20)\d{2}[)\]]\s*\d{0,2}\s*(?:SCC|SCR|SCALE|Bom\s?CR|Mah\s?LJ|"
+                           r"ALL?\s?ER|Cri\s?LJ|CompCas|DLT|MLJ|KLT)\s*(?:\(\w+\)\s*)?\d+|"
+                           r"AIR\s+(?:19|20)\d{2}\s+[A-Z][A-Za-z]*\s+\d+|"
+                           r"(?:19|20)\d{2}\s+SCC\s+OnLine\s+[A-Z][A-Za-z]*\s+\d+|"
+                           r"ILR\s+(?:19|20)\d{2}\s+[A-Z][A-Za-z]*\s+\d+|"
+                           r"MANU/[A-Z]{2}/\d{4}/(?:19|20)\d{2})"),
+    "provision": re.compile(r"\b(?P<value>(?:sections?|sec\.|ss?\.)\s*\d+[A-Z]?(?:\s*\(\w{1,4}\))*"
+                            r"(?:(?:\s*(?:,|and|&|to)\s*\d+[A-Z]?(?:\s*\(\w{1,4}\))*)*)"
+                            r"(?:\s+of\s+the\s+[A-Z][\w'’,. ]{2,80}?(?:Act|Code|Rules|Regulations)(?:,?\s+\d{4})?)?|"
+                            r"articles?\s+\d+[A-Z]?(?:\s*\(\w{1,4}\))*(?:\s+of\s+the\s+(?:constitution|schedule)"
+                            r"(?:\s+of\s+india)?)?|"
+                            r"order\s+[IVXLC]+\s*,?\s+rules?\s+\d+[A-Z]?(?:\s*\(\w{1,4}\))*)", re.IGNORECASE),
+    "amount": re.compile(r"(?P<value>(?:Rs\.?|INR|₹)\s*\d[\d,]*(?:\.\d+)?(?:\s*(?:/-|lakhs?|crores?))?)",
+                         re.IGNORECASE),
+}
+
+_SPACES = re.compile(r"\s+")
+_JUDGE_SEPARATORS = re.compile(r",|\band\b|&", re.IGNORECASE)
+_JUDGE_SUFFIX = re.compile(r"\s*,?\s*\bJJ?\.?\s*$|^\s*(?:hon'?ble\s+)?(?:mr\.?|ms\.?|dr\.?|justice)\s+", re.IGNORECASE)
+_JUDGE_TITLES = re.compile(r"^(?:(?:hon'?ble|mr|ms|mrs|dr|justice|shri|smt)\b\.?\s*)+")
+_NON_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalise_date(value: str) -> Optional[str]:
+    """'27 February, 2013' / 'February 27, 2013' / '27.02.2013' -> '2013-02-27' (None if not a date)."""
+    text = value.lower().replace(",", " ")
+    try:
+        numeric = re.fullmatch(r"\s*(\d{1,2})[./-](\d{1,2})[./-](\d{4})\s*", text)
+        if numeric:  # Indian documents write day first
+            return date(int(numeric.group(3)), int(numeric.group(2)), int(numeric.group(1))).isoformat()
+        words = re.findall(r"[a-z]+|\d+", text)
+        month = next(i for i, m in enumerate(MONTHS, 1) for w in words if len(w) >= 3 and m.startswith(w))
+        numbers = [int(w) for w in words if w.isdigit()] + [int(n) for n in re.findall(r"(\d+)(?:st|nd|rd|th)", text)]
+        year = next(n for n in numbers if n > 31)
+        day = next(n for n in numbers if 1 <= n <= 31)
+        return date(year, month, day).isoformat()
+    except (StopIteration, ValueError):
+        return None
+
+
+def _clean(value: str) -> str:
+    return _SPACES.sub(" ", value).strip(" .,;:")
+
+
+def _judge_key(name: str) -> str:
+    """Dedup key for a judge: "DR.D.Y.CHANDRACHUD" and "D.Y. Chandrachud" -> "dychandrachud"."""
+    return _NON_ALNUM.sub("", _JUDGE_TITLES.sub("", name.casefold()))
+
+
+def _role(value: str) -> str:
+    role = value.lower().rstrip("s")
+    return {"opposite partie": "opposite party", "accused": "accused"}.get(role, role)
+
+
+# ------------------ Extraction ------------------ #
+def extract_facts(pages: List[str]) -> List[Dict]:
+    """All facts in a document: {"kind", "value", "normalized", "page", "offset", ...}, in reading order."""
+    text, spans = join_pages(pages)
+    page_starts = [start for start, _ in spans]
+    facts, seen = [], set()
+
+    def page_at(offset: int) -> int:
+        return max(1, bisect.bisect_right(page_starts, offset))
+
+    def add(kind: str, value: str, offset: int, normalized: Optional[str] = None, **extra) -> Optional[Dict]:
+        value = _clean(value)
+        normalized = normalized or value.lower()
+        if not value or (kind, normalized, extra.get("role")) in seen:
+            return None
+        seen.add((kind, normalized, extra.get("role")))
+        facts.append(dict(kind=kind, value=value, normalized=normalized, page=page_at(offset), offset=offset, **extra))
+        return facts[-1]
+
+    for match in PATTERNS["title"].finditer(text[:3000]):
+        add("title", match.group("value"), match.start())
+        add("party", match.group("first"), match.start(), role="first party")
+        add("party", match.group("second"), match.start("second"), role="second party")
+        add("judgment_date", match.group("date"), match.start("date"), normalise_date(match.group("date")))
+    for match in PATTERNS["party"].finditer(text):
+        add("party", match.group("value"), match.start(), role=_role(match.group("role")))
+    # One fact per judge, whatever the spelling; author/bench/coram mentions add to its roles
+    judges: Dict[str, Dict] = {}
+    for match in PATTERNS["judge"].finditer(text[:5000]):
+        role = match.group("role").lower()
+        for name in _JUDGE_SEPARATORS.split(match.group("value")):
+            name = _JUDGE_SUFFIX.sub("", name)
+            key = _judge_key(name)
+            if not key:
+                continue
+            if key in judges:
+                roles = judges[key]["role"].split(", ")
+                if role not in roles:
+                    judges[key]["role"] = ", ".join(roles + [role])
+                continue
+            fact = add("judge", name, match.start("value"), role=role)
+            if fact is not None:
+                judges[key] = fact
+    for match in PATTERNS["judgment_date"].finditer(text):
+        normalized = normalise_date(match.group("value"))
+        if normalized:
+            add("judgment_date", match.group("value"), match.start("value"), normalized)
+    for match in PATTERNS["court"].finditer(text[:5000]):
+        add("court", match.group("value").upper(), match.start())
+    for kind in ("case_number", "citation", "provision", "amount"):
+        for match in PATTERNS[kind].finditer(text):
+            add(kind, match.group("value"), match.start())
+    for match in PATTERNS["date"].finditer(text):
+        normalized = normalise_date(match.group("value"))
+        if normalized:
+            add("date", match.group("value"), match.start(), normalized)
+
+    facts.sort(key=lambda fact: (fact["offset"], FACT_KINDS.index(fact["kind"])))
+    return facts
+
+
+# ------------------ Questions ------------------ #
+# (kind, role filter or None, question patterns)
+# Lookup questions, matched against the WHOLE question (after the polite prefix,
+# a trailing "in this case" and the question mark are stripped). A question with
+# any other clause or qualifier ("...to the arbitration agreement", "...of the
+# Limitation Act were held inapplicable") matches nothing and goes to the RAG chain.
+QUESTION_PATTERNS: List[Tuple[str, Optional[str], List[str]]] = [
+    ("case_number", None, [r"(what (is|was) )?(the )?(case|appeal|suit|petition|summons) (no\.?|number)",
+                           r"(what are )?(the )?case numbers"]),
+    ("judgment_date", None, [r"(what (is|was) )?(the )?date of (the )?(judgment|order|decision)",
+                             r"when (was|is) (the|this) (judgment|order|decision) (delivered|pronounced|passed|given|made)",
+                             r"when was (it|the case|this case) (decided|delivered|pronounced)",
+                             r"(what (is|was) )?(the )?judgment date"]),
+    ("party", "appellant", [r"who (is|are|was|were) the (appellants?|petitioners?|plaintiffs?)"]),
+    ("party", "respondent", [r"who (is|are|was|were) the (respondents?|defendants?)"]),
+    ("party", None, [r"who (are|were) the parties( involved)?", r"(name|list) the parties",
+                     r"what are the names of the parties", r"who (is|are) involved"]),
+    ("judge", None, [r"who (is|are|was|were) the (judges?|justices?|bench)",
+                     r"which (judges?|justices?|bench) (heard|decided|delivered) (it|the (case|appeal|matter|judgment))",
+                     r"who (wrote|authored|delivered) (it|the judgment)",
+                     r"who (heard|decided) (it|the (case|appeal|matter))",
+                     r"(what (is|was) )?the (coram|composition of the bench)"]),
+    ("court", None, [r"which court( (decided|heard|delivered|passed) (it|the (case|judgment|order)))?",
+                     r"what court (is|was) (it|this)", r"(what (is|was) )?(the )?name of the court"]),
+    ("citation", None, [r"(which|what) (cases|judgments|precedents|authorities) (are|were) (cited|referred to|relied (up)?on)",
+                        r"(list )?(the |all )?(cases|judgments|precedents|authorities|citations) (cited|referred to|relied (up)?on)",
+                        r"what are the citations"]),
+    ("provision", None, [r"(which|what) (sections?|provisions?|articles?|acts?|statutes?) (is|are|was|were) "
+                         r"(cited|referred to|invoked|mentioned|involved|discussed|relied (up)?on)",
+                         r"(list )?(the |all )?(sections?|provisions?|articles?) (cited|referred to|invoked|mentioned|involved)"]),
+    ("amount", None, [r"(what|which) (amounts?|sums?) (is|are|was|were) (mentioned|involved)",
+                      r"(list )?(the |all )?amounts( mentioned)?"]),
+    ("date", None, [r"(which|what) (important |key )?dates (are|were) mentioned",
+                    r"(list )?(the |all )?(important |key )?dates( mentioned)?"]),
+]
+_question_patterns = [(kind, role, [re.compile(p) for p in patterns]) for kind, role, patterns in QUESTION_PATTERNS]
+_POLITE_PREFIX = re.compile(r"^(please |kindly |can you |could you |tell me |please tell me |let me know )+")
+_SCOPE_SUFFIX = re.compile(r"( (in|of|for) this (case|judgment|judgement|document|order|matter|appeal)"
+                           r"| in the (case|judgment|judgement|document|order)| here)$")
+MAX_LOOKUP_WORDS = 12
+
+LABELS = {
+    "title": "Case", "party": "Parties", "case_number": "Case number", "court": "Court", "judge": "Judges",
+    "judgment_date": "Date of judgment", "date": "Dates mentioned", "citation": "Cases cited",
+    "provision": "Provisions cited", "amount": "Amounts mentioned",
+}
+MAX_ANSWER_FACTS = 15
+
+
+def question_kind(question: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(fact kind, party role) if the question is nothing but a lookup, else None."""
+    text = " ".join(question.lower().split()).rstrip("?.! ")
+    text = _SCOPE_SUFFIX.sub("", _POLITE_PREFIX.sub("", text))
+    if len(text.split()) > MAX_LOOKUP_WORDS:
+        return None
+    for kind, role, patterns in _question_patterns:
+        if any(p.fullmatch(text) for p in patterns):
+            return kind, role
+    return None
+
+
+class FactIndex:
+    """Facts of one document, grouped by kind."""
+
+    def __init__(self, facts: List[Dict]):
+        self.by_kind: Dict[str, List[Dict]] = {kind: [] for kind in FACT_KINDS}
+        for fact in facts:
+            self.by_kind[fact["kind"]].append(fact)
+
+    @classmethod
+    def from_pages(cls, pages: List[str]) -> "FactIndex":
+        return cls(extract_facts(pages))
+
+    def facts(self, kind: Optional[str] = None, role: Optional[str] = None, contains: Optional[str] = None) -> List[Dict]:
+        """Facts of one kind (or all), optionally filtered by party role and substring."""
+        facts = self.by_kind.get(kind, []) if kind else [f for kinds in self.by_kind.values() for f in kinds]
+        if role:
+            facts = [f for f in facts if f.get("role", "").startswith(role)]
+        if contains:
+            facts = [f for f in facts if contains.lower() in f["normalized"]]
+        return facts
+
+    def counts(self) -> Dict[str, int]:
+        return {kind: len(facts) for kind, facts in self.by_kind.items()}
+
+    def answer(self, question: str) -> Optional[Dict]:
+        """
+        Answers a lookup question from the table, or returns None when the
+        question is not a lookup or the document has no matching facts.
+        """
+        start = time.perf_counter()
+        match = question_kind(question)
+        if match is None:
+            return None
+        kind, role = match
+        facts = self.facts(kind, role)
+        if not facts and kind == "party" and role:
+            facts = self.facts(kind, "first party" if role == "appellant" else "second party")
+        if not facts:
+            return None
+
+        if kind in ("party", "judge"):
+            # One line per name, preferring the explicit role ("...Appellants") over the title's order
+            facts = sorted(facts, key=lambda f: f.get("role", "").endswith(" party"))
+            unique = {}
+            for fact in facts:
+                unique.setdefault(fact["normalized"], fact)
+            facts = sorted(unique.values(), key=lambda f: f["offset"])
+        shown = facts[:MAX_ANSWER_FACTS]
+        items = []
+        for fact in shown:
+            item = fact["value"]
+            if fact.get("role") and kind in ("party", "judge"):
+                item += f" ({fact['role']})"
+            elif kind in ("date", "judgment_date") and fact["normalized"] != fact["value"].lower():
+                item += f" ({fact['normalized']})"
+            items.append(f"{item}, page {fact['page']}")
+        more = f" and {len(facts) - len(shown)} more" if len(facts) > len(shown) else ""
+        answer = f"{LABELS[kind]}: " + "; ".join(items) + more
+        return {"kind": kind, "answer": answer, "facts": shown,
+                "seconds": round(time.perf_counter() - start, 6)}
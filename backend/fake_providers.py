@@ -0,0 +1,98 @@
+"""
+Deterministic stand-ins for the Groq/Gemini LLMs and Gemini embeddings.
+
+Used by the benchmark suite so runs are repeatable and cost nothing. Every
+fake sleeps for a configurable, seeded latency to model provider time.
+"""
+import time
+import random
+import hashlib
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeLatency:
+    """
+    Seeded latency source: mean_ms +/- uniform jitter_ms, plus per_token_ms
+    for every output token. Thread-safe and repeatable for a given seed.
+    """
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, per_token_ms: float = 0.0, seed: int = 0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.per_token_ms = per_token_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, tokens: int = 0):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = max(0.0, self.mean_ms + jitter + self.per_token_ms * tokens) / 1000
+        if delay:
+            time.sleep(delay)
+
+
+def fake_completion(prompt: str, words: int = 120) -> str:
+    """Deterministic pseudo-answer derived from the prompt text."""
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    vocabulary = prompt.split() or ["document"]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that returns fake_completion() after a simulated delay."""
+
+    latency: Any = None
+    words: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if self.latency:
+            self.latency.sleep(self.words)
+        message = AIMessage(content=fake_completion(prompt, self.words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(Embeddings):
+    """Hash-based embeddings: the same text always maps to the same unit vector."""
+
+    def __init__(self, size: int = 768, latency: Optional[FakeLatency] = None):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.size)]
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            self.latency.sleep()
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            self.latency.sleep()
+        return self._embed(text)
+
+
+def make_fake_gemini_api(latency: Optional[FakeLatency] = None, words: int = 120):
+    """Returns a drop-in replacement for enhanced_tools._call_gemini_api."""
+    def _call_gemini_api(prompt: str, model_name: str = "gemini-2.5-flash-preview-05-20") -> str:
+        if latency:
+            latency.sleep(words)
+        if "classifier" in prompt:
+            return "Judgment"
+        return fake_completion(prompt, words)
+    return _call_gemini_api
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Offline bulk ingestion into the judgment library index (corpus_index.py).
+
+Usage:
+    python ingest.py /archive/judgments
+    python ingest.py manifest.jsonl --workers 8 --index-dir corpus_index
+
+A manifest is either a text file with one path per line, or a .jsonl file with
+{"path": ..., "metadata": {...}} per line. Progress is checkpointed so a crashed
+run can simply be started again: a file is skipped when the checkpoint has it
+with the same content hash, or when its content hash is already in the index.
+A file changed in place is indexed again and replaces its old entry.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from multiprocessing import Pool
+from typing import Dict, List, Optional
+
+from text_cleaner import clean_pages
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+_known_hashes = set()
+
+
+# ------------------ Worker side ------------------ #
+def _init_worker(known_hashes):
+    global _known_hashes
+    _known_hashes = known_hashes
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def prepare_file(job: Dict) -> Dict:
+    """
+    Hashes, extracts and chunks one file. Runs in a worker process, so it only
+    does CPU/disk work; embedding happens in the parent under the rate limiter.
+    """
+    path = job["path"]
+    result = {"path": path, "hash": None, "chunks": [], "skipped": False, "unchanged": False, "error": None}
+    try:
+        result["hash"] = file_sha256(path)
+        if result["hash"] == job.get("done_hash"):
+            result["skipped"] = result["unchanged"] = True
+            return result
+        if result["hash"] in _known_hashes:
+            result["skipped"] = True
+            return result
+
+        if path.lower().endswith(".pdf"):
+            import fitz  # PyMuPDF
+            with fitz.open(path) as pdf_document:
+                pages = [page.get_text() for page in pdf_document]
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                pages = [f.read()]
+
+        pages, _ = clean_pages(pages)  # drop repeated headers/footers before chunking
+
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        filename = os.path.basename(path)
+        for page_number, page_text in enumerate(pages, start=1):
+            for chunk in text_splitter.split_text(page_text):
+                metadata = dict(job.get("metadata", {}), filename=filename, page_number=page_number)
+                result["chunks"].append((chunk, metadata))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# ------------------ Job discovery ------------------ #
+def discover_jobs(source: str) -> List[Dict]:
+    """Expands a directory or manifest into a list of {"path", "metadata"} jobs."""
+    jobs = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    jobs.append({"path": os.path.join(root, name)})
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    jobs.append(json.loads(line))
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            jobs = [{"path": line.strip()} for line in f if line.strip() and not line.startswith("#")]
+    for job in jobs:
+        job["path"] = os.path.abspath(job["path"])
+    return sorted(jobs, key=lambda job: job["path"])
+
+
+# ------------------ Checkpoint ------------------ #
+class Checkpoint:
+    """
+    Tracks finished files (path -> content hash) and failed files in a JSON file,
+    written atomically. Only files whose chunks have been flushed to the index are
+    marked done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        self.failed: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.done = data.get("done", {})
+            self.failed = data.get("failed", {})
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done": self.done, "failed": self.failed}, f)
+        os.replace(tmp, self.path)
+
+
+# ------------------ Driver ------------------ #
+def ingest(source: str, index_dir: str, workers: int, checkpoint_path: str, flush_every: int,
+           embed_batch: int = 100, retry_failed: bool = False, embeddings=None):
+    from corpus_index import CorpusIndex
+
+    index = CorpusIndex(index_dir)
+    if embeddings is None:
+        from rag_updated import get_embeddings
+        embeddings = get_embeddings()
+    checkpoint = Checkpoint(checkpoint_path)
+
+    jobs = discover_jobs(source)
+    if not retry_failed:
+        jobs = [job for job in jobs if job["path"] not in checkpoint.failed]
+    # A done file is still hashed: it is only skipped if its content has not changed since
+    for job in jobs:
+        job["done_hash"] = checkpoint.done.get(job["path"])
+    print(f"{len(jobs)} files to check ({len(checkpoint.done)} done before, skipped if unchanged)")
+
+    # Documents from a directory are keyed by their path relative to it
+    source_dir = os.path.abspath(source) if os.path.isdir(source) else None
+    known_hashes = set(doc.get("hash") for doc in index.documents.values() if doc.get("hash"))
+    start = time.time()
+    docs = chunks = skipped = 0
+    unflushed: Dict[str, str] = {}
+
+    def report(final: bool = False):
+        elapsed = max(time.time() - start, 1e-9)
+        label = "Done" if final else "Progress"
+        print(f"{label}: {docs} docs, {chunks} chunks, {skipped} skipped, {len(checkpoint.failed)} failed | "
+              f"{docs / elapsed:.2f} docs/s, {chunks / elapsed:.1f} chunks/s")
+
+    def commit():
+        index.flush()
+        checkpoint.done.update(unflushed)
+        unflushed.clear()
+        checkpoint.save()
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(known_hashes,)) as pool:
+        for result in pool.imap_unordered(prepare_file, jobs, chunksize=1):
+            path = result["path"]
+            if result["error"]:
+                checkpoint.failed[path] = result["error"]
+                print(f"Failed: {path}: {result['error']}")
+                continue
+            checkpoint.failed.pop(path, None)
+            if result["unchanged"]:
+                skipped += 1
+                continue
+
+            doc_id = os.path.relpath(path, source_dir) if source_dir else path
+            stale_hash = checkpoint.done.get(path)
+            if stale_hash and stale_hash != result["hash"]:
+                # Changed in place: drop the old entry (add_document would replace it, but the
+                # new content may be a duplicate or have no text)
+                index.delete_document(doc_id)
+                if not index.has_hash(stale_hash):
+                    known_hashes.discard(stale_hash)
+
+            if result["skipped"] or result["hash"] in known_hashes:
+                skipped += 1
+                unflushed[path] = result["hash"]
+                continue
+
+            texts = [text for text, _ in result["chunks"]]
+            vectors = []
+            for i in range(0, len(texts), embed_batch):
+                vectors.extend(embeddings.embed_documents(texts[i:i + embed_batch]))
+            if texts:
+                index.add_document(
+                    doc_id,
+                    texts,
+                    vectors,
+                    [metadata for _, metadata in result["chunks"]],
+                    content_hash=result["hash"],
+                )
+            known_hashes.add(result["hash"])
+            unflushed[path] = result["hash"]
+            docs += 1
+            chunks += len(texts)
+
+            if len(unflushed) >= flush_every:
+                commit()
+                report()
+
+    commit()
+    report(final=True)
+    index.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into the judgment library index.")
+    parser.add_argument("source", help="Directory of PDF/TXT files, or a manifest (.txt or .jsonl).")
+    parser.add_argument("--index-dir", default=os.getenv("CORPUS_INDEX_DIR", "corpus_index"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <index-dir>/ingest_checkpoint.json).")
+    parser.add_argument("--flush-every", type=int, default=50, help="Files between index flushes/checkpoints.")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed in a previous run.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        print(f"Error: '{args.source}' was not found.")
+        sys.exit(1)
+
+    os.makedirs(args.index_dir, exist_ok=True)
+    checkpoint = args.checkpoint or os.path.join(args.index_dir, "ingest_checkpoint.json")
+    from corpus_index import IndexLocked
+    try:
+        ingest(args.source, args.index_dir, args.workers, checkpoint, args.flush_every, retry_failed=args.retry_failed)
+    except IndexLocked as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
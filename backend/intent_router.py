@@ -0,0 +1,82 @@
+"""
+Cheap local intent matcher for the /agent endpoint.
+
+Well-known requests ("summarise this", "what kind of document is this?") are
+routed straight to the matching tool function. Only requests that match no
+intent, several intents equally, or contain a negation fall back to the ReAct
+agent, which spends several LLM turns deciding which tool to call.
+
+    route_intent("Can you give me a quick summary?")
+    -> {"intent": "summarize", "confidence": 1.0, "matched": ["\\bsummar..."], "scores": {...}}
+"""
+import re
+from typing import Dict, List
+
+INTENTS = ["summarize", "explain", "classify", "convert"]
+
+INTENT_PATTERNS: Dict[str, List[str]] = {
+    "summarize": [
+        r"\bsummar(y|ies|ise|ize|ising|izing)\b",
+        r"\btl;?dr\b",
+        r"\bgist\b",
+        r"\bkey (points|takeaways)\b",
+        r"\b(short|brief|quick) (overview|version|recap)\b",
+        r"\bin (a few|one|two|three) (lines|sentences|paragraphs)\b",
+    ],
+    "explain": [
+        r"\bexplain",
+        r"\bexplanation\b",
+        r"\bhelp me understand\b",
+        r"\bbreak (it|this) down\b",
+        r"\bin (simple|plain|layman'?s?) (terms|language|english|words)\b",
+        r"\bwhat does (this|the|it) (\w+ )?mean\b",
+        r"\bwalk me through\b",
+    ],
+    "classify": [
+        r"\bclassif(y|ication|ied)\b",
+        r"\bcategor(y|ise|ize)\b",
+        r"\bdocument type\b",
+        r"\bwhat (type|kind|sort) of (document|doc|file|agreement|order)\b",
+        r"\bwhat is this (document|doc|file)\b",
+    ],
+    "convert": [
+        r"\bconvert\b",
+        r"\bextract (the |all )?text\b",
+        r"\b(raw|plain|full) text\b",
+        r"\bocr\b",
+        r"\btranscri(be|pt|ption)\b",
+    ],
+}
+
+# Requests that steer away from an intent need real reasoning
+NEGATIONS = re.compile(r"\b(don'?t|do not|without|instead of|rather than|except|not a)\b")
+
+_compiled = {intent: [re.compile(p) for p in patterns] for intent, patterns in INTENT_PATTERNS.items()}
+
+
+def route_intent(query: str) -> Dict:
+    """
+    Scores the query against every intent. Returns the winning intent, or
+    intent None when the query is ambiguous and should go to the agent.
+    """
+    text = " ".join(query.lower().split())
+    scores = {}
+    matched = {}
+    for intent, patterns in _compiled.items():
+        hits = [p.pattern for p in patterns if p.search(text)]
+        if hits:
+            scores[intent] = len(hits)
+            matched[intent] = hits
+
+    decision = {"intent": None, "confidence": 0.0, "matched": [], "scores": scores}
+    if not scores or NEGATIONS.search(text):
+        return decision
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0
+    if best_score == runner_up:
+        return decision
+
+    decision.update(intent=best, confidence=round((best_score - runner_up) / best_score, 3), matched=matched[best])
+    return decision
@@ -0,0 +1,147 @@
+"""
+LangChain callback handlers and wrappers that connect LLM and embedding calls
+to the shared rate limiter (rate_limiter.py), metrics (metrics.py) and request
+tracing (tracing.py).
+
+Kept separate from those modules so importing them does not pull in LangChain.
+"""
+import time
+import threading
+from typing import Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+
+from rate_limiter import get_limiter, estimate_tokens
+from metrics import STAGE_LATENCY, stage_timer
+from tracing import start_span
+from token_budget import record_usage
+
+
+# ------------------ Rate Limiting ------------------ #
+def completion_tokens(response) -> int:
+    """Output tokens of an LLMResult: the provider's usage metadata if reported, else estimated from the text."""
+    tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            tokens += usage["output_tokens"] if usage else estimate_tokens(generation.text)
+    return tokens
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler that makes LangChain chat models and LLMs wait for the
+    shared limiter before each call. Attach with `callbacks=[...]`.
+    """
+
+    raise_error = True
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.limiter = get_limiter(provider, model)
+        self._held = set()
+        self._held_lock = threading.Lock()
+
+    def _start(self, run_id, tokens: int):
+        self.limiter.acquire(tokens)
+        record_usage(self.provider, self.model, prompt_tokens=tokens)
+        with self._held_lock:
+            self._held.add(run_id)
+
+    def _end(self, run_id):
+        with self._held_lock:
+            if run_id not in self._held:
+                return
+            self._held.discard(run_id)
+        self.limiter.release()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, sum(estimate_tokens(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        text = "".join(str(m.content) for batch in messages for m in batch)
+        self._start(run_id, estimate_tokens(text))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        tokens = completion_tokens(response)
+        # Completion tokens count against the provider's TPM quota as well
+        self.limiter.charge(tokens)
+        record_usage(self.provider, self.model, completion_tokens=tokens, calls=0)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings object so every embed call goes through the
+    shared limiter. Batches are charged one request each.
+    """
+
+    def __init__(self, embeddings, provider: str, model: str):
+        self.embeddings = embeddings
+        self.provider = provider
+        self.model = model
+        self.limiter = get_limiter(provider, model)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(t) for t in texts)
+        with self.limiter.limit(tokens), stage_timer("embedding"):
+            vectors = self.embeddings.embed_documents(texts)
+        record_usage(self.provider, self.model, prompt_tokens=tokens)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.limiter.limit(estimate_tokens(text)), stage_timer("embedding"):
+            vector = self.embeddings.embed_query(text)
+        record_usage(self.provider, self.model, prompt_tokens=estimate_tokens(text))
+        return vector
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
+
+
+# ------------------ Stage Metrics ------------------ #
+class StageMetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times the retriever ("retrieval") and the LLM ("generation") inside a
+    LangChain RAG chain, as histogram samples and trace spans.
+    """
+
+    def __init__(self):
+        self._starts: Dict = {}
+
+    def _start(self, run_id, stage: str):
+        self._starts[run_id] = (time.perf_counter(), start_span(stage))
+
+    def _end(self, run_id, stage: str, error=None, **attributes):
+        start, trace_span = self._starts.pop(run_id, (None, None))
+        if start is not None:
+            STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        if trace_span is not None:
+            trace_span.set(**attributes)
+            trace_span.finish(error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieval", documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "retrieval", error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "generation")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "generation", error)
@@ -2,45 +2,63 @@ import os
 import shutil
 import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Dict
 import json
+import time
 import asyncio
+import importlib
+import threading
 from uuid import uuid4
+from functools import partial
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 
 # Import our custom modules
 from enhanced_tools import *
 from rag_updated import create_vector_store_simple, get_rag_chain
+from rag_updated import create_multi_document_store, build_metadata_filter, get_multi_document_rag_chain
+from rag_updated import get_corpus_index, get_corpus_rag_chain, get_embeddings, get_llm, add_summary_nodes
+from rag_updated import drop_collection
+from rate_limiter import limiter_stats
+from upload_stream import (stream_multipart, discard_files, ContentCache, UploadRejected, MAX_BATCH_UPLOAD_SIZE)
+from metrics import (render_metrics, register, stage_timer, record_cache, CallbackGauge,
+                     HTTP_LATENCY, HTTP_IN_FLIGHT, WS_IN_FLIGHT, AGENT_ROUTES,
+                     EXPLAIN_REQUESTS, EXPLAIN_LATENCY, BOILERPLATE_TOKENS_REMOVED,
+                     PRECOMPUTE_JOBS)
+from tracing import start_trace, end_trace
+from intent_router import route_intent
+from summary_tree import build_summary_tree, summary_from_tree, SUMMARY_LENGTHS
+from text_cleaner import clean_pages
+from fact_index import FactIndex, FACT_KINDS
+from query_router import route_question, record_route, route_stats
+from chat_memory import ChatMemory
+from chat_connections import (ConnectionManager, ChatConnection, heartbeat, WS_MAX_IN_FLIGHT,
+                              WS_HEARTBEAT_SECONDS)
+from text_store import join_pages, write_store, has_store, read_pages, open_store, delete_store
+from token_budget import start_usage, end_usage, truncate_to_budget
+from structured_logging import setup_logging, bind_request, reset_request, bind_session, reset_session
 
-# LangChain imports
-from langchain.agents import initialize_agent
-from langchain.tools import Tool
-from langchain_groq import ChatGroq
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+# LangChain, Chroma, the provider clients, PyMuPDF and pytesseract are imported
+# lazily on first use (or by warm_up()), so the app boots in well under a second
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-import os
+import re
 import logging
 
 # Disable ChromaDB telemetry to avoid errors
 os.environ['ANONYMIZED_TELEMETRY'] = 'False'
 
-# Enable debug logging
-logging.basicConfig(level=logging.DEBUG)
+# Queue-based JSON logging with request/session ids (see structured_logging.py)
+setup_logging()
+logger = logging.getLogger(__name__)
 
 
 
@@ -59,6 +77,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+SESSION_ID_IN_PATH = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Trace each request. The span tree goes into the Server-Timing header, and
+    into the JSON body as "trace" when ?debug=true or X-Debug-Trace is set.
+    Log records during the request carry its X-Request-ID and session id.
+    """
+    root, token = start_trace(f"{request.method} {request.url.path}")
+    request_id = request.headers.get("X-Request-ID") or root.trace.trace_id
+    session_match = SESSION_ID_IN_PATH.search(request.url.path)
+    request_token = bind_request(request_id)
+    session_token = bind_session(session_match.group(0) if session_match else None)
+    usage_token = start_usage()
+    try:
+        try:
+            response = await call_next(request)
+        except Exception as e:
+            end_trace(root, token, e)
+            logger.exception("Request failed", extra={"method": request.method, "path": request.url.path})
+            raise
+        end_trace(root, token)
+    finally:
+        # Provider calls made later, while a streaming body is sent, are not included
+        usage = end_usage(usage_token)
+        reset_session(session_token)
+        reset_request(request_token)
+    logger.info("Request served", extra={"method": request.method, "path": request.url.path,
+                                         "status": response.status_code,
+                                         "duration_ms": round(root.duration_ms, 2), "tokens": usage})
+    response.headers["Server-Timing"] = root.trace.server_timing()
+    response.headers["X-Trace-Id"] = root.trace.trace_id
+    response.headers["X-Request-ID"] = request_id
+    if usage["calls"]:
+        response.headers["X-Token-Usage"] = (f"prompt={usage['prompt_tokens']}, "
+                                             f"completion={usage['completion_tokens']}, calls={usage['calls']}")
+
+    debug = request.query_params.get("debug") in ("1", "true") or request.headers.get("X-Debug-Trace")
+    if debug and response.headers.get("content-type", "").startswith("application/json"):
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        data = json.loads(body)
+        if isinstance(data, dict):
+            data["trace"] = {"trace_id": root.trace.trace_id, "spans": root.trace.tree()}
+            body = json.dumps(data).encode("utf-8")
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+        return Response(body, status_code=response.status_code, headers=headers, media_type="application/json")
+    return response
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Record in-flight requests and latency per route for /metrics"""
+    HTTP_IN_FLIGHT.inc(method=request.method)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec(method=request.method)
+        route = request.scope.get("route")
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=getattr(route, "path", "unmatched"),
+                             method=request.method, status=str(status))
+
 # Static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
@@ -70,48 +153,41 @@ Path("templates").mkdir(exist_ok=True)
 
 # Global variables for session management
 uploaded_files = {}  # Store uploaded file info
+upload_contents = ContentCache()  # raw bytes of recent small uploads, until their first extraction
 active_rag_chains = {}  # Store RAG chains for each session
-llama_llm = None
+bundles = {}  # Store bundle_id -> per-file status for batch uploads
+BUNDLE_CONCURRENCY = int(os.getenv("BUNDLE_CONCURRENCY", "8"))
+active_matters = {}  # Store matter_id -> shared vector store and document metadata
+vector_stores = {}  # Store session/matter id -> its current vector store (one Chroma collection each)
+llama_llm = None  # built on first use by get_llama_llm()
+agent = None  # built on first use by get_agent()
+_init_lock = threading.RLock()
 
 # Initialize LLMs
 def initialize_llms():
     global llama_llm
     try:
+        from langchain_groq import ChatGroq
+        from llm_hooks import RateLimitCallbackHandler
+
         llama_llm = ChatGroq(
             model="llama3-8b-8192",
             groq_api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.7
+            temperature=0.7,
+            base_url=os.getenv("GROQ_API_BASE"),  # None uses the real Groq API
+            callbacks=[RateLimitCallbackHandler("groq", "llama3-8b-8192")]
         )
-        print("LLMs initialized successfully")
+        logger.info("LLMs initialized")
     except Exception as e:
-        print(f"Error initializing LLMs: {e}")
-
-# Initialize LLMs at startup
-initialize_llms()
-
-# Agent tools setup
-tools = [
-    Tool(
-        name="ConvertToText",
-        func=convert_to_text,
-        description="Converts input data to plain text."
-    ),
-    Tool(
-        name="ClassifyDocument",
-        func=document_classifier_tool,
-        description="Classifies the type of the provided document."
-    ),
-    Tool(
-        name="SummarizeText",
-        func=summarize_tool,
-        description="Summarizes the given text."
-    ),
-    Tool(
-        name="ExplainDocument",
-        func=document_explanation_tool,
-        description="Generates a very detailed, comprehensive, and human-readable explanation of the document."
-    ),
-]
+        logger.error("Error initializing LLMs: %s", e)
+
+def get_llama_llm():
+    """Groq Llama client, created on first use. None if it could not be initialized."""
+    if llama_llm is None:
+        with _init_lock:
+            if llama_llm is None:
+                initialize_llms()
+    return llama_llm
 
 agent_instructions = """
 You are a formal, research-focused AI assistant specializing in legal documents.
@@ -129,35 +205,103 @@ Rules:
 - Explain all legal jargon and technical terms clearly.
 """
 
-# Initialize agent
-try:
-    agent = initialize_agent(
-        tools,
-        llama_llm,
-        agent="zero-shot-react-description",
-        verbose=True,
-        handle_parsing_errors=True,
-        agent_kwargs={"system_message": agent_instructions}
-    )
-except Exception as e:
-    print(f"Error initializing agent: {e}")
-    agent = None
+def agent_explain_document(document_content: str) -> str:
+    """ExplainDocument agent tool: the agent passes only the text, so classify it and use the Llama client"""
+    document_type = document_classifier_tool(document_content)
+    return document_explanation_tool(document_content, document_type, get_llama_llm())
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict = {}
+def initialize_agent_tools():
+    global agent
+    try:
+        from langchain.agents import initialize_agent
+        from langchain.tools import Tool
 
-    async def connect(self, websocket: WebSocket, session_id: str):
-        await websocket.accept()
-        self.active_connections[session_id] = websocket
+        # Agent tools setup
+        tools = [
+            Tool(
+                name="ConvertToText",
+                func=convert_to_text,
+                description="Converts input data to plain text."
+            ),
+            Tool(
+                name="ClassifyDocument",
+                func=document_classifier_tool,
+                description="Classifies the type of the provided document."
+            ),
+            Tool(
+                name="SummarizeText",
+                func=summarize_tool,
+                description="Summarizes the given text."
+            ),
+            Tool(
+                name="ExplainDocument",
+                func=agent_explain_document,
+                description="Generates a very detailed, comprehensive, and human-readable explanation of the document."
+            ),
+        ]
+
+        agent = initialize_agent(
+            tools,
+            get_llama_llm(),
+            agent="zero-shot-react-description",
+            verbose=False,  # verbose echoes every prompt (whole documents) to stdout
+            handle_parsing_errors=True,
+            agent_kwargs={"system_message": agent_instructions}
+        )
+    except Exception as e:
+        logger.error("Error initializing agent: %s", e)
+        agent = None
 
-    def disconnect(self, session_id: str):
-        if session_id in self.active_connections:
-            del self.active_connections[session_id]
+def get_agent():
+    """ReAct agent over the document tools, built on first use. None if unavailable."""
+    if agent is None:
+        get_llama_llm()
+        with _init_lock:
+            if agent is None:
+                initialize_agent_tools()
+    return agent
 
-    async def send_personal_message(self, message: str, session_id: str):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_text(message)
+# ------------------ Warm-up and health ------------------ #
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+REQUIRED_ENV_VARS = ["GEMINI_API_KEY", "GROQ_API_KEY"]
+warmup_state = {"status": "cold", "seconds": None, "errors": {}}
+
+def warm_up() -> dict:
+    """
+    Import the heavy modules and build the provider clients and agent ahead of
+    the first request. Safe to call more than once; failures are recorded, not raised.
+    """
+    if warmup_state["status"] in ("warming", "warm"):
+        return warmup_state
+    warmup_state.update(status="warming", errors={})
+    start = time.perf_counter()
+
+    steps = {
+        "langchain": lambda: importlib.import_module("langchain.chains.combine_documents"),
+        "chroma": lambda: importlib.import_module("langchain_chroma"),
+        "pdf": lambda: importlib.import_module("fitz"),
+        "ocr": lambda: importlib.import_module("pytesseract"),
+        "llama_llm": get_llama_llm,
+        "agent": get_agent,
+        "gemini_llm": get_llm,
+        "embeddings": get_embeddings,
+    }
+    for name, step in steps.items():
+        try:
+            if step() is None:
+                warmup_state["errors"][name] = "not available, check the logs and API keys"
+        except Exception as e:
+            warmup_state["errors"][name] = str(e)
+
+    warmup_state.update(status="warm", seconds=round(time.perf_counter() - start, 3))
+    logger.info("Warm-up finished", extra={"seconds": warmup_state["seconds"], "errors": warmup_state["errors"]})
+    return warmup_state
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    """With WARMUP_ON_STARTUP=true, warm up in the background; the app serves requests meanwhile"""
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warm_up, daemon=True).start()
 
 manager = ConnectionManager()
 
@@ -166,117 +310,700 @@ manager = ConnectionManager()
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload and process a document file"""
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No file selected")
-
-    # Validate file type
-    allowed_extensions = ['.pdf', '.txt', '.jpg', '.jpeg']
-    file_extension = Path(file.filename).suffix.lower()
-    if file_extension not in allowed_extensions:
-        raise HTTPException(status_code=400, detail="File type not supported. Please upload PDF, TXT, JPG, or JPEG files.")
-
-    # Generate session ID and save file
+ALLOWED_EXTENSIONS = ['.pdf', '.txt', '.jpg', '.jpeg']
+
+def upload_destination(filename: str) -> tuple:
+    """New session id and file path for an uploaded file; rejects unsupported types"""
+    if Path(filename).suffix.lower() not in ALLOWED_EXTENSIONS:
+        raise UploadRejected("File type not supported. Please upload PDF, TXT, JPG, or JPEG files.")
     session_id = str(uuid4())
-    file_path = f"uploads/{session_id}_{file.filename}"
+    return session_id, f"uploads/{session_id}_{filename}"
 
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Store file info
-        uploaded_files[session_id] = {
-            "filename": file.filename,
-            "file_path": file_path,
-            "content_type": file.content_type,
-            "size": file.size
-        }
+def register_upload(upload: dict) -> dict:
+    """Register a streamed file (see stream_multipart) as a new session"""
+    if "error" in upload:
+        raise HTTPException(status_code=upload["status_code"], detail=upload["error"])
+    session_id = upload["id"]
+    uploaded_files[session_id] = {
+        "filename": upload["filename"],
+        "file_path": upload["file_path"],
+        "content_type": upload["content_type"],
+        "size": upload["size"],
+        "sha256": upload["sha256"],
+    }
+    # Raw bytes for small files, dropped after extraction or when the cache is full/expired
+    upload_contents.put(session_id, upload["content"])
 
-        return JSONResponse({
-            "message": "File uploaded successfully",
-            "session_id": session_id,
-            "filename": file.filename,
-            "file_size": file.size
-        })
+    return {
+        "message": "File uploaded successfully",
+        "session_id": session_id,
+        "filename": upload["filename"],
+        "file_size": upload["size"],
+        "sha256": upload["sha256"]
+    }
 
+async def receive_uploads(request: Request, max_request_size: Optional[int] = None) -> tuple:
+    """Stream a multipart request's files to disk; (form fields, files)"""
+    options = {"max_request_size": max_request_size} if max_request_size else {}
+    try:
+        return await stream_multipart(request, upload_destination, **options)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+@app.post("/upload")
+async def upload_file(request: Request):
+    """Upload and process a document file (multipart field "file")"""
+    _, files = await receive_uploads(request)
+    uploads = [f for f in files if f["field"] == "file"]
+    if len(uploads) != 1:
+        discard_files(files)
+        raise HTTPException(status_code=400, detail="No file selected" if not uploads
+                            else "Upload one file at a time, or use /upload-batch")
+    saved = register_upload(uploads[0])
+    # Opt-in: start extraction/classification/embedding before the follow-up request asks
+    saved["precompute"] = schedule_precompute(saved["session_id"])
+    return JSONResponse(saved)
+
+def set_vector_store(owner_id: str, vectorstore):
+    """Record the store a session or matter now uses, dropping the collection it replaces"""
+    previous = vector_stores.get(owner_id)
+    vector_stores[owner_id] = vectorstore
+    if previous is not None and previous is not vectorstore:
+        drop_collection(previous)
+
+_session_locks = {}
+_session_locks_guard = threading.Lock()
+
+def session_lock(session_id: str) -> threading.RLock:
+    """Per-session lock so a request and background precompute never extract or classify twice"""
+    with _session_locks_guard:
+        return _session_locks.setdefault(session_id, threading.RLock())
+
+def get_document_text(session_id: str) -> str:
+    """Extract (once) and return the text of an uploaded document"""
+    file_info = uploaded_files[session_id]
+    record_cache("document_text", "text" in file_info)
+    if "text" in file_info:
+        return file_info["text"]
+
+    with session_lock(session_id):
+        if "text" in file_info:
+            return file_info["text"]
+
+        # Same content extracted before (this process or an earlier one): read it back from the text store
+        document_hash = file_info.get("sha256")
+        if document_hash and has_store(document_hash):
+            try:
+                text, spans, stored = read_pages(document_hash)
+                record_cache("text_store", True)
+                with stage_timer("fact_index"):
+                    facts = FactIndex.from_pages([text[start:end] for start, end in spans])
+                file_info.update(text=text, page_spans=spans, text_cleanup=stored.get("text_cleanup"), facts=facts)
+                upload_contents.pop(session_id)
+                return text
+            except Exception:
+                logger.exception("Unreadable text store, extracting again")
+        record_cache("text_store", False)
+
+        file_extension = Path(file_info["file_path"]).suffix
+        try:
+            with stage_timer("extraction"):
+                content = upload_contents.pop(session_id)
+                if content is not None:
+                    pages = extract_pages_from_bytes(content, file_extension)
+                else:
+                    pages = extract_pages(file_info["file_path"])
+        except Exception as e:
+            # Don't cache failures so a retry re-extracts
+            return extraction_error(file_extension, e)
+
+        # Strip repeated headers/footers, banners and page numbers before any prompt sees the text
+        with stage_timer("cleanup"):
+            pages, cleanup = clean_pages(pages)
+        BOILERPLATE_TOKENS_REMOVED.inc(cleanup["tokens_before"] - cleanup["tokens_after"])
+        text, spans = join_pages(pages)
+        if document_hash:
+            try:
+                with stage_timer("text_store"):
+                    write_store(document_hash, pages, {"text_cleanup": cleanup})
+            except OSError:
+                logger.exception("Could not write text store")
+        # Case numbers, parties, dates, citations and provisions for LLM-free lookups
+        with stage_timer("fact_index"):
+            file_info["facts"] = FactIndex.from_pages(pages)
+        file_info["text"] = text
+        file_info["page_spans"] = spans  # (start, end) of each page in text
+        file_info["text_cleanup"] = cleanup
+        return text
+
+def get_document_pages(session_id: str) -> List[str]:
+    """Cleaned text of each page, sliced from the cached document text"""
+    text = get_document_text(session_id)
+    spans = uploaded_files[session_id].get("page_spans")
+    if spans is None:
+        return [text]
+    return [text[start:end] for start, end in spans]
+
+def rag_pages(session_id: str) -> Optional[List[str]]:
+    """
+    Cleaned pages to chunk for a session's vector store: the same text the text store,
+    /document and the fact index use, so RAG citations match them. None if extraction
+    failed (the RAG loaders then read the PDF themselves).
+    """
+    if get_document_text(session_id).startswith("Error"):
+        return None
+    return get_document_pages(session_id)
+
+def build_vector_store(session_id: str):
+    """New vector store for a session's document. Runs in a worker thread."""
+    return create_vector_store_simple(uploaded_files[session_id]["file_path"], session_id, rag_pages(session_id))
+
+def get_document_type(session_id: str) -> str:
+    """Classify (once) and return the type of an uploaded document"""
+    file_info = uploaded_files[session_id]
+    record_cache("document_type", "document_type" in file_info)
+    if "document_type" not in file_info:
+        with session_lock(session_id):
+            if "document_type" not in file_info:
+                document_text = get_document_text(session_id)
+                with stage_timer("classification"):
+                    file_info["document_type"] = document_classifier_tool(document_text)
+    return file_info["document_type"]
+
+# ------------------ Speculative precompute ------------------ #
+# PRECOMPUTE_ON_UPLOAD: off | extract | classify | embed (each level includes the ones before it)
+PRECOMPUTE_STEPS = ["extract", "classify", "embed"]
+PRECOMPUTE_ON_UPLOAD = os.getenv("PRECOMPUTE_ON_UPLOAD", "off").lower()
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "1"))
+precompute_jobs = {}  # session_id -> {"status", "steps", "done", "events", "cancel", "future"}
+_precompute_pool = None
+
+def _lower_priority():
+    """Precompute worker initializer: yield the CPU to request handling (per-thread nice on Linux)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass  # not supported on this platform
+
+def run_precompute(session_id: str, job: dict):
+    """Runs the job's steps in order, stopping early if the session is deleted"""
+    bind_session(session_id)
+    job["status"] = "running"
+    try:
+        for step in job["steps"]:
+            if job["cancel"].is_set():
+                break
+            if step == "extract":
+                text = get_document_text(session_id)
+                if text.startswith("Error"):
+                    raise RuntimeError(text)
+            elif step == "classify":
+                get_document_type(session_id)
+            elif step == "embed":
+                file_info = uploaded_files[session_id]
+                if file_info["file_path"].lower().endswith(".pdf") and "vectorstore" not in file_info:
+                    # Chunk the pages the extract step already cleaned rather than parsing the PDF again
+                    vectorstore = build_vector_store(session_id)
+                    if job["cancel"].is_set() or session_id not in uploaded_files:
+                        drop_collection(vectorstore)  # session deleted while embedding
+                        break
+                    file_info["vectorstore"] = vectorstore
+                    set_vector_store(session_id, vectorstore)
+            job["done"].append(step)
+            job["events"][step].set()
+        job["status"] = "cancelled" if job["cancel"].is_set() else "done"
+    except Exception as e:
+        job.update(status="cancelled" if job["cancel"].is_set() else "error", detail=str(e))
+        if not job["cancel"].is_set():
+            logger.warning("Precompute failed", extra={"step": step, "error": str(e)})
+    finally:
+        for event in job["events"].values():
+            event.set()  # nobody keeps waiting on a step that will not run
+        PRECOMPUTE_JOBS.inc(status=job["status"])
+
+def schedule_precompute(session_id: str) -> Optional[List[str]]:
+    """Queue background precompute for a new upload per PRECOMPUTE_ON_UPLOAD. Returns the steps queued."""
+    global _precompute_pool
+    if PRECOMPUTE_ON_UPLOAD not in PRECOMPUTE_STEPS:
+        return None
+    if _precompute_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _precompute_pool = ThreadPoolExecutor(max_workers=PRECOMPUTE_WORKERS, thread_name_prefix="precompute",
+                                              initializer=_lower_priority)
+
+    steps = PRECOMPUTE_STEPS[:PRECOMPUTE_STEPS.index(PRECOMPUTE_ON_UPLOAD) + 1]
+    job = {"status": "queued", "steps": steps, "done": [], "cancel": threading.Event(),
+           "events": {step: threading.Event() for step in steps}}
+    precompute_jobs[session_id] = job
+    job["future"] = _precompute_pool.submit(run_precompute, session_id, job)
+    return steps
+
+async def await_precompute(session_id: str, step: str):
+    """
+    Called by a request before doing `step` itself. Waits for a running precompute
+    job to get that far; a job still queued is cancelled and the request does the work.
+    """
+    job = precompute_jobs.get(session_id)
+    if not job or job["future"].done():
+        return
+    if job["future"].cancel():
+        job["status"] = "superseded"
+        PRECOMPUTE_JOBS.inc(status="superseded")
+        for event in job["events"].values():
+            event.set()
+        return
+    # Wait for the furthest precomputed step this request can use
+    index = min(PRECOMPUTE_STEPS.index(step), len(job["steps"]) - 1)
+    await asyncio.to_thread(job["events"][job["steps"][index]].wait)
+
+def cancel_precompute(session_id: str):
+    job = precompute_jobs.pop(session_id, None)
+    if job:
+        job["cancel"].set()
+        if job["future"].cancel():
+            job["status"] = "cancelled"
+            PRECOMPUTE_JOBS.inc(status="cancelled")
+            for event in job["events"].values():
+                event.set()
+
+def process_bundle_file(session_id: str, build_index: bool) -> dict:
+    """Extract, classify and (for PDFs) index one file of a bundle. Runs in a worker thread."""
+    file_info = uploaded_files[session_id]
+    document_text = get_document_text(session_id)
+    if document_text.startswith("Error"):
+        raise RuntimeError(document_text)
+
+    doc_type = get_document_type(session_id)
+
+    indexed = False
+    if build_index and file_info["file_path"].lower().endswith(".pdf"):
+        vectorstore = build_vector_store(session_id)
+        set_vector_store(session_id, vectorstore)
+        active_rag_chains[session_id] = get_rag_chain(vectorstore)
+        indexed = True
+
+    return {"document_type": doc_type, "indexed": indexed}
+
+@app.post("/upload-batch")
+async def upload_batch(request: Request):
+    """
+    Upload a bundle of documents (multipart fields "files", optional "index")
+    and process them in parallel.
+    Streams one JSON line per file (NDJSON) as each file finishes.
+    """
+    fields, files = await receive_uploads(request, MAX_BATCH_UPLOAD_SIZE)
+    index = fields.get("index", "true").lower() not in ("false", "0", "no")
+    bundle_id = str(uuid4())
+    statuses = {}
+    pending = []
+
+    for file in files:
+        try:
+            saved = register_upload(file)
+        except HTTPException as e:
+            statuses[file["filename"]] = {"filename": file["filename"], "status": "rejected", "detail": e.detail}
+            continue
+        session_id = saved["session_id"]
+        uploaded_files[session_id]["bundle_id"] = bundle_id
+        statuses[session_id] = {"session_id": session_id, "filename": file["filename"], "status": "queued"}
+        pending.append(session_id)
+
+    bundles[bundle_id] = statuses
+    semaphore = asyncio.Semaphore(BUNDLE_CONCURRENCY)
+
+    async def run(session_id: str) -> dict:
+        async with semaphore:
+            statuses[session_id]["status"] = "processing"
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                result = await asyncio.to_thread(process_bundle_file, session_id, index)
+                statuses[session_id].update(result, status="done")
+            except Exception as e:
+                statuses[session_id].update(status="error", detail=str(e))
+            statuses[session_id]["seconds"] = round(loop.time() - start, 3)
+            return statuses[session_id]
+
+    tasks = [asyncio.create_task(run(session_id)) for session_id in pending]
+
+    async def results():
+        yield json.dumps({"bundle_id": bundle_id, "files": list(statuses.values())}) + "\n"
+        for finished in asyncio.as_completed(tasks):
+            yield json.dumps(await finished) + "\n"
+        yield json.dumps({"bundle_id": bundle_id, "done": True}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.get("/bundle/{bundle_id}")
+async def get_bundle(bundle_id: str):
+    """Current per-file status of a batch upload"""
+    if bundle_id not in bundles:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    return JSONResponse({"bundle_id": bundle_id, "files": list(bundles[bundle_id].values())})
+
+# Explanation tiers: "fast" (one model call), "standard" (LLaMA draft + Gemini refinement),
+# "refined-streaming" (standard, with the draft streamed while the refinement runs)
+EXPLAIN_DEFAULT_TIER = os.getenv("EXPLAIN_DEFAULT_TIER", "standard")
+# Per document type defaults, e.g. "FIR=fast,Court Summons=fast,Judgment=refined-streaming"
+EXPLAIN_TIER_BY_TYPE = {
+    doc_type.strip(): tier.strip()
+    for doc_type, _, tier in (item.partition("=") for item in os.getenv("EXPLAIN_TIER_BY_TYPE", "").split(",") if item)
+}
+
+def record_explanation(tier: str, doc_type: str, seconds: float, timings: dict):
+    """Record the tier and stage timings of one explanation, for picking per-type defaults"""
+    EXPLAIN_REQUESTS.inc(tier=tier, document_type=doc_type)
+    EXPLAIN_LATENCY.observe(seconds, tier=tier, document_type=doc_type)
+    logger.info("Explanation generated", extra={"tier": tier, "document_type": doc_type,
+                                                "seconds": round(seconds, 3), "timings_ms": timings})
+
+def stream_explanation(session_id: str, document_text: str, doc_type: str, llm):
+    """NDJSON lines for the refined-streaming tier: meta, draft chunks, then the refined explanation"""
+    file_info = uploaded_files[session_id]
+    start = time.perf_counter()
+    timings = {}
+    yield json.dumps({"type": "meta", "session_id": session_id, "filename": file_info["filename"],
+                      "document_type": doc_type, "tier": "refined-streaming"}) + "\n"
+    try:
+        draft = []
+        for text in stream_draft_explanation(document_text, doc_type, llm, timings):
+            draft.append(text)
+            yield json.dumps({"type": "draft", "text": text}) + "\n"
+        yield json.dumps({"type": "draft_done", "timings_ms": dict(timings)}) + "\n"
+
+        explanation = refine_explanation("".join(draft), timings)
+        yield json.dumps({"type": "refined", "explanation": explanation, "timings_ms": timings}) + "\n"
+    except Exception as e:
+        yield json.dumps({"type": "error", "detail": f"Error processing document: {str(e)}"}) + "\n"
+    finally:
+        record_explanation("refined-streaming", doc_type, time.perf_counter() - start, timings)
+
 @app.post("/explain/{session_id}")
-async def explain_document(session_id: str):
-    """Generate detailed explanation of the uploaded document"""
+async def explain_document(session_id: str, tier: Optional[str] = None):
+    """
+    Generate an explanation of the uploaded document.
+    `tier` is fast, standard or refined-streaming (an NDJSON stream); when omitted it
+    comes from EXPLAIN_TIER_BY_TYPE for the document type, else EXPLAIN_DEFAULT_TIER.
+    """
     if session_id not in uploaded_files:
         raise HTTPException(status_code=404, detail="File not found")
+    if tier is not None and tier not in EXPLANATION_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{tier}', expected one of {', '.join(EXPLANATION_TIERS)}")
 
     file_info = uploaded_files[session_id]
-    file_path = file_info["file_path"]
+    await await_precompute(session_id, "classify")
 
     try:
-        # Convert to text
-        document_text = convert_to_text(file_path)
+        # Convert to text (off the event loop, like the model calls below)
+        document_text = await asyncio.to_thread(get_document_text, session_id)
 
         if "Error" in document_text:
             raise HTTPException(status_code=500, detail=document_text)
 
         # Classify document
-        doc_type = document_classifier_tool(document_text)
+        doc_type = await asyncio.to_thread(get_document_type, session_id)
+        tier = tier or EXPLAIN_TIER_BY_TYPE.get(doc_type, EXPLAIN_DEFAULT_TIER)
+
+        llm = await asyncio.to_thread(get_llama_llm)  # the first call imports and builds the client
+        if tier == "refined-streaming" and llm:
+            return StreamingResponse(stream_explanation(session_id, document_text, doc_type, llm),
+                                     media_type="application/x-ndjson")
 
-        # Generate detailed explanation using enhanced agent
-        if agent and llama_llm:
-            explanation = document_explanation_tool(document_text, doc_type, llama_llm)
+        timings = {}
+        start = time.perf_counter()
+        if tier == "fast":
+            # Single call; uses Gemini if the Llama client is unavailable
+            explanation = await asyncio.to_thread(fast_explanation_tool, document_text, doc_type, llm, timings)
+        elif llm:
+            # Llama draft + Gemini refinement
+            tier = "standard"
+            explanation = await asyncio.to_thread(document_explanation_tool, document_text, doc_type, llm, timings)
         else:
             explanation = "Agent not available. Please check your API keys."
+        if timings:
+            record_explanation(tier, doc_type, time.perf_counter() - start, timings)
 
         return JSONResponse({
             "session_id": session_id,
             "filename": file_info["filename"],
             "document_type": doc_type,
+            "tier": tier,
+            "timings_ms": timings,
+            "text_cleanup": file_info.get("text_cleanup"),
             "explanation": explanation
         })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
+# ------------------ Page and snippet text ------------------ #
+async def get_text_store(session_id: str):
+    """The session's text store, extracting the document first if needed"""
+    file_info = uploaded_files[session_id]
+    await await_precompute(session_id, "extract")
+    if "text" not in file_info:
+        document_text = await asyncio.to_thread(get_document_text, session_id)
+        if "text" not in file_info:
+            raise HTTPException(status_code=500, detail=document_text)
+    try:
+        return open_store(file_info["sha256"])
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=f"Text store unavailable: {str(e)}")
+
+@app.get("/document/{session_id}/page/{page_number}")
+async def get_document_page(session_id: str, page_number: int):
+    """Cleaned text of one page (1-based), served from the text store"""
+    if session_id not in uploaded_files:
+        raise HTTPException(status_code=404, detail="File not found")
+    store = await get_text_store(session_id)
+    try:
+        char_start, char_end = store.page_span(page_number)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return JSONResponse({
+        "session_id": session_id,
+        "page": page_number,
+        "pages": store.page_count,
+        "char_start": char_start,
+        "char_end": char_end,
+        "text": store.page(page_number)
+    })
+
+@app.get("/document/{session_id}/text")
+async def get_document_range(session_id: str, start: int, end: int):
+    """Characters [start, end) of the cleaned document text, e.g. a chat citation snippet"""
+    if session_id not in uploaded_files:
+        raise HTTPException(status_code=404, detail="File not found")
+    store = await get_text_store(session_id)
+    try:
+        text = store.text(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({
+        "session_id": session_id,
+        "start": max(0, start),
+        "end": min(end, store.char_count),
+        "pages": [store.page_at(max(0, start)), store.page_at(max(0, min(end, store.char_count) - 1))],
+        "text": text
+    })
+
+@app.get("/facts/{session_id}")
+async def get_document_facts(session_id: str, kind: Optional[str] = None, q: Optional[str] = None,
+                             contains: Optional[str] = None):
+    """
+    Facts found in the document by fact_index.py (no LLM). Filter with `kind` and
+    `contains`, or pass a lookup question as `q` to get a ready-made answer.
+    """
+    if session_id not in uploaded_files:
+        raise HTTPException(status_code=404, detail="File not found")
+    if kind is not None and kind not in FACT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown kind '{kind}', expected one of {', '.join(FACT_KINDS)}")
+
+    file_info = uploaded_files[session_id]
+    await await_precompute(session_id, "extract")
+    if "facts" not in file_info:
+        document_text = await asyncio.to_thread(get_document_text, session_id)
+        if "facts" not in file_info:
+            raise HTTPException(status_code=500, detail=document_text)
+
+    index = file_info["facts"]
+    response = {"session_id": session_id, "counts": index.counts(), "facts": index.facts(kind, contains=contains)}
+    if q is not None:
+        response["answer"] = index.answer(q)
+    return JSONResponse(response)
+
+# ------------------ Summaries ------------------ #
+def get_summary_tree(session_id: str) -> dict:
+    """Build (once per session) the hierarchical summary tree. Runs in a worker thread."""
+    file_info = uploaded_files[session_id]
+    record_cache("summary_tree", "summary_tree" in file_info)
+    if "summary_tree" in file_info:
+        return dict(file_info["summary_tree"], model_calls=0, cache_hits=1, cached=True)
+
+    with session_lock(session_id):
+        if "summary_tree" in file_info:
+            return dict(file_info["summary_tree"], model_calls=0, cache_hits=1, cached=True)
+        document_text = get_document_text(session_id)
+        if document_text.startswith("Error") or document_text == "Unsupported file type.":
+            raise RuntimeError(document_text)
+        # Reuse the type if it is known, but don't spend a call classifying just for the summary
+        tree = build_summary_tree(get_document_pages(session_id), file_info.get("document_type", ""))
+        file_info["summary_tree"] = {key: tree[key] for key in ("levels", "root", "pages")}
+        return tree
+
+@app.post("/summarize/{session_id}")
+async def summarize_document(session_id: str, length: str = "medium"):
+    """
+    Plain-language summary of the uploaded document: short, medium or long.
+    The first request builds the summary tree; other lengths and repeats are served from it.
+    """
+    if session_id not in uploaded_files:
+        raise HTTPException(status_code=404, detail="File not found")
+    if length not in SUMMARY_LENGTHS:
+        raise HTTPException(status_code=400, detail=f"Unknown length '{length}', expected one of {', '.join(SUMMARY_LENGTHS)}")
+
+    await await_precompute(session_id, "extract")
+    start = time.perf_counter()
+    try:
+        tree = await asyncio.to_thread(get_summary_tree, session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error summarizing document: {str(e)}")
+
+    return JSONResponse({
+        "session_id": session_id,
+        "filename": uploaded_files[session_id]["filename"],
+        "length": length,
+        "summary": summary_from_tree(tree, length),
+        "levels": [len(level) for level in tree["levels"]],
+        "model_calls": tree["model_calls"],
+        "cache_hits": tree["cache_hits"],
+        "cached": tree["cached"],
+        "seconds": round(time.perf_counter() - start, 3)
+    })
+
+class AgentRequest(BaseModel):
+    query: str
+
+def run_intent(session_id: str, intent: str) -> dict:
+    """Run one routed intent directly against its tool function. Runs in a worker thread."""
+    file_info = uploaded_files[session_id]
+    type_cached = "document_type" in file_info
+    document_text = get_document_text(session_id)
+    if document_text.startswith("Error"):
+        raise RuntimeError(document_text)
+
+    if intent == "convert":
+        return {"result": document_text, "model_calls": 0}
+    if intent == "classify":
+        return {"result": get_document_type(session_id), "model_calls": 0 if type_cached else 1}
+    if intent == "summarize":
+        tree = get_summary_tree(session_id)
+        return {"result": summary_from_tree(tree, "medium"), "model_calls": tree["model_calls"]}
+    if intent == "explain":
+        llm = get_llama_llm()
+        if not llm:
+            raise RuntimeError("Agent not available. Please check your API keys.")
+        doc_type = get_document_type(session_id)
+        return {"result": document_explanation_tool(document_text, doc_type, llm),
+                "model_calls": 2 if type_cached else 3}
+    raise ValueError(f"Unknown intent: {intent}")
+
+# The ReAct prompt, tool descriptions and scratchpad share Llama's 8k window with the document
+AGENT_DOCUMENT_TOKENS = int(os.getenv("AGENT_DOCUMENT_TOKENS", "1000"))
+
+def run_agent(session_id: str, query: str) -> dict:
+    """Fallback for ambiguous requests: let the ReAct agent pick the tools. Runs in a worker thread."""
+    react_agent = get_agent()
+    if not react_agent:
+        raise RuntimeError("Agent not available. Please check your API keys.")
+    file_info = uploaded_files[session_id]
+    document_text = get_document_text(session_id)
+    agent_input = (
+        f"{query}\n\n"
+        f"Document file path: {file_info['file_path']}\n"
+        f"Document type: {file_info.get('document_type', 'Unknown')}\n"
+        f"Document text:\n{truncate_to_budget(document_text, AGENT_DOCUMENT_TOKENS, keep_tail=False)}"
+    )
+    with stage_timer("agent"):
+        output = react_agent.invoke({"input": agent_input})
+    return {"result": output.get("output", ""), "model_calls": None}
+
+@app.post("/agent/{session_id}")
+async def agent_request(session_id: str, request: AgentRequest):
+    """
+    Free-form request about an uploaded document. Recognised intents (summarize,
+    explain, classify, convert) go straight to the tool; anything else goes to
+    the ReAct agent.
+    """
+    if session_id not in uploaded_files:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    await await_precompute(session_id, "extract")
+    decision = route_intent(request.query)
+    route = "direct" if decision["intent"] else "agent"
+    AGENT_ROUTES.inc(route=route, intent=decision["intent"] or "none")
+    logger.info("Agent request routed", extra={"route": route, "intent": decision["intent"],
+                                                "confidence": decision["confidence"]})
+
+    start = time.perf_counter()
+    try:
+        if route == "direct":
+            outcome = await asyncio.to_thread(run_intent, session_id, decision["intent"])
+        else:
+            outcome = await asyncio.to_thread(run_agent, session_id, request.query)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+    return JSONResponse({
+        "session_id": session_id,
+        "route": route,
+        "intent": decision["intent"],
+        "confidence": decision["confidence"],
+        "result": outcome["result"],
+        "model_calls": outcome["model_calls"],
+        "seconds": round(time.perf_counter() - start, 3)
+    })
+
+# Also index section and document summaries so broad questions can be answered from them
+RAG_SUMMARY_INDEX = os.getenv("RAG_SUMMARY_INDEX", "false").lower() in ("1", "true", "yes")
+
+def index_summaries(session_id: str, vectorstore) -> dict:
+    """Add the summary tree's nodes to a session's vector store. Runs in a worker thread."""
+    tree = get_summary_tree(session_id)
+    with stage_timer("summary_index"):
+        top_level = add_summary_nodes(vectorstore, tree, session_id)
+    return {"top_level": top_level, "nodes": sum(len(level) for level in tree["levels"]) + 1,
+            "model_calls": tree["model_calls"]}
+
 @app.post("/create-rag/{session_id}")
-async def create_rag_session(session_id: str):
-    """Create RAG chatbot session for the uploaded document"""
+async def create_rag_session(session_id: str, summaries: Optional[bool] = None):
+    """
+    Create RAG chatbot session for the uploaded document.
+    With summaries=true (default RAG_SUMMARY_INDEX) the index also holds the summary tree.
+    """
     if session_id not in uploaded_files:
         raise HTTPException(status_code=404, detail="File not found")
     
     file_info = uploaded_files[session_id]
     file_path = file_info["file_path"]
+    summaries = RAG_SUMMARY_INDEX if summaries is None else summaries
     
     try:
         # Only process PDF files for RAG
         if not file_path.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="RAG chatbot only supports PDF files")
         
-        print(f"Creating RAG session for: {file_path}")
+        logger.info("Creating RAG session", extra={"file_path": file_path, "summaries": summaries})
         
-        # Use the simpler in-memory vector store
+        # Use the simpler in-memory vector store, or the one precomputed on upload
         from rag_updated import create_vector_store_simple, get_rag_chain
-        vectorstore = create_vector_store_simple(file_path)  # Use the simpler version
+        await await_precompute(session_id, "embed")
+        # Without a precomputed store, chunk and embed in a worker thread so the event loop stays free
+        vectorstore = (file_info.pop("vectorstore", None)
+                       or await asyncio.to_thread(build_vector_store, session_id))
+        set_vector_store(session_id, vectorstore)
         
-        # Create RAG chain
-        rag_chain = get_rag_chain(vectorstore)
+        # Create RAG chain (the first one imports LangChain)
+        summary_index = await asyncio.to_thread(index_summaries, session_id, vectorstore) if summaries else None
+        rag_chain = await asyncio.to_thread(get_rag_chain, vectorstore, summary_index and summary_index["top_level"],
+                                            session_id)
         
         # Store RAG chain for this session
         active_rag_chains[session_id] = rag_chain
         
-        print(f"RAG session created successfully for session: {session_id}")
+        logger.info("RAG session created")
         
         return JSONResponse({
             "message": "RAG chatbot session created successfully",
             "session_id": session_id,
-            "filename": file_info["filename"]
+            "filename": file_info["filename"],
+            "summary_index": summary_index
         })
         
     except Exception as e:
-        print(f"Error creating RAG session: {str(e)}")
-        import traceback
-        traceback.print_exc()  # This will print the full error trace to console
+        logger.exception("Error creating RAG session")
         raise HTTPException(status_code=500, detail=f"Error creating RAG session: {str(e)}")
 
 
@@ -294,10 +1021,10 @@ async def create_rag_session(session_id: str):
         if not file_path.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="RAG chatbot only supports PDF files")
         
-        print(f"Creating RAG session for: {file_path}")
+        logger.info("Creating RAG session", extra={"file_path": file_path})
         
         # Create vector store with error handling
-        vectorstore = create_vector_store(file_path)
+        vectorstore = create_vector_store(file_path, rag_pages(session_id))
         
         # Create RAG chain
         rag_chain = get_rag_chain(vectorstore)
@@ -305,7 +1032,7 @@ async def create_rag_session(session_id: str):
         # Store RAG chain for this session
         active_rag_chains[session_id] = rag_chain
         
-        print(f"RAG session created successfully for session: {session_id}")
+        logger.info("RAG session created")
         
         return JSONResponse({
             "message": "RAG chatbot session created successfully",
@@ -314,39 +1041,358 @@ async def create_rag_session(session_id: str):
         })
         
     except Exception as e:
-        print(f"Error creating RAG session: {str(e)}")
-        import traceback
-        traceback.print_exc()  # This will print the full error trace to console
+        logger.exception("Error creating RAG session")
         raise HTTPException(status_code=500, detail=f"Error creating RAG session: {str(e)}")
 
-@app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket endpoint for RAG chatbot"""
-    await manager.connect(websocket, session_id)
+# Request bodies for multi-document (matter) sessions
+class MatterRequest(BaseModel):
+    session_ids: List[str] = []
+    bundle_id: Optional[str] = None
+    # Optional per-session overrides, e.g. {"<session_id>": {"date": "2013-02-27", "document_type": "Judgment"}}
+    metadata: Dict[str, Dict[str, str]] = {}
 
-    if session_id not in active_rag_chains:
-        await manager.send_personal_message("Error: No RAG session found. Please upload a document first.", session_id)
-        return
+class MatterQuestion(BaseModel):
+    question: str
+    document_ids: List[str] = []
+    document_types: List[str] = []
+    date_from: Optional[str] = None  # YYYY-MM-DD
+    date_to: Optional[str] = None
+
+def _date_to_int(value: Optional[str]) -> Optional[int]:
+    """'2013-02-27' -> 20130227"""
+    if not value:
+        return None
+    digits = value.replace("-", "")
+    if len(digits) != 8 or not digits.isdigit():
+        raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+    return int(digits)
 
-    rag_chain = active_rag_chains[session_id]
+def _matter_documents(request: MatterRequest) -> List[dict]:
+    """Resolve a MatterRequest to the PDF files and per-document metadata to index"""
+    session_ids = list(request.session_ids)
+    if request.bundle_id:
+        if request.bundle_id not in bundles:
+            raise HTTPException(status_code=404, detail="Bundle not found")
+        session_ids += [sid for sid in bundles[request.bundle_id] if sid in uploaded_files]
+
+    documents = []
+    for session_id in dict.fromkeys(session_ids):
+        if session_id not in uploaded_files:
+            raise HTTPException(status_code=404, detail=f"File not found: {session_id}")
+        file_info = uploaded_files[session_id]
+        if not file_info["file_path"].lower().endswith(".pdf"):
+            continue
+        overrides = request.metadata.get(session_id, {})
+        metadata = {
+            "document_id": session_id,
+            "filename": file_info["filename"],
+            "document_type": overrides.get("document_type") or file_info.get("document_type", "Unknown"),
+        }
+        document_date = _date_to_int(overrides.get("date"))
+        if document_date:
+            metadata["document_date"] = document_date
+        documents.append({"file_path": file_info["file_path"], "metadata": metadata})
 
+    if not documents:
+        raise HTTPException(status_code=400, detail="No PDF documents to index")
+    return documents
+
+def index_matter_documents(documents: List[dict], vectorstore=None, matter_id: Optional[str] = None):
+    """Index documents from _matter_documents with their cleaned pages. Runs in a worker thread."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Extraction is per-file work (and usually cached already), so do it in parallel
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(documents)))) as pool:
+        pages = list(pool.map(lambda d: rag_pages(d["metadata"]["document_id"]), documents))
+    for document, document_pages in zip(documents, pages):
+        document["pages"] = document_pages
+    return create_multi_document_store(documents, vectorstore, matter_id)
+
+@app.post("/create-matter-rag")
+async def create_matter_rag(request: MatterRequest):
+    """Create one RAG session spanning several uploaded documents in a shared index"""
+    documents = _matter_documents(request)
+    matter_id = str(uuid4())
     try:
-        await manager.send_personal_message("RAG Chatbot is ready! Ask me anything about your document.", session_id)
+        vectorstore = await asyncio.to_thread(index_matter_documents, documents, None, matter_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating matter session: {str(e)}")
 
-        while True:
-            # Receive message from client
-            data = await websocket.receive_text()
+    set_vector_store(matter_id, vectorstore)
+    active_matters[matter_id] = {
+        "vectorstore": vectorstore,
+        "documents": {d["metadata"]["document_id"]: d["metadata"] for d in documents},
+    }
+    # Unfiltered chain so the regular /ws/{session_id} chat works for the matter too
+    active_rag_chains[matter_id] = get_multi_document_rag_chain(vectorstore)
 
-            # Process with RAG
-            try:
-                response = rag_chain.invoke({"input": data})
-                answer = response.get("answer", "I couldn't generate an answer.")
-                await manager.send_personal_message(f"Bot: {answer}", session_id)
-            except Exception as e:
-                await manager.send_personal_message(f"Error: {str(e)}", session_id)
+    return JSONResponse({
+        "message": "Matter RAG session created successfully",
+        "matter_id": matter_id,
+        "documents": list(active_matters[matter_id]["documents"].values())
+    })
+
+@app.post("/matter/{matter_id}/documents")
+async def add_matter_documents(matter_id: str, request: MatterRequest):
+    """Add more documents to an existing matter session"""
+    if matter_id not in active_matters:
+        raise HTTPException(status_code=404, detail="Matter not found")
+    matter = active_matters[matter_id]
+    documents = [d for d in _matter_documents(request) if d["metadata"]["document_id"] not in matter["documents"]]
+    if documents:
+        await asyncio.to_thread(index_matter_documents, documents, matter["vectorstore"])
+        matter["documents"].update({d["metadata"]["document_id"]: d["metadata"] for d in documents})
+    return JSONResponse({"matter_id": matter_id, "added": len(documents), "total_documents": len(matter["documents"])})
+
+@app.post("/matter/{matter_id}/ask")
+async def ask_matter(matter_id: str, request: MatterQuestion):
+    """Ask a question across a matter, optionally filtered by document, type and date"""
+    if matter_id not in active_matters:
+        raise HTTPException(status_code=404, detail="Matter not found")
+
+    where = build_metadata_filter(
+        document_ids=request.document_ids,
+        document_types=request.document_types,
+        date_from=_date_to_int(request.date_from),
+        date_to=_date_to_int(request.date_to),
+    )
+    rag_chain = get_multi_document_rag_chain(active_matters[matter_id]["vectorstore"], where)
+
+    try:
+        response = await asyncio.to_thread(rag_chain.invoke, {"input": request.question})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error answering question: {str(e)}")
+
+    sources = []
+    for doc in response.get("context", []):
+        source = {
+            "document_id": doc.metadata.get("document_id"),
+            "filename": doc.metadata.get("filename"),
+            "page": doc.metadata.get("page_number"),
+        }
+        if source not in sources:
+            sources.append(source)
+
+    return JSONResponse({
+        "matter_id": matter_id,
+        "answer": response.get("answer", "I couldn't generate an answer."),
+        "sources": sources
+    })
+
+@app.get("/library/search")
+async def search_library(q: str, k: int = 5):
+    """Semantic search over the judgment library index"""
+    def search():
+        index = get_corpus_index()
+        start = time.perf_counter()
+        hits = index.search(get_embeddings().embed_query(q), k=k)
+        return hits, (time.perf_counter() - start) * 1000
+
+    hits, elapsed_ms = await asyncio.to_thread(search)
+    return JSONResponse({"query": q, "hits": hits, "search_ms": round(elapsed_ms, 2)})
+
+@app.post("/create-library-rag")
+async def create_library_rag():
+    """Create a chat session over the whole judgment library"""
+    try:
+        rag_chain = await asyncio.to_thread(get_corpus_rag_chain)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error opening judgment library: {str(e)}")
+
+    session_id = str(uuid4())
+    active_rag_chains[session_id] = rag_chain
+    return JSONResponse({
+        "message": "Library chatbot session created successfully",
+        "session_id": session_id,
+        "chunks": len(get_corpus_index())
+    })
+
+# Answer lookup and "which page mentions X" chat questions without the RAG chain
+CHAT_QUERY_ROUTER = os.getenv("CHAT_QUERY_ROUTER", "false").lower() in ("1", "true", "yes")
+
+def chat_indexes(session_id: str):
+    """(fact index, page texts) for the query router, or (None, None) if the text can't be extracted"""
+    if session_id not in uploaded_files:
+        return None, None
+    get_document_text(session_id)
+    file_info = uploaded_files[session_id]
+    if "facts" not in file_info:
+        return None, None
+    return file_info["facts"], get_document_pages(session_id)
+
+# Per-session chat history, capped at CHAT_RECENT_TOKENS + CHAT_SUMMARY_TOKENS per prompt
+CHAT_COMPACTION = os.getenv("CHAT_COMPACTION", "llm").lower()  # llm | local
+chat_memories = {}
+
+def get_chat_memory(session_id: str) -> ChatMemory:
+    """The session's chat memory; older turns are summarised by Gemini in the background"""
+    if session_id not in chat_memories:
+        compact = None
+        if CHAT_COMPACTION == "llm":
+            import enhanced_tools
+            compact = lambda prompt: enhanced_tools._call_gemini_api(prompt)
+        chat_memories.setdefault(session_id, ChatMemory(compact=compact))
+    return chat_memories[session_id]
+
+CANCELLED_ANSWER = {"answer": None, "route": "cancelled", "seconds": 0.0}
+
+def answer_chat_question(session_id: str, chat: dict, text: str,
+                         cancelled: Optional[threading.Event] = None) -> dict:
+    """
+    Answer one chat question (locally or through RAG). Runs in a worker thread.
+    Once `cancelled` is set the model is not called and the turn is not remembered.
+    """
+    memory = chat["memory"]
+    is_cancelled = cancelled.is_set if cancelled is not None else lambda: False
+    WS_IN_FLIGHT.inc()
+    try:
+        # Follow-ups ("and the respondents?") get the previous question's terms, without an LLM call
+        question = memory.rewrite(text)
+
+        # Lookups and keyword searches are answered locally; the rest goes through RAG
+        decision = route_question(question, chat["facts"], chat["pages"]) if CHAT_QUERY_ROUTER else {"answer": None}
+        if decision["answer"] is not None:
+            saved = record_route(decision["route"], decision["seconds"])
+            logger.info("Chat question answered locally", extra={"route": decision["route"],
+                                                                "seconds": decision["seconds"],
+                                                                "saved_seconds": saved})
+            if is_cancelled():
+                return CANCELLED_ANSWER
+            memory.add_turn(text, decision["answer"])
+            return {"answer": decision["answer"], "route": decision["route"], "seconds": decision["seconds"]}
+
+        if is_cancelled():
+            return CANCELLED_ANSWER  # cancelled while queued for a worker thread
+        start = time.perf_counter()
+        response = chat["rag_chain"].invoke({"input": question, "history": memory.prompt_history()})
+        seconds = time.perf_counter() - start
+        record_route("analytical", seconds)
+        answer = response.get("answer", "I couldn't generate an answer.")
+        if is_cancelled():
+            return CANCELLED_ANSWER  # a cancelled question stays out of the chat history
+        memory.add_turn(text, answer)
+        return {"answer": answer, "route": "analytical", "seconds": seconds}
+    finally:
+        WS_IN_FLIGHT.dec()
+
+async def serve_text_chat(connection: ChatConnection, chat: dict):
+    """Original protocol: plain-text questions, answered one at a time to this connection only"""
+    await connection.send("RAG Chatbot is ready! Ask me anything about your document.")
+    while True:
+        # Receive message from client
+        data = await connection.websocket.receive_text()
+        try:
+            result = await asyncio.to_thread(answer_chat_question, connection.session_id, chat, data)
+            await connection.send(f"Bot: {result['answer']}")
+        except Exception as e:
+            logger.exception("Error answering chat question")
+            await connection.send(f"Error: {str(e)}")
+
+async def answer_json_question(connection: ChatConnection, chat: dict, message_id: str, text: str):
+    """Answers one pipelined question and fans the answer out to the session's JSON connections"""
+    # Cancelling the task does not stop its worker thread, so tell the thread too
+    cancelled = threading.Event()
+    try:
+        result = await asyncio.to_thread(answer_chat_question, connection.session_id, chat, text, cancelled)
+        await manager.broadcast(connection.session_id, {
+            "type": "answer", "id": message_id, "question": text, "answer": result["answer"],
+            "route": result["route"], "seconds": round(result["seconds"], 6), "origin": connection.id
+        })
+    except asyncio.CancelledError:
+        cancelled.set()
+        await connection.send({"type": "cancelled", "id": message_id})
+    except Exception as e:
+        logger.exception("Error answering chat question")
+        await connection.send({"type": "error", "id": message_id, "detail": str(e)})
+
+def json_question_done(connection: ChatConnection, message_id: str, task: asyncio.Task):
+    """Frees a question's slot however its task ended, including a cancel before it ever ran"""
+    connection.in_flight.release()
+    if connection.tasks.get(message_id) is task:
+        del connection.tasks[message_id]
+    if task.cancelled() and not connection.closed:
+        # answer_json_question never started, so it could not report the cancel itself
+        asyncio.ensure_future(connection.send({"type": "cancelled", "id": message_id}))
+
+async def serve_json_chat(connection: ChatConnection, chat: dict):
+    """JSON protocol: pipelined questions with ids, answered concurrently (see chat_connections.py)"""
+    await connection.send({"type": "ready", "session_id": connection.session_id, "connection_id": connection.id,
+                           "max_in_flight": WS_MAX_IN_FLIGHT, "heartbeat_seconds": WS_HEARTBEAT_SECONDS})
+    while True:
+        # Backpressure: stop reading once WS_MAX_IN_FLIGHT questions are being answered
+        await connection.in_flight.acquire()
+        try:
+            data = await connection.websocket.receive_text()
+        except BaseException:
+            connection.in_flight.release()
+            raise
+        connection.last_seen = time.monotonic()
+        try:
+            frame = json.loads(data)
+            kind = frame.get("type") if isinstance(frame, dict) else None
+        except ValueError:
+            frame, kind = {}, None
+
+        if kind == "question" and isinstance(frame.get("text"), str) and frame["text"].strip():
+            message_id = str(frame.get("id") or uuid4().hex[:12])
+            if message_id in connection.tasks:
+                connection.in_flight.release()
+                await connection.send({"type": "error", "id": message_id, "detail": "Duplicate id in flight"})
+                continue
+            task = asyncio.create_task(answer_json_question(connection, chat, message_id, frame["text"]))
+            connection.tasks[message_id] = task
+            task.add_done_callback(partial(json_question_done, connection, message_id))
+            continue
+
+        connection.in_flight.release()
+        if kind == "cancel" and str(frame.get("id")) in connection.tasks:
+            connection.tasks[str(frame.get("id"))].cancel()
+        elif kind == "question":
+            await connection.send({"type": "error", "id": frame.get("id"),
+                                   "detail": "A question needs non-empty string text"})
+        elif kind not in ("pong", "cancel"):
+            await connection.send({"type": "error", "id": frame.get("id"),
+                                   "detail": "Expected a question, cancel or pong frame"})
+
+@app.websocket("/ws/{session_id}")
+async def websocket_endpoint(websocket: WebSocket, session_id: str, protocol: str = "text"):
+    """
+    WebSocket endpoint for RAG chatbot. protocol=text (default) is the original
+    one-question-at-a-time chat; protocol=json multiplexes questions with ids.
+    """
+    bind_session(session_id)  # scoped to this connection's task
+    protocol = "json" if protocol == "json" else "text"
+    connection = await manager.connect(websocket, session_id, protocol)
+    pinger = None
+
+    try:
+        if session_id not in active_rag_chains:
+            detail = "No RAG session found. Please upload a document first."
+            await connection.send({"type": "error", "id": None, "detail": detail} if protocol == "json"
+                                  else f"Error: {detail}")
+            await connection.close()
+            return
+
+        facts, pages = await asyncio.to_thread(chat_indexes, session_id) if CHAT_QUERY_ROUTER else (None, None)
+        chat = {"rag_chain": active_rag_chains[session_id], "facts": facts, "pages": pages,
+                "memory": get_chat_memory(session_id)}
+        if protocol == "json":
+            pinger = asyncio.create_task(heartbeat(connection))
+            await serve_json_chat(connection, chat)
+        else:
+            await serve_text_chat(connection, chat)
 
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        pass
+    except RuntimeError:
+        # Receiving on a socket the server closed (slow consumer or missed heartbeats)
+        if not connection.closed:
+            raise
+    finally:
+        if pinger:
+            pinger.cancel()
+        manager.disconnect(connection)
+        await connection.close(flush=False)
 
 @app.get("/sessions")
 async def list_sessions():
@@ -354,20 +1400,85 @@ async def list_sessions():
     return JSONResponse({
         "uploaded_files": len(uploaded_files),
         "active_rag_sessions": len(active_rag_chains),
+        "active_matters": len(active_matters),
         "sessions": list(uploaded_files.keys())
     })
 
+def _active_sessions():
+    yield {"kind": "uploaded"}, len(uploaded_files)
+    yield {"kind": "rag"}, len(active_rag_chains)
+    yield {"kind": "matter"}, len(active_matters)
+    yield {"kind": "websocket"}, manager.connection_count()
+
+register(CallbackGauge("legal_ai_active_sessions", "Active sessions by kind.", _active_sessions))
+register(CallbackGauge("legal_ai_upload_memory_bytes", "Bytes of uploads held in memory until extraction.",
+                       lambda: [({}, upload_contents.stats()["bytes"])]))
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/rate-limits")
+async def rate_limits():
+    """Report per-provider limiter state and queue wait times"""
+    return JSONResponse({"limiters": limiter_stats()})
+
+@app.get("/chat/routes")
+async def chat_routes():
+    """How chat questions were split between local answers and RAG, and the latency saved"""
+    return JSONResponse(route_stats())
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return JSONResponse({"status": "ok"})
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: API keys are configured and, with WARMUP_ON_STARTUP, warm-up has finished.
+    Returns 503 until then so load balancers hold traffic.
+    """
+    missing = [name for name in REQUIRED_ENV_VARS if not os.getenv(name)]
+    warming = WARMUP_ON_STARTUP and warmup_state["status"] != "warm"
+    ready = not missing and not warming
+    return JSONResponse({
+        "ready": ready,
+        "missing_env": missing,
+        "warmup": warmup_state
+    }, status_code=200 if ready else 503)
+
+@app.post("/warmup")
+async def warmup():
+    """Load models, clients and the agent now instead of on the first real request"""
+    return JSONResponse(dict(await asyncio.to_thread(warm_up)))
+
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session and cleanup files"""
+    cancel_precompute(session_id)
+    with _session_locks_guard:
+        _session_locks.pop(session_id, None)
+
     if session_id in uploaded_files:
         file_path = uploaded_files[session_id]["file_path"]
         if os.path.exists(file_path):
             os.remove(file_path)
-        del uploaded_files[session_id]
+        document_hash = uploaded_files.pop(session_id).get("sha256")
+        # The extracted text goes too, unless another session uploaded the same file
+        if document_hash and not any(info.get("sha256") == document_hash for info in uploaded_files.values()):
+            delete_store(document_hash)
+    upload_contents.pop(session_id)
 
     if session_id in active_rag_chains:
         del active_rag_chains[session_id]
+    chat_memories.pop(session_id, None)
+
+    if session_id in active_matters:
+        del active_matters[session_id]
+    if session_id in vector_stores:
+        drop_collection(vector_stores.pop(session_id))
 
     return JSONResponse({"message": "Session deleted successfully"})
 
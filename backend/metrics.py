@@ -0,0 +1,182 @@
+"""
+Minimal Prometheus text-format metrics (no client library needed).
+
+    from metrics import stage_timer, record_cache, render_metrics
+
+    with stage_timer("extraction"):
+        text = convert_to_text(path)
+
+render_metrics() returns the exposition text served at /metrics.
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from tracing import span
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            lines += [f"{self.name}{_label_text(k)} {v}" for k, v in sorted(self.values.items())]
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        with _lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        return [line.replace(" counter", " gauge") if line.startswith("# TYPE") else line
+                for line in super().render()]
+
+
+class CallbackGauge:
+    """Gauge whose samples are computed at scrape time by `func` -> [(labels dict, value)]."""
+
+    def __init__(self, name: str, help_text: str, func: Callable[[], Iterable[Tuple[dict, float]]]):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            for labels, value in self.func():
+                lines.append(f"{self.name}{_label_text(tuple(sorted(labels.items())))} {value}")
+        except Exception as e:
+            lines.append(f"# error collecting {self.name}: {e}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(k, list(v)) for k, v in sorted(self.values.items())]
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_label_text(key)} {entry[-1]}")
+        return lines
+
+
+# ------------------ Registry ------------------ #
+_registry: List = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_LATENCY = register(Histogram(
+    "legal_ai_stage_duration_seconds",
+    "Time spent per processing stage (extraction, classification, llama_draft, gemini_refine, "
+    "embedding, retrieval, generation)."))
+HTTP_LATENCY = register(Histogram("legal_ai_http_request_duration_seconds", "HTTP request latency by route."))
+HTTP_IN_FLIGHT = register(Gauge("legal_ai_http_requests_in_flight", "HTTP requests currently being served."))
+WS_IN_FLIGHT = register(Gauge("legal_ai_ws_questions_in_flight", "Chat questions currently being answered."))
+PROVIDER_TOKENS = register(Counter("legal_ai_provider_tokens_total", "Estimated prompt tokens sent per provider/model."))
+PROVIDER_REQUESTS = register(Counter("legal_ai_provider_requests_total", "Calls made per provider/model."))
+PROVIDER_WAIT = register(Histogram("legal_ai_provider_queue_wait_seconds", "Time spent queueing in the rate limiter."))
+CACHE_REQUESTS = register(Counter("legal_ai_cache_requests_total", "Cache lookups by cache and result (hit/miss)."))
+EXPLAIN_REQUESTS = register(Counter("legal_ai_explain_requests_total", "/explain requests by tier and document type."))
+EXPLAIN_LATENCY = register(Histogram("legal_ai_explain_duration_seconds",
+                                     "End-to-end /explain generation time by tier and document type."))
+BOILERPLATE_TOKENS_REMOVED = register(Counter("legal_ai_boilerplate_tokens_removed_total",
+                                             "Estimated tokens of repeated headers/footers stripped from documents."))
+PRECOMPUTE_JOBS = register(Counter("legal_ai_precompute_jobs_total",
+                                   "Background precompute jobs by outcome (done/error/cancelled/superseded)."))
+AGENT_ROUTES = register(Counter("legal_ai_agent_routes_total", "/agent requests by route (direct/agent) and intent."))
+
+
+def _cache_ratios():
+    caches = {dict(key)["cache"] for key in CACHE_REQUESTS.values}
+    for cache in sorted(caches):
+        hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+        total = hits + CACHE_REQUESTS.get(cache=cache, result="miss")
+        yield {"cache": cache}, round(hits / total, 4) if total else 0.0
+
+
+register(CallbackGauge("legal_ai_cache_hit_ratio", "Share of cache lookups that were hits.", _cache_ratios))
+
+
+# ------------------ Helpers ------------------ #
+@contextmanager
+def stage_timer(stage: str, **attributes):
+    """
+    Observe the duration of a block in the per-stage latency histogram.
+    Also records a trace span (see tracing.py) when a request trace is active.
+    """
+    start = time.perf_counter()
+    try:
+        with span(stage, **attributes):
+            yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
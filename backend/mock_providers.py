@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini and Groq HTTP APIs, for load testing without quota.
+
+Mimics:
+    POST /v1beta/models/{model}:generateContent        (_call_gemini_api, ChatGoogleGenerativeAI)
+    POST /v1beta/models/{model}:streamGenerateContent  (token streaming, ?alt=sse)
+    POST /v1beta/models/{model}:embedContent           (GoogleGenerativeAIEmbeddings)
+    POST /v1beta/models/{model}:batchEmbedContents
+    POST /openai/v1/chat/completions                   (ChatGroq, with "stream": true support)
+
+Point the app at it with:
+    GEMINI_API_BASE=http://localhost:9100
+    GROQ_API_BASE=http://localhost:9100
+
+Usage:
+    python mock_providers.py --port 9100 --latency-ms 800 --dist lognormal --error-rate 0.01 --rpm 600
+"""
+import time
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class MockConfig:
+    latency_ms = 0.0        # mean time to first token
+    jitter_ms = 0.0         # spread (uniform: +/- jitter, lognormal: sigma = jitter / mean)
+    dist = "fixed"          # fixed | uniform | lognormal
+    token_ms = 0.0          # delay between streamed tokens
+    words = 120             # words per completion
+    error_rate = 0.0        # share of requests answered with a 500
+    rate_limit_rate = 0.0   # share of requests answered with a 429 regardless of quota
+    rpm = 0                 # requests per minute before returning 429s (0 = unlimited)
+    embedding_size = 768
+    seed = 0
+
+
+config = MockConfig()
+rng = random.Random(config.seed)
+recent_requests = deque()
+stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+app = FastAPI(title="Mock Gemini/Groq provider")
+
+
+# ------------------ Behaviour helpers ------------------ #
+def sample_latency() -> float:
+    """Seconds of simulated provider latency for one request."""
+    mean = config.latency_ms
+    if config.dist == "uniform":
+        value = rng.uniform(mean - config.jitter_ms, mean + config.jitter_ms)
+    elif config.dist == "lognormal" and mean > 0:
+        sigma = config.jitter_ms / mean if config.jitter_ms else 0.5
+        value = rng.lognormvariate(0, sigma) * mean
+    else:
+        value = mean
+    return max(0.0, value) / 1000
+
+
+def fault_response(provider: str):
+    """Returns an error response if this request should fail, else None."""
+    stats["requests"] += 1
+    now = time.monotonic()
+    while recent_requests and now - recent_requests[0] > 60:
+        recent_requests.popleft()
+
+    over_quota = config.rpm and len(recent_requests) >= config.rpm
+    if over_quota or rng.random() < config.rate_limit_rate:
+        stats["rate_limited"] += 1
+        retry_after = 60 - (now - recent_requests[0]) if over_quota else 1
+        body = ({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                           "status": "RESOURCE_EXHAUSTED"}} if provider == "gemini" else
+                {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}})
+        return JSONResponse(body, status_code=429, headers={"Retry-After": str(max(1, int(retry_after)))})
+
+    recent_requests.append(now)
+    if rng.random() < config.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"code": 500, "message": "Internal error (mock)."}}, status_code=500)
+    return None
+
+
+def completion_words(prompt: str) -> List[str]:
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    local = random.Random(seed)
+    vocabulary = prompt.split() or ["document"]
+    return [local.choice(vocabulary) for _ in range(config.words)]
+
+
+def embedding(text: str) -> List[float]:
+    local = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [local.gauss(0.0, 1.0) for _ in range(config.embedding_size)]
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+def gemini_prompt(body: dict) -> str:
+    return " ".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+
+
+def gemini_chunk(text: str, finish: bool, prompt_tokens: int, output_tokens: int) -> dict:
+    chunk = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+    if finish:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+        chunk["usageMetadata"] = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                                  "totalTokenCount": prompt_tokens + output_tokens}
+    return chunk
+
+
+# ------------------ Gemini ------------------ #
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request):
+    fault = fault_response("gemini")
+    if fault:
+        return fault
+    prompt = gemini_prompt(await request.json())
+    await asyncio.sleep(sample_latency() + config.token_ms * config.words / 1000)
+    words = completion_words(prompt)
+    return JSONResponse(gemini_chunk(" ".join(words), True, len(prompt) // 4, len(words)))
+
+
+@app.post("/v1beta/models/{model}:streamGenerateContent")
+async def stream_generate_content(model: str, request: Request):
+    fault = fault_response("gemini")
+    if fault:
+        return fault
+    prompt = gemini_prompt(await request.json())
+    sse = request.query_params.get("alt") == "sse"
+
+    async def tokens():
+        await asyncio.sleep(sample_latency())
+        words = completion_words(prompt)
+        for i, word in enumerate(words):
+            chunk = gemini_chunk(word + " ", i == len(words) - 1, len(prompt) // 4, len(words))
+            yield f"data: {json.dumps(chunk)}\r\n\r\n" if sse else json.dumps(chunk) + "\n"
+            if config.token_ms:
+                await asyncio.sleep(config.token_ms / 1000)
+
+    return StreamingResponse(tokens(), media_type="text/event-stream" if sse else "application/json")
+
+
+@app.post("/v1beta/models/{model}:embedContent")
+async def embed_content(model: str, request: Request):
+    fault = fault_response("gemini")
+    if fault:
+        return fault
+    body = await request.json()
+    text = " ".join(part.get("text", "") for part in body.get("content", {}).get("parts", []))
+    await asyncio.sleep(sample_latency() / 10)
+    return JSONResponse({"embedding": {"values": embedding(text)}})
+
+
+@app.post("/v1beta/models/{model}:batchEmbedContents")
+async def batch_embed_contents(model: str, request: Request):
+    fault = fault_response("gemini")
+    if fault:
+        return fault
+    body = await request.json()
+    texts = [" ".join(part.get("text", "") for part in item.get("content", {}).get("parts", []))
+             for item in body.get("requests", [])]
+    await asyncio.sleep(sample_latency() / 10)
+    return JSONResponse({"embeddings": [{"values": embedding(text)} for text in texts]})
+
+
+# ------------------ Groq (OpenAI-compatible) ------------------ #
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    fault = fault_response("groq")
+    if fault:
+        return fault
+    body = await request.json()
+    prompt = " ".join(str(message.get("content", "")) for message in body.get("messages", []))
+    model = body.get("model", "llama3-8b-8192")
+    completion_id = f"chatcmpl-mock-{stats['requests']}"
+    created = int(time.time())
+    words = completion_words(prompt)
+    usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words),
+             "total_tokens": len(prompt) // 4 + len(words)}
+
+    if not body.get("stream"):
+        await asyncio.sleep(sample_latency() + config.token_ms * len(words) / 1000)
+        return JSONResponse({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def tokens():
+        await asyncio.sleep(sample_latency())
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": "stop" if last else None}],
+            }
+            if last:
+                chunk["x_groq"] = {"usage": usage}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if config.token_ms:
+                await asyncio.sleep(config.token_ms / 1000)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(tokens(), media_type="text/event-stream")
+
+
+@app.get("/mock/stats")
+async def mock_stats():
+    return JSONResponse(dict(stats, requests_last_minute=len(recent_requests)))
+
+
+def main():
+    global rng
+    parser = argparse.ArgumentParser(description="Mock Gemini/Groq provider server for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--dist", choices=["fixed", "uniform", "lognormal"], default=config.dist)
+    parser.add_argument("--token-ms", type=float, default=config.token_ms, help="Delay between streamed tokens.")
+    parser.add_argument("--words", type=int, default=config.words)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    parser.add_argument("--rpm", type=int, default=config.rpm, help="Requests per minute before 429s (0 = unlimited).")
+    parser.add_argument("--seed", type=int, default=config.seed)
+    args = parser.parse_args()
+
+    for key, value in vars(args).items():
+        if hasattr(MockConfig, key):
+            setattr(config, key, value)
+    rng = random.Random(args.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
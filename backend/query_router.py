@@ -0,0 +1,199 @@
+"""
+Question router in front of the chat RAG chain.
+
+    decision = route_question("What page mentions the arbitration clause?", facts, pages)
+    -> {"route": "search", "answer": "\"arbitration clause\" appears on page 4: ...", "seconds": 0.0003, ...}
+
+Routes:
+    fact        lookups the fact table answers (case number, parties, dates,
+                sections cited, ...; see fact_index.py)
+    search      "which page mentions X" / "find X": keyword search over the pages
+    analytical  everything else, and any fact/search question the local indexes
+                cannot answer, goes to retrieval + generation (answer None)
+
+Only short, single-clause questions in a recognised lookup form are answered
+locally (fact_index.question_kind, SEARCH_PATTERNS match the whole question);
+questions that ask why/how/explain are always analytical. record_route()
+counts the split and the latency saved: the running average RAG latency minus
+the time the local answer took.
+"""
+import os
+import re
+import time
+import threading
+from typing import Dict, List, Optional
+
+from metrics import register, Counter, Histogram
+from fact_index import question_kind
+
+ROUTES = ["fact", "search", "analytical"]
+MAX_SEARCH_PAGES = 5
+SNIPPET_CHARS = 160
+# Used for "latency saved" until a real RAG answer has been timed
+RAG_LATENCY_ESTIMATE = float(os.getenv("RAG_LATENCY_ESTIMATE_SECONDS", "3.0"))
+LATENCY_SMOOTHING = 0.2
+
+ANALYTICAL_PATTERNS = [
+    r"\bwhy\b", r"\bhow (does|did|do|can|could|would|should|is|was)\b", r"\bexplain", r"\banaly[sz]",
+    r"\breason(ing|s|ed)?\b", r"\bimplications?\b", r"\bcompare\b", r"\bdifference\b", r"\bshould\b",
+    r"\bwhat (happens|happened|would|could|if)\b", r"\bargu(e|ed|ment)", r"\bmeaning of\b",
+]
+# Whole-question forms; `subject` is what to look for
+SEARCH_PATTERNS = [
+    r"(on )?(which|what) pages? (mentions?|discuss(es)?|refers? to|talks? about|contains?|cites?) (?P<subject>.+)",
+    r"(on )?(which|what) pages? (is|are) (?P<subject>.+?) (mentioned|discussed|referred to|cited)( on| in)?",
+    r"where (is|are) (?P<subject>.+?) (mentioned|discussed|referred to|cited)",
+    r"where does (it|the (judgment|document|order)) (mention|discuss|refer to|talk about|cite) (?P<subject>.+)",
+    r"(does|do) (it|the (judgment|document|order)) mention (?P<subject>.+)",
+    r"(find|search for|search|locate|look up) (?P<subject>.+)",
+    r"((is|are) there )?any references? to (?P<subject>.+)",
+]
+MAX_SEARCH_SUBJECT_WORDS = 6
+# A subject with another clause ("X, and was it upheld", "X and why") is not a plain lookup
+_CLAUSE = re.compile(r"[,;]|\b(why|how|whether|because|if)\b|\band (what|why|how|was|were|is|did|does)\b")
+STOP_WORDS = set("""
+a an the of to in on at for by with and or is are was were be been does do did what which where who whom
+page pages mention mentions mentioned find search locate look up any reference references refer referred
+document judgment order this that it its there their please show me tell can you i we about discuss
+discussed discusses say says said talk talks where is the any
+""".split())
+
+ROUTED_QUESTIONS = register(Counter("legal_ai_chat_routes_total", "Chat questions by route (fact/search/analytical)."))
+ROUTE_LATENCY = register(Histogram("legal_ai_chat_route_duration_seconds", "Time to answer a chat question, by route."))
+LATENCY_SAVED = register(Counter("legal_ai_chat_latency_saved_seconds_total",
+                                 "Estimated seconds saved by answering chat questions locally, by route."))
+
+_analytical = [re.compile(p) for p in ANALYTICAL_PATTERNS]
+_search = [re.compile(p) for p in SEARCH_PATTERNS]
+_SCOPE_SUFFIX = re.compile(r" (in|of) (this|the) (case|judgment|judgement|document|order)$")
+_QUOTED = re.compile(r"[\"“'‘](.{2,80}?)[\"”'’]")
+_WORDS = re.compile(r"[a-z0-9][a-z0-9().'/-]*")
+
+_stats_lock = threading.Lock()
+_stats = {route: {"questions": 0, "seconds": 0.0, "saved_seconds": 0.0} for route in ROUTES}
+_rag_latency = {"average": RAG_LATENCY_ESTIMATE, "measured": 0}
+
+
+# ------------------ Keyword search ------------------ #
+def search_terms(question: str) -> List[str]:
+    """The quoted phrase, or the content words of a search question."""
+    quoted = _QUOTED.search(question)
+    if quoted:
+        return [quoted.group(1).lower()]
+    words = [word.strip(".'()/-") for word in _WORDS.findall(question.lower())]
+    return [word for word in words if word and word not in STOP_WORDS and len(word) > 2]
+
+
+def keyword_search(pages: List[str], terms: List[str]) -> List[Dict]:
+    """Pages containing every term, most hits first: {"page", "hits", "snippet"}."""
+    if not terms:
+        return []
+    results = []
+    for number, page in enumerate(pages, start=1):
+        lowered = page.lower()
+        counts = [lowered.count(term) for term in terms]
+        if all(counts):
+            first = min(lowered.find(term) for term in terms)
+            start = max(0, first - SNIPPET_CHARS // 2)
+            snippet = " ".join(page[start:start + SNIPPET_CHARS].split())
+            results.append({"page": number, "hits": sum(counts), "snippet": snippet})
+    results.sort(key=lambda result: (-result["hits"], result["page"]))
+    return results[:MAX_SEARCH_PAGES]
+
+
+def format_search_answer(terms: List[str], results: List[Dict]) -> str:
+    pages = ", ".join(str(result["page"]) for result in results)
+    lines = [f"\"{' '.join(terms)}\" appears on page{'s' if len(results) > 1 else ''} {pages}:"]
+    lines += [f"- Page {result['page']}: ...{result['snippet']}..." for result in results]
+    return "\n".join(lines)
+
+
+# ------------------ Routing ------------------ #
+def is_search_question(question: str) -> bool:
+    """True if the whole question is a "which page mentions X" / "find X" lookup with a short subject."""
+    text = _SCOPE_SUFFIX.sub("", " ".join(question.lower().split()).rstrip("?.! "))
+    for pattern in _search:
+        match = pattern.fullmatch(text)
+        if match:
+            subject = match.group("subject")
+            return len(subject.split()) <= MAX_SEARCH_SUBJECT_WORDS and not _CLAUSE.search(subject)
+    return False
+
+
+def classify_question(question: str) -> str:
+    """fact, search or analytical, from the wording alone."""
+    text = " ".join(question.lower().split())
+    if any(p.search(text) for p in _analytical):
+        return "analytical"
+    if question_kind(text):
+        return "fact"
+    if is_search_question(text):
+        return "search"
+    return "analytical"
+
+
+def route_question(question: str, facts=None, pages: Optional[List[str]] = None) -> Dict:
+    """
+    Classifies a question and tries to answer it locally. `answer` is None when
+    it should go to the RAG chain (route "analytical").
+    """
+    start = time.perf_counter()
+    kind = classify_question(question)
+    decision = {"route": "analytical", "classified_as": kind, "answer": None}
+
+    if kind == "fact" and facts is not None:
+        found = facts.answer(question)
+        if found:
+            decision.update(route="fact", answer=found["answer"], fact_kind=found["kind"])
+    elif kind == "search" and pages:
+        terms = search_terms(question)
+        results = keyword_search(pages, terms)
+        if results:
+            decision.update(route="search", answer=format_search_answer(terms, results),
+                            pages=[result["page"] for result in results])
+
+    decision["seconds"] = time.perf_counter() - start
+    return decision
+
+
+def record_route(route: str, seconds: float) -> float:
+    """
+    Counts an answered question. RAG answers update the average RAG latency;
+    local answers add (average RAG latency - seconds) to the time saved, which is returned.
+    """
+    saved = 0.0
+    with _stats_lock:
+        if route == "analytical":
+            rag = _rag_latency
+            rag["average"] = seconds if not rag["measured"] else (
+                (1 - LATENCY_SMOOTHING) * rag["average"] + LATENCY_SMOOTHING * seconds)
+            rag["measured"] += 1
+        else:
+            saved = max(0.0, _rag_latency["average"] - seconds)
+        entry = _stats[route]
+        entry["questions"] += 1
+        entry["seconds"] += seconds
+        entry["saved_seconds"] += saved
+    ROUTED_QUESTIONS.inc(route=route)
+    ROUTE_LATENCY.observe(seconds, route=route)
+    if saved:
+        LATENCY_SAVED.inc(saved, route=route)
+    return saved
+
+
+def route_stats() -> Dict:
+    """Split of chat questions by route, with average latency and time saved."""
+    with _stats_lock:
+        total = sum(entry["questions"] for entry in _stats.values())
+        routes = {
+            route: {
+                "questions": entry["questions"],
+                "share": round(entry["questions"] / total, 4) if total else 0.0,
+                "avg_seconds": round(entry["seconds"] / entry["questions"], 6) if entry["questions"] else None,
+                "saved_seconds": round(entry["saved_seconds"], 3),
+            }
+            for route, entry in _stats.items()
+        }
+        return {"questions": total, "routes": routes,
+                "rag_avg_seconds": round(_rag_latency["average"], 3),
+                "rag_latency_measured": _rag_latency["measured"] > 0}
@@ -1,58 +1,127 @@
+"""
+RAG helpers. LangChain, Chroma and the Google clients are imported inside the
+functions that use them, so importing this module (and main.py) stays fast.
+"""
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import logging
+from uuid import uuid4
+from typing import Any, List, Optional
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
-# Get API key from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found. Please set it in your .env file.")
+LLM_MODEL = "gemini-2.5-flash-preview-05-20"
+# Set to point the Google clients at a local stand-in such as mock_providers.py
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE")
+EMBEDDING_MODEL = "models/embedding-001"
+
+def _gemini_api_key():
+    """API key from the environment, checked when a client is first built rather than at import"""
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found. Please set it in your .env file.")
+    return api_key
+
+def _google_client_kwargs():
+    """Extra client arguments when GEMINI_API_BASE overrides the endpoint"""
+    if not GEMINI_API_BASE:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_BASE}}
 
 # Initialize the LLM and Embedding model
+# Both go through the shared per-provider rate limiter (see rate_limiter.py)
 def get_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from llm_hooks import RateLimitCallbackHandler
+
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash-preview-05-20",
+        model=LLM_MODEL,
         temperature=0.3,
         max_tokens=1000,
-        google_api_key=GEMINI_API_KEY
+        google_api_key=_gemini_api_key(),
+        callbacks=[RateLimitCallbackHandler("gemini", LLM_MODEL)],
+        **_google_client_kwargs()
     )
 
 def get_embeddings():
-    return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=GEMINI_API_KEY
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from llm_hooks import RateLimitedEmbeddings
+
+    embeddings = GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=_gemini_api_key(),
+        **_google_client_kwargs()
     )
+    return RateLimitedEmbeddings(embeddings, "gemini", EMBEDDING_MODEL)
+
+def new_collection_name(owner: Optional[str] = None) -> str:
+    """
+    Chroma collection name for one session or matter. All in-memory stores share
+    one client, so every index gets its own collection (never the default
+    "langchain" one); the random suffix keeps a rebuilt index apart from the old one.
+    """
+    return f"{owner or 'index'}-{uuid4().hex[:8]}"
+
+def drop_collection(vectorstore):
+    """Frees a store's collection in the shared client (e.g. when its session is deleted)"""
+    try:
+        vectorstore.delete_collection()
+    except Exception:
+        logger.exception("Could not delete vector store collection")
+
+def strip_boilerplate(data):
+    """Removes repeated headers/footers and banners from loaded PDF pages, in place"""
+    from text_cleaner import clean_pages
+
+    cleaned, stats = clean_pages([doc.page_content for doc in data])
+    for doc, page_text in zip(data, cleaned):
+        doc.page_content = page_text
+    logger.info("Boilerplate stripped", extra={"tokens_before": stats["tokens_before"],
+                                               "tokens_after": stats["tokens_after"]})
+    return data
+
+def load_pages(file_path, pages=None):
+    """
+    One Document per page. Uses `pages` (cleaned page texts already extracted for
+    the text store) when given, so the PDF is not parsed again; otherwise loads
+    the PDF and strips its boilerplate.
+    """
+    if pages is not None:
+        from langchain_core.documents import Document
+
+        # Same metadata as PyPDFLoader, so page citations don't depend on where the text came from
+        return [Document(page_content=text, metadata={"source": file_path, "page": i})
+                for i, text in enumerate(pages)]
+    from langchain_community.document_loaders import PyPDFLoader
+
+    logger.info("Loading document", extra={"file_path": file_path})
+    return strip_boilerplate(PyPDFLoader(file_path).load())
 
-def create_vector_store(file_path):
+def create_vector_store(file_path, pages=None):
     """
-    Loads a PDF, splits it into chunks, and creates a Chroma vector store.
+    Loads a PDF (or takes its cleaned `pages`), splits it into chunks, and creates a Chroma vector store.
     """
     import tempfile
     import shutil
-    
-    print(f"Loading document: {file_path}")
-    loader = PyPDFLoader(file_path)
-    data = loader.load()
-    print(f"Document loaded. Total pages: {len(data)}")
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_chroma import Chroma
+
+    data = load_pages(file_path, pages)
+    logger.info("Document loaded", extra={"pages": len(data)})
 
-    print("Splitting document into chunks...")
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000, 
         chunk_overlap=200,
         separators=["\n\n", "\n", ". ", " ", ""]
     )
     docs = text_splitter.split_documents(data)
-    print(f"Document split. Total chunks: {len(docs)}")
+    for doc in docs:
+        doc.metadata["level"] = 0  # raw chunk; summary nodes sit above it (see summary_index.py)
+    logger.info("Document split", extra={"chunks": len(docs)})
 
-    print("Creating vector store...")
     embeddings = get_embeddings()
     
     # Create a temporary directory for ChromaDB
@@ -64,7 +133,7 @@ def create_vector_store(file_path):
             embedding=embeddings,
             persist_directory=temp_dir  # Use temporary directory
         )
-        print("Vector store created successfully.")
+        logger.info("Vector store created")
         return vectorstore
     except Exception as e:
         # Clean up temp directory on error
@@ -72,14 +141,26 @@ def create_vector_store(file_path):
         raise e
 
 
-def get_rag_chain(vectorstore):
+def get_rag_chain(vectorstore, summary_top_level=None, document_id=None):
     """
     Creates and returns the RAG chain for question answering.
+    Pass summary_top_level (from add_summary_nodes) to pick the summary level per question;
+    document_id then keeps retrieval to that document's chunks and summary nodes.
     """
-    retriever = vectorstore.as_retriever(
-        search_type="similarity", 
-        search_kwargs={"k": 5}
-    )
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate
+    from llm_hooks import StageMetricsCallbackHandler
+
+    if summary_top_level:
+        SummaryTreeRetriever = get_summary_tree_retriever_class()
+        retriever = SummaryTreeRetriever(vectorstore=vectorstore, top_level=summary_top_level,
+                                         document_id=document_id)
+    else:
+        retriever = vectorstore.as_retriever(
+            search_type="similarity", 
+            search_kwargs={"k": 5}
+        )
 
     llm = get_llm()
 
@@ -99,16 +180,20 @@ def get_rag_chain(vectorstore):
         "\n\n"
         "Remember: Base your answers strictly on the provided document context. "
         "If you need to make any assumptions, clearly state them."
+        "{history}"
     )
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("human", "Question: {input}"),
     ])
+    # Chat history (chat_memory.py) is optional; callers without it pass only "input"
+    prompt = prompt.partial(history="")
 
     question_answer_chain = create_stuff_documents_chain(llm, prompt)
     rag_chain = create_retrieval_chain(retriever, question_answer_chain)
-    return rag_chain
+    # Time retrieval and generation for /metrics
+    return rag_chain.with_config(callbacks=[StageMetricsCallbackHandler()])
 
 def chat_with_document(rag_chain, question):
     """
@@ -120,35 +205,278 @@ def chat_with_document(rag_chain, question):
     except Exception as e:
         return f"Error processing question: {str(e)}"
 # Alternative simpler approach without ChromaDB persistence
-def create_vector_store_simple(file_path):
+def create_vector_store_simple(file_path, document_id=None, pages=None):
     """
-    Simple in-memory vector store creation
+    Simple in-memory vector store creation, in a collection of its own
+    (named after document_id, the session id, when given).
+    Pass the document's cleaned `pages` to chunk those instead of re-reading the PDF.
     """
-    print(f"Loading document: {file_path}")
-    loader = PyPDFLoader(file_path)
-    data = loader.load()
-    print(f"Document loaded. Total pages: {len(data)}")
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_chroma import Chroma
+
+    data = load_pages(file_path, pages)
+    logger.info("Document loaded", extra={"pages": len(data)})
 
-    print("Splitting document into chunks...")
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000, 
         chunk_overlap=200
     )
     docs = text_splitter.split_documents(data)
-    print(f"Document split. Total chunks: {len(docs)}")
+    for doc in docs:
+        doc.metadata["level"] = 0  # raw chunk; summary nodes sit above it (see summary_index.py)
+        if document_id:
+            doc.metadata["document_id"] = document_id
+    logger.info("Document split", extra={"chunks": len(docs)})
 
-    print("Creating vector store...")
     embeddings = get_embeddings()
     
     # Use in-memory ChromaDB without persistence
     vectorstore = Chroma.from_documents(
         documents=docs,
-        embedding=embeddings
+        embedding=embeddings,
+        collection_name=new_collection_name(document_id)
         # No persist_directory = in-memory only
     )
-    print("Vector store created successfully.")
+    logger.info("Vector store created")
+    return vectorstore
+
+# ------------------ Summary-tree index ------------------ #
+def add_summary_nodes(vectorstore, tree, document_id=None):
+    """
+    Embeds the nodes of a summary tree (summary_tree.py) into a document's
+    vector store, tagged with document_id. Returns the top level, for
+    get_rag_chain(summary_top_level=...).
+    """
+    from summary_index import summary_nodes
+
+    texts, metadatas = summary_nodes(tree, document_id)
+    vectorstore.add_texts(texts, metadatas=metadatas)
+    logger.info("Summary nodes indexed", extra={"nodes": len(texts)})
+    return metadatas[-1]["level"]
+
+_summary_tree_retriever_class = None
+
+def get_summary_tree_retriever_class():
+    """
+    LangChain retriever that searches raw chunks or summary nodes depending on the question.
+    Defined on first use because subclassing BaseRetriever imports LangChain.
+    """
+    global _summary_tree_retriever_class
+    if _summary_tree_retriever_class is not None:
+        return _summary_tree_retriever_class
+
+    from langchain_core.retrievers import BaseRetriever
+    from langchain_core.documents import Document
+    from summary_index import plan_retrieval, level_filter
+
+    class SummaryTreeRetriever(BaseRetriever):
+        vectorstore: Any
+        top_level: int
+        document_id: Optional[str] = None
+
+        def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+            plan = plan_retrieval(query, self.top_level)
+            where = level_filter(plan["levels"], self.document_id)
+            docs = self.vectorstore.similarity_search(query, k=plan["k"], filter=where)
+            logger.info("Summary-tree retrieval", extra={"scope": plan["scope"], "levels": plan["levels"],
+                                                         "nodes": len(docs)})
+            return docs
+
+    _summary_tree_retriever_class = SummaryTreeRetriever
+    return SummaryTreeRetriever
+
+# ------------------ Multi-document (matter) sessions ------------------ #
+EMBED_BATCH_SIZE = 200  # chunks per embedding/insert batch
+
+def load_document_chunks(file_path, metadata, pages=None):
+    """
+    Loads and splits one PDF (or its cleaned `pages`), tagging every chunk with the
+    document's metadata (document_id, filename, document_type, document_date as YYYYMMDD int).
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    data = load_pages(file_path, pages)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200
+    )
+    docs = text_splitter.split_documents(data)
+    for doc in docs:
+        doc.metadata.update(metadata)
+        doc.metadata["page_number"] = doc.metadata.get("page", 0) + 1
+    return docs
+
+def create_multi_document_store(documents, vectorstore=None, matter_id=None):
+    """
+    Indexes several PDFs into a single in-memory Chroma collection.
+
+    Args:
+        documents: list of dicts with "file_path", "metadata" and optionally "pages"
+            (cleaned page texts; the PDF is loaded when absent).
+        vectorstore: existing store to add to (creates a new one if None).
+        matter_id: names the new store's collection, which no other matter shares.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from langchain_chroma import Chroma
+
+    # Loading and splitting is per-file work, so do it in parallel
+    with ThreadPoolExecutor(max_workers=min(8, max(1, len(documents)))) as pool:
+        chunk_lists = list(pool.map(
+            lambda d: load_document_chunks(d["file_path"], d["metadata"], d.get("pages")), documents
+        ))
+    docs = [doc for chunks in chunk_lists for doc in chunks]
+    logger.info("Indexing documents", extra={"documents": len(documents), "chunks": len(docs)})
+
+    if vectorstore is None:
+        vectorstore = Chroma(collection_name=new_collection_name(matter_id), embedding_function=get_embeddings())
+    for i in range(0, len(docs), EMBED_BATCH_SIZE):
+        vectorstore.add_documents(docs[i:i + EMBED_BATCH_SIZE])
     return vectorstore
 
+def build_metadata_filter(document_ids=None, document_types=None, date_from=None, date_to=None):
+    """
+    Builds a Chroma `where` filter. Dates are YYYYMMDD ints. Returns None for no filter.
+    """
+    conditions = []
+    if document_ids:
+        conditions.append({"document_id": {"$in": list(document_ids)}})
+    if document_types:
+        conditions.append({"document_type": {"$in": list(document_types)}})
+    if date_from:
+        conditions.append({"document_date": {"$gte": int(date_from)}})
+    if date_to:
+        conditions.append({"document_date": {"$lte": int(date_to)}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+def get_multi_document_rag_chain(vectorstore, where=None, k=8):
+    """
+    RAG chain over a multi-document store. Every retrieved chunk is labelled
+    with its source document and page so answers can cite them.
+    """
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+    from llm_hooks import StageMetricsCallbackHandler
+
+    search_kwargs = {"k": k}
+    if where:
+        search_kwargs["filter"] = where
+    retriever = vectorstore.as_retriever(
+        search_type="similarity",
+        search_kwargs=search_kwargs
+    )
+
+    llm = get_llm()
+
+    system_prompt = (
+        "You are an expert legal assistant answering questions across several legal documents from the same matter. "
+        "Each piece of context is preceded by its source in square brackets. "
+
+        "Instructions:"
+        "1. If the information is not in the documents, clearly state that you don't know and cannot answer based on the provided documents."
+        "2. Cite the source document name and page for every fact you use, e.g. [Order.pdf, page 3]."
+        "3. When documents disagree, point out the difference and cite both."
+        "4. Explain legal terms and concepts in simple language."
+
+        "Context: {context}"
+        "{history}"
+    )
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "Question: {input}"),
+    ])
+    # Chat history (chat_memory.py) is optional, as in get_rag_chain
+    prompt = prompt.partial(history="")
+    document_prompt = PromptTemplate.from_template("[{filename}, page {page_number}]\n{page_content}")
+
+    question_answer_chain = create_stuff_documents_chain(llm, prompt, document_prompt=document_prompt)
+    return create_retrieval_chain(retriever, question_answer_chain).with_config(
+        callbacks=[StageMetricsCallbackHandler()]
+    )
+
+# ------------------ Judgment library (corpus index) ------------------ #
+CORPUS_INDEX_DIR = os.getenv("CORPUS_INDEX_DIR", "corpus_index")
+_corpus_index = None
+
+def get_corpus_index():
+    """
+    Opens the persistent judgment library index once per process, read-only:
+    ingest.py (or corpus_index.py compact) writes it, and searches pick up its flushes.
+    """
+    global _corpus_index
+    if _corpus_index is None:
+        from corpus_index import CorpusIndex
+        _corpus_index = CorpusIndex(CORPUS_INDEX_DIR, read_only=True)
+    return _corpus_index
+
+_corpus_retriever_class = None
+
+def get_corpus_retriever_class():
+    """
+    LangChain retriever over the corpus index, so it can be used in a RAG chain.
+    Defined on first use because subclassing BaseRetriever imports LangChain.
+    """
+    global _corpus_retriever_class
+    if _corpus_retriever_class is not None:
+        return _corpus_retriever_class
+
+    from langchain_core.retrievers import BaseRetriever
+    from langchain_core.documents import Document
+
+    class CorpusRetriever(BaseRetriever):
+        index: Any
+        embeddings: Any
+        k: int = 5
+        where: Optional[dict] = None
+
+        def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+            hits = self.index.search(self.embeddings.embed_query(query), k=self.k, where=self.where)
+            return [
+                Document(page_content=hit["text"], metadata=dict(hit["metadata"], score=hit["score"]))
+                for hit in hits
+            ]
+
+    _corpus_retriever_class = CorpusRetriever
+    return CorpusRetriever
+
+def get_corpus_rag_chain(index=None, k=8, where=None):
+    """
+    RAG chain that searches the whole judgment library instead of one document.
+    Chunks are expected to carry "filename" and "page_number" metadata.
+    """
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+    from llm_hooks import StageMetricsCallbackHandler
+
+    CorpusRetriever = get_corpus_retriever_class()
+    retriever = CorpusRetriever(index=index or get_corpus_index(), embeddings=get_embeddings(), k=k, where=where)
+
+    system_prompt = (
+        "You are an expert legal research assistant searching a library of court judgments. "
+        "Each piece of context is preceded by its source in square brackets. "
+        "Answer using only the context, cite the judgment and page for every point, "
+        "and say so clearly if the library does not contain the answer. "
+        "Context: {context}"
+        "{history}"
+    )
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "Question: {input}"),
+    ]).partial(history="")
+    document_prompt = PromptTemplate.from_template("[{filename}, page {page_number}]\n{page_content}")
+
+    question_answer_chain = create_stuff_documents_chain(get_llm(), prompt, document_prompt=document_prompt)
+    return create_retrieval_chain(retriever, question_answer_chain).with_config(
+        callbacks=[StageMetricsCallbackHandler()]
+    )
+
 # For backward compatibility and testing
 def main():
     """
@@ -0,0 +1,238 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from metrics import register, CallbackGauge, PROVIDER_TOKENS, PROVIDER_REQUESTS, PROVIDER_WAIT
+
+# ------------------ Default Provider Quotas ------------------ #
+# (requests per minute, tokens per minute, max concurrent calls)
+# Override per model with env vars, e.g. GROQ_LLAMA3_8B_8192_RPM=60
+DEFAULT_QUOTAS = {
+    ("groq", "llama3-8b-8192"): (30, 6000, 4),
+    ("gemini", "gemini-2.5-flash-preview-05-20"): (10, 250000, 4),
+    ("gemini", "models/embedding-001"): (100, 30000, 4),
+}
+FALLBACK_QUOTA = (15, 30000, 2)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about 4 characters per token for English text).
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def provider_env_key(provider: str, model: str, suffix: str) -> str:
+    name = f"{provider}_{model.split('/')[-1]}_{suffix}"
+    return "".join(c if c.isalnum() else "_" for c in name).upper()
+
+
+# ------------------ Token Bucket ------------------ #
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at capacity / period.
+    Not thread-safe on its own; ProviderLimiter holds the lock.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def debit(self, amount: float, now: float):
+        """Takes `amount` after the fact; the bucket may go negative until it refills."""
+        self._refill(now)
+        self.tokens -= amount
+
+
+# ------------------ Provider Limiter ------------------ #
+class ProviderLimiter:
+    """
+    Rate limiter and concurrency governor for one provider/model pair.
+
+    Callers are served strictly first-in-first-out: a request waits until it
+    is at the head of the queue, the request and token buckets both have room
+    and a concurrency slot is free. Nobody is rejected; they just queue.
+    """
+
+    def __init__(self, provider: str, model: str, requests_per_minute: int,
+                 tokens_per_minute: int, max_concurrency: int):
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._next_ticket = 0
+
+        # Stats
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent_waits = deque(maxlen=500)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until the call may proceed. Returns the time spent queueing in seconds.
+        """
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._queue[0] == ticket and self.in_flight < self.max_concurrency:
+                        delay = max(self.requests.time_until(1, now), self.tokens.time_until(tokens, now))
+                        if delay == 0:
+                            break
+                        self._cond.wait(timeout=delay)
+                    else:
+                        self._cond.wait()
+                self._queue.popleft()
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.in_flight += 1
+            except BaseException:
+                self._queue.remove(ticket)
+                raise
+            finally:
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start
+            self.total_requests += 1
+            self.total_tokens += tokens
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self._recent_waits.append(waited)
+        PROVIDER_REQUESTS.inc(provider=self.provider, model=self.model)
+        PROVIDER_TOKENS.inc(tokens, provider=self.provider, model=self.model)
+        PROVIDER_WAIT.observe(waited, provider=self.provider, model=self.model)
+        return waited
+
+    def charge(self, tokens: int):
+        """
+        Debits tokens only known after the call, such as the completion: providers
+        count them against TPM too. The bucket may go negative, so later callers
+        wait for them.
+        """
+        if tokens <= 0:
+            return
+        with self._cond:
+            self.tokens.debit(tokens, time.monotonic())
+            self.total_tokens += tokens
+        PROVIDER_TOKENS.inc(tokens, provider=self.provider, model=self.model)
+
+    def release(self):
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def limit(self, tokens: int = 0):
+        """Context manager form: `with limiter.limit(n): call_provider()`."""
+        self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._recent_waits)
+            p95 = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+            return {
+                "provider": self.provider,
+                "model": self.model,
+                "queue_depth": len(self._queue),
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "total_requests": self.total_requests,
+                "total_tokens": self.total_tokens,
+                "avg_wait_seconds": round(self.total_wait / self.total_requests, 4) if self.total_requests else 0.0,
+                "p95_wait_seconds": round(p95, 4),
+                "max_wait_seconds": round(self.max_wait, 4),
+            }
+
+
+# ------------------ Process-wide Registry ------------------ #
+_limiters: Dict[tuple, ProviderLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(provider: str, model: str) -> ProviderLimiter:
+    """
+    Returns the shared limiter for a provider/model, creating it on first use.
+    """
+    key = (provider, model)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rpm, tpm, concurrency = DEFAULT_QUOTAS.get(key, FALLBACK_QUOTA)
+            limiter = ProviderLimiter(
+                provider,
+                model,
+                requests_per_minute=int(os.getenv(provider_env_key(provider, model, "RPM"), rpm)),
+                tokens_per_minute=int(os.getenv(provider_env_key(provider, model, "TPM"), tpm)),
+                max_concurrency=int(os.getenv(provider_env_key(provider, model, "CONCURRENCY"), concurrency)),
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def limiter_stats() -> List[Dict[str, Any]]:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+def _limiter_samples(field: str):
+    for stats in limiter_stats():
+        yield {"provider": stats["provider"], "model": stats["model"]}, stats[field]
+
+
+register(CallbackGauge("legal_ai_provider_queue_depth", "Callers waiting in the rate limiter.",
+                       lambda: _limiter_samples("queue_depth")))
+register(CallbackGauge("legal_ai_provider_in_flight", "Provider calls currently in flight.",
+                       lambda: _limiter_samples("in_flight")))
+
+
+def limited_call(provider: str, model: str, prompt: Optional[str], func, *args, **kwargs):
+    """
+    Runs `func(*args, **kwargs)` under the limiter, charging tokens for `prompt`
+    and, when it returns text, for the completion.
+    """
+    limiter = get_limiter(provider, model)
+    with limiter.limit(estimate_tokens(prompt or "")):
+        result = func(*args, **kwargs)
+    if isinstance(result, str):
+        limiter.charge(estimate_tokens(result))
+    return result
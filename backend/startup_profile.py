@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Import-time profile for the FastAPI app.
+
+Imports main.py in a fresh interpreter with `python -X importtime`, prints the
+slowest top-level imports and the total, and exits non-zero when `import main`
+takes longer than the budget, so it can run in CI.
+
+Usage:
+    python startup_profile.py --budget 1.0 --top 15
+    python startup_profile.py --module rag_updated --json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile_import(module: str) -> Dict:
+    """Runs `import <module>` with -X importtime and returns wall time and per-module timings."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    env = dict(os.environ, WARMUP_ON_STARTUP="false")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    imports: List[Dict] = []
+    for line in result.stderr.splitlines():
+        # "import time:       123 |        456 |   package.module"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append({"module": name.strip(), "depth": depth,
+                        "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+
+    return {"module": module, "wall_seconds": float(result.stdout.strip().splitlines()[-1]), "imports": imports}
+
+
+def print_report(profile: Dict, top: int, budget: float):
+    # Depth 0 is interpreter startup and the target itself, depth 1 its direct imports
+    top_level = sorted((i for i in profile["imports"] if i["depth"] <= 1),
+                       key=lambda i: i["cumulative_ms"], reverse=True)
+    print(f"Slowest imports under `import {profile['module']}`:")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for entry in top_level[:top]:
+        print(f"{entry['cumulative_ms']:>14.1f}{entry['self_ms']:>10.1f}  {entry['module']}")
+
+    print(f"\n{len(profile['imports'])} modules imported")
+    status = "OK" if profile["wall_seconds"] <= budget else "OVER BUDGET"
+    print(f"import {profile['module']}: {profile['wall_seconds']:.3f}s (budget {budget:.3f}s) {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the app and enforce a startup budget.")
+    parser.add_argument("--module", default="main", help="Module to import (default: main).")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0")),
+                        help="Maximum allowed import time in seconds.")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list.")
+    parser.add_argument("--json", action="store_true", help="Print the full profile as JSON.")
+    args = parser.parse_args()
+
+    profile = profile_import(args.module)
+    if args.json:
+        print(json.dumps(dict(profile, budget_seconds=args.budget), indent=2))
+    else:
+        print_report(profile, args.top, args.budget)
+    sys.exit(0 if profile["wall_seconds"] <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
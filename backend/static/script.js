@@ -81,14 +81,18 @@ function handleDrop(e) {
     dropzone.classList.remove('dragover');
 
     const files = e.dataTransfer.files;
-    if (files.length > 0) {
+    if (files.length > 1) {
+        handleBundleUpload(files);
+    } else if (files.length > 0) {
         handleFileUpload(files[0]);
     }
 }
 
 function handleFileSelect(e) {
     const files = e.target.files;
-    if (files.length > 0) {
+    if (files.length > 1) {
+        handleBundleUpload(files);
+    } else if (files.length > 0) {
         handleFileUpload(files[0]);
     }
 }
@@ -151,6 +155,81 @@ async function handleFileUpload(file) {
     }
 }
 
+// Bundle upload handler: uploads all files at once and shows per-file progress
+async function handleBundleUpload(files) {
+    if (isProcessing) return;
+
+    isProcessing = true;
+    showLoading(true);
+    dropzone.classList.add('upload-animation');
+
+    try {
+        const formData = new FormData();
+        for (const file of files) {
+            formData.append('files', file);
+        }
+
+        const response = await fetch('/upload-batch', {
+            method: 'POST',
+            body: formData
+        });
+
+        if (!response.ok) {
+            const result = await response.json();
+            showUploadStatus(result.detail || 'Bundle upload failed', 'error');
+            return;
+        }
+
+        // The server streams one JSON line per finished file
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let total = files.length;
+        let finished = 0;
+        let firstSessionId = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const update = JSON.parse(line);
+                if (update.files) {
+                    finished = update.files.filter(f => f.status === 'rejected').length;
+                } else if (update.session_id) {
+                    finished += 1;
+                    if (update.status === 'done' && !firstSessionId) {
+                        firstSessionId = update.session_id;
+                    }
+                }
+                showUploadStatus(`Processed ${finished} of ${total} files...`, 'info');
+            }
+        }
+
+        if (firstSessionId) {
+            currentSessionId = firstSessionId;
+            showUploadStatus(`Bundle processed: ${finished} of ${total} files.`, 'success');
+            showActionSection();
+        } else {
+            showUploadStatus('None of the files in the bundle could be processed.', 'error');
+        }
+    } catch (error) {
+        showUploadStatus('Network error. Please try again.', 'error');
+        console.error('Bundle upload error:', error);
+    } finally {
+        isProcessing = false;
+        showLoading(false);
+        dropzone.classList.remove('upload-animation');
+        setTimeout(() => {
+            fileInput.value = '';
+        }, 100);
+    }
+}
+
 // Show upload status
 function showUploadStatus(message, type) {
     uploadStatus.textContent = message;
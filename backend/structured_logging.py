@@ -0,0 +1,195 @@
+"""
+Non-blocking JSON logging.
+
+    from structured_logging import setup_logging, bind_request, bind_session
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+    logger.info("RAG session created", extra={"chunks": 42})
+
+Records are sampled per level and put on a bounded in-memory queue by the
+calling thread; a QueueListener thread formats them as one JSON object per line
+and writes them to stdout. Every record carries the current request_id,
+session_id and trace_id (set per request by main.py). Prompt-like fields and
+long messages from LLM/HTTP libraries are redacted unless LOG_PROMPTS=true.
+
+Environment:
+    LOG_LEVEL            level for the app's own loggers (default INFO)
+    LOG_LIBRARY_LEVEL    level for langchain, httpx, chromadb, ... (default WARNING)
+    LOG_SAMPLE_RATES     share of records kept per level, e.g. "DEBUG=0.01,INFO=1"
+    LOG_PROMPTS          log prompt text and full library messages (default false)
+    LOG_QUEUE_SIZE       records buffered before new ones are dropped (default 10000)
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from metrics import register, Counter
+from tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LIBRARY_LEVEL = os.getenv("LOG_LIBRARY_LEVEL", "WARNING").upper()
+LOG_PROMPTS = os.getenv("LOG_PROMPTS", "false").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_MESSAGE_CHARS = 500
+
+# Loggers that can echo prompts, documents or request bodies at DEBUG/INFO
+LIBRARY_LOGGERS = ["langchain", "langchain_core", "langchain_community", "langchain_google_genai",
+                   "langchain_groq", "groq", "google", "httpx", "httpcore", "urllib3", "chromadb",
+                   "multipart", "PIL"]
+# Extra fields that hold prompt or document text
+REDACTED_FIELDS = {"prompt", "prompts", "messages", "document", "document_text", "text", "question", "answer"}
+
+LOG_RECORDS_DROPPED = register(Counter("legal_ai_log_records_dropped_total",
+                                       "Log records dropped because the log queue was full."))
+
+_request_id: ContextVar = ContextVar("request_id", default=None)
+_session_id: ContextVar = ContextVar("session_id", default=None)
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_CONTEXT_ATTRS = ("request_id", "session_id", "trace_id")
+
+
+# ------------------ Correlation ids ------------------ #
+def bind_request(request_id: str):
+    """Sets the request id for the current context. Returns a token for reset_request()."""
+    return _request_id.set(request_id)
+
+
+def reset_request(token):
+    _request_id.reset(token)
+
+
+def bind_session(session_id: Optional[str]):
+    """Sets the session id for the current context. Returns a token for reset_session()."""
+    return _session_id.set(session_id)
+
+
+def reset_session(token):
+    _session_id.reset(token)
+
+
+# ------------------ Sampling ------------------ #
+def parse_sample_rates(value: str) -> Dict[int, float]:
+    """'DEBUG=0.01,INFO=0.5' -> {10: 0.01, 20: 0.5}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of records per level; levels without a rate are always kept."""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+# ------------------ Handler and formatter ------------------ #
+class ContextQueueHandler(QueueHandler):
+    """
+    Captures the correlation ids and renders the message on the calling thread
+    (both are cheap), leaving JSON formatting and I/O to the listener thread.
+    Never blocks: when the queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = current_span()
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = _request_id.get()
+        record.session_id = _session_id.get()
+        record.trace_id = span.trace.trace_id if span else None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def _redact(value):
+    if LOG_PROMPTS:
+        return value
+    return f"<redacted {len(str(value))} chars>"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with extra fields and prompt redaction."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.msg if isinstance(record.msg, str) else str(record.msg)
+        is_library = record.name.split(".")[0] in LIBRARY_LOGGERS
+        if is_library and not LOG_PROMPTS and len(message) > LOG_MAX_MESSAGE_CHARS:
+            message = message[:LOG_MAX_MESSAGE_CHARS] + f"... <truncated {len(message) - LOG_MAX_MESSAGE_CHARS} chars>"
+
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        for key in _CONTEXT_ATTRS:
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key not in _CONTEXT_ATTRS:
+                entry[key] = _redact(value) if key in REDACTED_FIELDS else value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+# ------------------ Setup ------------------ #
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging():
+    """
+    Routes all logging through the queue handler. Safe to call more than once.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = ContextQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter(parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.01"))))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        for name in LIBRARY_LOGGERS:
+            logging.getLogger(name).setLevel(LOG_LIBRARY_LEVEL)
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)  # flush what is still queued on exit
@@ -0,0 +1,110 @@
+"""
+Summary nodes for the RAG index, and the per-question choice of level.
+
+With `/create-rag/{session_id}?summaries=true` the vector store holds, next to
+the raw 1000-char chunks (level 0), the nodes of the document's summary tree
+(see summary_tree.py): section summaries at level 1, merged summaries above
+them and the whole-document summary at the top level.
+
+    plan_retrieval("What was the court's overall reasoning?", top_level=2)
+    -> {"scope": "broad", "levels": [2, 1], "k": 3}
+
+Broad questions are answered from a few summary nodes, specific ones (dates,
+amounts, sections, pages, names) from raw chunks, and anything else searches
+every level and lets similarity decide.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from metrics import register, Counter
+
+BROAD_K = 3
+SPECIFIC_K = 5
+MIXED_K = 5
+
+BROAD_PATTERNS = [
+    r"\boverall\b",
+    r"\bsummar(y|ise|ize)\b",
+    r"\b(whole|entire) (document|judgment|order|case|agreement)\b",
+    r"\bwhat is (this|the) (document|judgment|case|order|agreement) about\b",
+    r"\bmain (issues?|points?|arguments?|findings?|question)\b",
+    r"\b(reasoning|rationale|ratio)\b",
+    r"\b(outcome|conclusion|verdict|final decision)\b",
+    r"\bin (general|short|brief)\b",
+    r"\bbig picture\b",
+    r"\b(themes?|gist)\b",
+]
+SPECIFIC_PATTERNS = [
+    r"\d",
+    r"\b(page|para(graph)?|section|clause|article|rule|order) \w+",
+    r"\bwho (is|was|are|were)\b",
+    r"\b(when|what date|how much|how many|which (court|judge|section|act))\b",
+    r"\b(amount|date|deadline|address|name|citation)s?\b",
+    r"[\"“].+?[\"”]",
+]
+
+RETRIEVAL_SCOPES = register(Counter("legal_ai_rag_retrieval_scope_total",
+                                    "Questions by retrieval scope (broad/specific/mixed) in summary-tree RAG."))
+
+_broad = [re.compile(p) for p in BROAD_PATTERNS]
+_specific = [re.compile(p) for p in SPECIFIC_PATTERNS]
+
+
+def question_scope(question: str) -> str:
+    """broad, specific or mixed (both or neither kind of pattern matched)."""
+    text = " ".join(question.lower().split())
+    broad = any(p.search(text) for p in _broad)
+    specific = any(p.search(text) for p in _specific)
+    if broad and not specific:
+        return "broad"
+    if specific and not broad:
+        return "specific"
+    return "mixed"
+
+
+def plan_retrieval(question: str, top_level: int) -> Dict:
+    """
+    Levels to search and how many nodes to fetch for a question.
+    `levels` None means every level.
+    """
+    scope = question_scope(question)
+    RETRIEVAL_SCOPES.inc(scope=scope)
+    if scope == "broad" and top_level > 0:
+        return {"scope": scope, "levels": sorted({top_level, max(1, top_level - 1)}, reverse=True), "k": BROAD_K}
+    if scope == "specific" or top_level == 0:
+        return {"scope": scope, "levels": [0], "k": SPECIFIC_K}
+    return {"scope": scope, "levels": None, "k": MIXED_K}
+
+
+def level_filter(levels: Optional[List[int]], document_id: Optional[str] = None) -> Optional[Dict]:
+    """Chroma metadata filter for the planned levels, limited to one document when given."""
+    conditions = []
+    if levels is not None:
+        conditions.append({"level": levels[0]} if len(levels) == 1 else {"level": {"$in": levels}})
+    if document_id is not None:
+        conditions.append({"document_id": document_id})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def summary_nodes(tree: Dict, document_id: Optional[str] = None) -> Tuple[List[str], List[Dict]]:
+    """
+    (texts, metadatas) for every node of a summary tree, ready to embed.
+    The whole-document node comes last and has the highest level.
+    Nodes are tagged with `document_id` (the session id) when given.
+    """
+    texts, metadatas = [], []
+    for depth, level in enumerate(tree["levels"], start=1):
+        for node in level:
+            first, last = node["pages"]
+            texts.append(f"[Summary of pages {first}-{last}]\n{node['text']}")
+            metadatas.append({"level": depth, "node": "section" if depth == 1 else "merged",
+                              "first_page": first, "last_page": last})
+    top = len(tree["levels"]) + 1
+    texts.append(f"[Summary of the whole document]\n{tree['root']['medium']}")
+    metadatas.append({"level": top, "node": "document", "first_page": 1, "last_page": tree["pages"]})
+    if document_id is not None:
+        for metadata in metadatas:
+            metadata["document_id"] = document_id
+    return texts, metadatas
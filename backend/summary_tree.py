@@ -0,0 +1,276 @@
+"""
+Hierarchical (map-reduce) summaries of long documents.
+
+    tree = build_summary_tree(pages, document_type="Judgment")
+    summary_from_tree(tree, "short")   # served from the tree, no model call
+
+Pages are packed into groups of about GROUP_TOKENS tokens and every group is
+summarised in parallel. While the group summaries together are still too long
+for one prompt they are grouped and summarised again, and a last call writes
+the root summary in two lengths. Every node is cached by a hash of its input,
+so a repeat request (or the same judgment uploaded again) costs no model calls
+and only the changed groups are re-summarised after an edit.
+
+Lengths:
+    short   root summary, one paragraph
+    medium  root summary, a few paragraphs with headings
+    long    the first-level group summaries, in page order
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+from token_budget import count_tokens, split_to_budget
+from metrics import record_cache, stage_timer
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LENGTHS = ("short", "medium", "long")
+GROUP_TOKENS = int(os.getenv("SUMMARY_GROUP_TOKENS", "6000"))
+ROOT_INPUT_TOKENS = int(os.getenv("SUMMARY_ROOT_INPUT_TOKENS", "12000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "4096"))
+MAX_LEVELS = 6
+# Bump when the prompts change so cached nodes are not reused
+PROMPT_VERSION = "1"
+
+# Replies from _call_gemini_api that mean the call failed; these are never cached
+GEMINI_FAILURES = ("API Key Missing.", "An error occurred", "The document is too large")
+
+
+class SummaryFailed(RuntimeError):
+    pass
+
+
+# ------------------ Prompts ------------------ #
+def section_prompt(text: str, document_type: str, first_page: int, last_page: int) -> str:
+    return f"""
+    You are a legal document assistant. The following is pages {first_page}-{last_page} of a longer
+    {document_type or "legal document"}. Summarize this part in plain language. Keep every party,
+    date, amount, legal provision, argument, finding and order it mentions, with names, numbers and
+    citations exactly as written. Do not add commentary.
+
+    Document Part:
+    {text}
+    """
+
+
+def merge_prompt(text: str, document_type: str) -> str:
+    return f"""
+    You are a legal document assistant. The following are summaries of consecutive parts of a
+    {document_type or "legal document"}. Combine them into one plain-language summary in the same
+    order, dropping repetition but keeping every party, date, amount, provision, finding and order.
+
+    Part Summaries:
+    {text}
+    """
+
+
+def root_prompt(text: str, document_type: str) -> str:
+    return f"""
+    You are a legal document assistant. The following are summaries of consecutive parts of a
+    {document_type or "legal document"}. Write two plain-language summaries of the whole document:
+
+    - "short": one paragraph of 3-5 sentences covering what the document is, who is involved and the outcome.
+    - "medium": a few paragraphs with the headings Overview, Parties, Key Issues, Findings or Terms,
+      and Outcome and Next Steps.
+
+    Respond with only a JSON object: {{"short": "...", "medium": "..."}}
+
+    Part Summaries:
+    {text}
+    """
+
+
+# ------------------ Cache ------------------ #
+_cache: "OrderedDict[str, object]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def node_key(kind: str, text: str, document_type: str) -> str:
+    """Content hash identifying one summary node."""
+    digest = hashlib.sha256()
+    for part in (PROMPT_VERSION, kind, document_type, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _cache_get(key: str):
+    with _cache_lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+    record_cache("summary_node", value is not None)
+    return value
+
+
+def _cache_put(key: str, value):
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > SUMMARY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# ------------------ Building the tree ------------------ #
+def pack_groups(parts: List[Tuple[str, int, int]], budget: int) -> List[Tuple[str, int, int]]:
+    """
+    Packs consecutive (text, first_page, last_page) parts into groups of at most
+    `budget` tokens. Parts longer than the budget are split on paragraph breaks.
+    """
+    groups, current, first, last, tokens = [], [], 0, 0, 0
+    for text, part_first, part_last in parts:
+        if not text.strip():
+            continue
+        pieces = split_to_budget(text, budget) if count_tokens(text) > budget else [text]
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if current and tokens + piece_tokens > budget:
+                groups.append(("\n\n".join(current), first, last))
+                current, tokens = [], 0
+            if not current:
+                first = part_first
+            current.append(piece)
+            last = part_last
+            tokens += piece_tokens
+    if current:
+        groups.append(("\n\n".join(current), first, last))
+    return groups
+
+
+def _summarize_nodes(groups: List[Tuple[str, int, int]], kind: str, document_type: str,
+                     call_model: Callable[[str], str], stats: Dict) -> List[Dict]:
+    """Summarises each group (cached ones are reused), in parallel. Returns nodes in order."""
+    def summarize(group):
+        text, first, last = group
+        key = node_key(kind, text, document_type)
+        cached = _cache_get(key)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            return {"text": cached, "pages": [first, last], "key": key}
+        prompt = (section_prompt(text, document_type, first, last) if kind == "section"
+                  else merge_prompt(text, document_type))
+        summary = call_model(prompt).strip()
+        if not summary or summary.startswith(GEMINI_FAILURES):
+            raise SummaryFailed(summary or "Empty summary")
+        _cache_put(key, summary)
+        stats["model_calls"] += 1
+        return {"text": summary, "pages": [first, last], "key": key}
+
+    # One context copy per group so usage and trace spans reach the current request
+    contexts = [copy_context() for _ in groups]
+    with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_WORKERS, len(groups)))) as pool:
+        return list(pool.map(lambda ctx, group: ctx.run(summarize, group), contexts, groups))
+
+
+def _as_parts(nodes: List[Dict]) -> List[Tuple[str, int, int]]:
+    return [(f"[Pages {node['pages'][0]}-{node['pages'][1]}]\n{node['text']}", *node["pages"]) for node in nodes]
+
+
+def parse_root(reply: str) -> Dict[str, str]:
+    """{"short", "medium"} from the root reply; falls back to the first paragraph for short."""
+    text = reply.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict) and parsed.get("short") and parsed.get("medium"):
+            return {"short": str(parsed["short"]).strip(), "medium": str(parsed["medium"]).strip()}
+    except ValueError:
+        pass
+    return {"short": text.split("\n\n")[0].strip(), "medium": text}
+
+
+def build_summary_tree(pages: List[str], document_type: str = "",
+                       call_model: Optional[Callable[[str], str]] = None) -> Dict:
+    """
+    Builds (or fetches from the cache) the summary tree of a document.
+
+    Args:
+        pages: cleaned text of each page.
+        call_model: prompt -> reply; defaults to the Gemini API.
+
+    Returns a dict with `levels` (lists of nodes, first level first; each node has
+    text and its [first, last] page), `root` ({"short", "medium"}), `model_calls`
+    and `cache_hits` for this build.
+    """
+    if call_model is None:
+        import enhanced_tools
+        call_model = lambda prompt: enhanced_tools._call_gemini_api(prompt)
+
+    tree_key = node_key("tree", "\f".join(pages), document_type)
+    cached_tree = _cache_get(tree_key)
+    if cached_tree is not None:
+        return dict(cached_tree, model_calls=0, cache_hits=1, cached=True)
+
+    stats = {"model_calls": 0, "cache_hits": 0}
+    parts = [(page, number, number) for number, page in enumerate(pages, start=1)]
+    groups = pack_groups(parts, GROUP_TOKENS)
+    if not groups:
+        raise SummaryFailed("The document has no text to summarize.")
+
+    levels = []
+    with stage_timer("summary_sections"):
+        nodes = _summarize_nodes(groups, "section", document_type, call_model, stats)
+    levels.append(nodes)
+
+    # Reduce until the summaries fit in the root prompt
+    while count_tokens("\n\n".join(text for text, _, _ in _as_parts(nodes))) > ROOT_INPUT_TOKENS:
+        if len(levels) >= MAX_LEVELS:
+            break
+        groups = pack_groups(_as_parts(nodes), GROUP_TOKENS)
+        if len(groups) >= len(nodes):
+            # Every summary fills a group on its own; merge pairs so the tree still shrinks
+            groups = [("\n\n".join(text for text, _, _ in pair), pair[0][1], pair[-1][2])
+                      for pair in (_as_parts(nodes)[i:i + 2] for i in range(0, len(nodes), 2))]
+        with stage_timer("summary_merge"):
+            nodes = _summarize_nodes(groups, "merge", document_type, call_model, stats)
+        levels.append(nodes)
+
+    root_input = "\n\n".join(text for text, _, _ in _as_parts(nodes))
+    root_key = node_key("root", root_input, document_type)
+    root = _cache_get(root_key)
+    if root is None:
+        with stage_timer("summary_root"):
+            reply = call_model(root_prompt(root_input, document_type))
+        if not reply.strip() or reply.strip().startswith(GEMINI_FAILURES):
+            raise SummaryFailed(reply.strip() or "Empty summary")
+        root = parse_root(reply)
+        _cache_put(root_key, root)
+        stats["model_calls"] += 1
+    else:
+        stats["cache_hits"] += 1
+
+    tree = {"levels": levels, "root": root, "pages": len(pages)}
+    _cache_put(tree_key, tree)
+    logger.info("Summary tree built", extra={"pages": len(pages), "levels": [len(level) for level in levels],
+                                             "model_calls": stats["model_calls"],
+                                             "cache_hits": stats["cache_hits"]})
+    return dict(tree, **stats, cached=False)
+
+
+def summary_from_tree(tree: Dict, length: str = "medium") -> str:
+    """One of SUMMARY_LENGTHS, read from an already built tree."""
+    if length not in SUMMARY_LENGTHS:
+        raise ValueError(f"Unknown length '{length}', expected one of {', '.join(SUMMARY_LENGTHS)}")
+    if length == "long":
+        return "\n\n".join(f"Pages {node['pages'][0]}-{node['pages'][1]}:\n{node['text']}"
+                           for node in tree["levels"][0])
+    return tree["root"][length]
+
+
+def summarize_pages(pages: List[str], document_type: str = "", length: str = "medium") -> str:
+    """Convenience wrapper: build (or reuse) the tree and return one summary."""
+    return summary_from_tree(build_summary_tree(pages, document_type), length)
@@ -0,0 +1,41 @@
+import threading
+
+import chat_memory
+from chat_memory import ChatMemory, COMPACT_BATCH_TURNS, HISTORY_TOKENS
+from token_budget import count_tokens
+
+
+def long_turn(i):
+    return f"question {i} " + "word " * 60, "answer " * 60
+
+
+def wait_idle():
+    chat_memory._pool().submit(lambda: None).result(timeout=5)
+
+
+def test_compaction_waits_for_a_full_batch():
+    calls = []
+    memory = ChatMemory(compact=lambda prompt: calls.append(prompt) or "summary")
+    i = 0
+    while memory.stats()["pending_turns"] < COMPACT_BATCH_TURNS - 1:
+        memory.add_turn(*long_turn(i))
+        i += 1
+    wait_idle()
+    assert calls == []
+    memory.add_turn(*long_turn(i))
+    wait_idle()
+    assert len(calls) == 1
+    assert memory.stats()["pending_turns"] == 0
+
+
+def test_pending_turns_stay_in_history_within_budget():
+    release = threading.Event()
+    memory = ChatMemory(compact=lambda prompt: release.wait(5) and "summary")
+    for i in range(12):
+        memory.add_turn(*long_turn(i))
+    history = memory.history()
+    release.set()
+    assert count_tokens(history) <= HISTORY_TOKENS
+    assert "question 11 " in history
+    # The newest pending turn fills the room left by the recent window
+    assert f"question {11 - memory.stats()['recent_turns']} " in history
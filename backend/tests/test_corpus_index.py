@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from corpus_index import CorpusIndex, IndexLocked, Shard
+
+DIM = 8
+
+
+def document_vectors(seed, n=4):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def add(index, number, n=4):
+    vectors = document_vectors(number, n)
+    index.add_document(f"doc{number}", [f"doc{number} chunk {i}" for i in range(n)], vectors,
+                       content_hash=f"hash{number}")
+    return vectors
+
+
+def found(index, vectors):
+    """doc_ids among the top hits for each of a document's vectors"""
+    return {hit["metadata"]["doc_id"] for vector in vectors for hit in index.search(vector, k=3, nprobe=64)}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = CorpusIndex(str(tmp_path / "index"), dim=DIM, background_compaction=False)
+    yield index
+    index.close()
+
+
+def test_add_search_and_delete(index):
+    vectors = [add(index, number) for number in range(3)]
+    index.flush()
+    assert "doc1" in found(index, vectors[1])
+    assert index.has_hash("hash1")
+
+    assert index.delete_document("doc1")
+    assert "doc1" not in found(index, vectors[1])
+    assert not index.has_hash("hash1")
+    assert len(index) == 8
+    assert not index.delete_document("doc1")
+
+
+def test_replacing_a_document_hides_its_old_chunks(index):
+    old = add(index, 0)
+    index.flush()
+    index.add_document("doc0", ["new chunk"], document_vectors(99, 1), content_hash="new")
+    hits = [hit for vector in old for hit in index.search(vector, k=5, nprobe=64)]
+    assert {hit["text"] for hit in hits if hit["metadata"]["doc_id"] == "doc0"} == {"new chunk"}
+
+
+def test_compaction_drops_tombstoned_rows(index):
+    vectors = [add(index, number) for number in range(3)]
+    index.flush()
+    index.delete_document("doc0")
+    index.compact()
+    assert len(index.shards) == 1 and len(index.shards[0]) == 8
+    assert index.tombstones == set()
+    assert "doc0" not in found(index, vectors[0])
+    assert "doc2" in found(index, vectors[2])
+
+
+def test_delete_during_compaction_stays_deleted(index, monkeypatch):
+    vectors = [add(index, number) for number in range(3)]
+    index.flush()
+    index.delete_document("doc0")
+
+    # Delete doc1 after compaction took its snapshot, while the merged shard is written
+    write = Shard.write.__func__
+
+    def write_then_delete(cls, *args):
+        shard = write(cls, *args)
+        index.delete_document("doc1")
+        return shard
+
+    monkeypatch.setattr(Shard, "write", classmethod(write_then_delete))
+    index.compact()
+    monkeypatch.undo()
+
+    # doc1's rows were copied into the merged shard, so their tombstones must survive
+    assert len(index.tombstones) == 4
+    assert "doc1" not in found(index, vectors[1])
+    assert "doc0" not in found(index, vectors[0])
+
+    path = index.path
+    index.close()
+    reopened = CorpusIndex(path, background_compaction=False)
+    try:
+        assert "doc1" not in reopened.documents
+        assert "doc1" not in found(reopened, vectors[1])
+        assert "doc2" in found(reopened, vectors[2])
+        reopened.compact()
+        assert reopened.tombstones == set() and len(reopened) == 4
+    finally:
+        reopened.close()
+
+
+def test_one_writer_many_readers(index):
+    with pytest.raises(IndexLocked):
+        CorpusIndex(index.path)
+    vectors = add(index, 0)
+    index.flush()
+    reader = CorpusIndex(index.path, read_only=True)
+    try:
+        assert "doc0" in found(reader, vectors)
+        with pytest.raises(RuntimeError):
+            reader.delete_document("doc0")
+    finally:
+        reader.close()
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from fact_index import FactIndex, extract_facts, normalise_date
+from text_cleaner import clean_pages
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "..",
+                          "Mr_Vijay_Agarwal_Ors_vs_Harinarayan_G_Bajaj_Ors_on_27_February_2013.PDF")
+
+
+@pytest.fixture(scope="module")
+def sample():
+    fitz = pytest.importorskip("fitz")
+    if not os.path.exists(SAMPLE_PDF):
+        pytest.skip("sample judgment not found")
+    with fitz.open(SAMPLE_PDF) as pdf_document:
+        pages, _ = clean_pages([page.get_text() for page in pdf_document])
+    return FactIndex.from_pages(pages)
+
+
+def values(index, kind, **filters):
+    return [fact["value"] for fact in index.facts(kind, **filters)]
+
+
+def test_sample_judgment_facts(sample):
+    assert values(sample, "title") == ["Mr.Vijay Agarwal & Ors vs Harinarayan G.Bajaj & Ors"]
+    assert values(sample, "party", role="appellant") == ["Mr.Vijay Agarwal & Ors"]
+    assert values(sample, "party", role="respondent") == ["Harinarayan G.Bajaj & Ors"]
+    assert "APPEAL NO.200 OF 2012" in values(sample, "case_number")
+    assert "CHAMBER SUMMONS NO.106 OF 2010" in values(sample, "case_number")
+    assert values(sample, "court") == ["HIGH COURT OF JUDICATURE AT BOMBAY"]
+    assert [f["normalized"] for f in sample.facts("judgment_date")] == ["2013-02-27"]
+    assert {"AIR 1981 SC 1786", "(1984) 1 SCC 358", "(2009) 12 SCC 689"} <= set(values(sample, "citation"))
+    assert "Section 446(1) of the Companies Act, 1956" in values(sample, "provision")
+    assert values(sample, "amount") == ["Rs.20,000/-"]
+
+
+def test_each_judge_is_listed_once_with_all_roles(sample):
+    judges = sample.facts("judge")
+    assert [(f["value"], f["role"]) for f in judges] == [("D.Y.Chandrachud", "author, bench, coram"),
+                                                         ("A.A. Sayed", "bench, coram")]
+
+
+def test_facts_keep_page_and_offset(sample):
+    citation = sample.facts("citation", contains="1981 sc 1786")[0]
+    assert citation["page"] == 4 and citation["offset"] > 0
+
+
+def test_lookup_answers(sample):
+    assert sample.answer("What is the case number?")["answer"].startswith("Case number: APPEAL NO.200 OF 2012, page 1")
+    assert sample.answer("Who are the respondents?")["answer"] == "Parties: Harinarayan G.Bajaj & Ors (respondent), page 1"
+    assert sample.answer("When was the judgment delivered?")["answer"] == \
+        "Date of judgment: 27 February, 2013 (2013-02-27), page 1"
+    assert sample.answer("Why was the amendment allowed?") is None
+
+
+def test_normalise_date():
+    assert normalise_date("27 February, 2013") == "2013-02-27"
+    assert normalise_date("February 27, 2013") == "2013-02-27"
+    assert normalise_date("27.02.2013") == "2013-02-27"
+    assert normalise_date("31 February, 2013") is None
+
+
+def test_judge_spellings_merge_without_the_pdf():
+    pages = ["Author: D.Y. Chandrachud\nBench: Hon'ble Justice D.Y.Chandrachud, A.A. Sayed\n",
+             "CORAM : DR.D.Y.CHANDRACHUD AND\nA.A. SAYED, JJ.\n"]
+    judges = [(f["value"], f["role"]) for f in extract_facts(pages) if f["kind"] == "judge"]
+    assert judges == [("D.Y. Chandrachud", "author, bench, coram"), ("A.A. Sayed", "bench, coram")]
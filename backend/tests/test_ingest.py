@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from ingest import Checkpoint, discover_jobs, file_sha256, ingest, prepare_file
+
+
+class HashEmbeddings:
+    """Deterministic 8-dimensional vectors, so ingest runs without a provider"""
+
+    def embed_documents(self, texts):
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest()[:32], dtype=np.uint8)[:8].astype(float) + 1
+                for t in texts]
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.done["/a.pdf"] = "hash-a"
+    checkpoint.failed["/b.pdf"] = "ValueError: broken"
+    checkpoint.save()
+
+    reloaded = Checkpoint(checkpoint.path)
+    assert reloaded.done == {"/a.pdf": "hash-a"}
+    assert reloaded.failed == {"/b.pdf": "ValueError: broken"}
+    assert not (tmp_path / "checkpoint.json.tmp").exists()
+
+
+def test_discover_jobs_from_directory_and_manifest(tmp_path):
+    write(tmp_path / "b.txt", "b")
+    write(tmp_path / "a.pdf", "a")
+    write(tmp_path / "notes.docx", "ignored")
+    assert [job["path"] for job in discover_jobs(str(tmp_path))] == [str(tmp_path / "a.pdf"), str(tmp_path / "b.txt")]
+
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"path": str(tmp_path / "b.txt"), "metadata": {"court": "Bombay"}}) + "\n")
+    assert discover_jobs(str(manifest)) == [{"path": str(tmp_path / "b.txt"), "metadata": {"court": "Bombay"}}]
+
+
+def test_resume_skips_only_unchanged_files(tmp_path):
+    path = write(tmp_path / "order.txt", "Original order text.")
+    done_hash = file_sha256(path)
+    assert prepare_file({"path": path, "done_hash": done_hash})["unchanged"]
+
+    # Edited in place since the checkpoint: hashed again and processed, not skipped
+    write(tmp_path / "order.txt", "Amended order text.")
+    result = prepare_file({"path": path, "done_hash": done_hash})
+    assert not result["unchanged"] and not result["skipped"]
+    assert result["hash"] == file_sha256(path) != done_hash
+
+
+def test_ingest_resume_reindexes_changed_files(tmp_path):
+    pytest.importorskip("langchain.text_splitter")
+    source = tmp_path / "archive"
+    source.mkdir()
+    write(source / "one.txt", "The appeal is allowed. " * 20)
+    write(source / "two.txt", "The petition is dismissed. " * 20)
+    index_dir, checkpoint = str(tmp_path / "index"), str(tmp_path / "checkpoint.json")
+
+    def run():
+        ingest(str(source), index_dir, 1, checkpoint, flush_every=1, embeddings=HashEmbeddings())
+        from corpus_index import CorpusIndex
+        index = CorpusIndex(index_dir, read_only=True)
+        return index.documents, Checkpoint(checkpoint).done
+
+    documents, done = run()
+    assert set(documents) == {"one.txt", "two.txt"}
+    first_hash = documents["one.txt"]["hash"]
+
+    write(source / "one.txt", "The appeal is dismissed with costs. " * 20)
+    documents, done = run()
+    assert documents["one.txt"]["hash"] == done[str(source / "one.txt")] != first_hash
+    assert documents["two.txt"]["hash"] == done[str(source / "two.txt")]
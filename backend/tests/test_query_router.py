@@ -0,0 +1,69 @@
+import pytest
+
+from fact_index import FactIndex, question_kind
+from query_router import classify_question, route_question
+
+PAGES = [
+    "IN THE HIGH COURT OF JUDICATURE AT BOMBAY\n"
+    "Appeal No. 1011 of 2012\n"
+    "Mr. Vijay Agarwal & Ors. ... Appellants\n"
+    "versus\n"
+    "Harinarayan G. Bajaj & Ors. ... Respondents\n"
+    "CORAM: Dr. D.Y. Chandrachud and A.A. Sayed, JJ.\n"
+    "Judgment pronounced on: 27 February 2013\n",
+    "The respondents claimed Rs. 5,00,000 as compensation under Section 9 of the "
+    "Arbitration and Conciliation Act, 1996. Section 5 of the Limitation Act was held inapplicable. "
+    "The arbitration clause in the agreement is discussed here.",
+]
+
+# Analytical questions that share keywords with the lookup patterns
+ANALYTICAL = [
+    "Was the appeal allowed or dismissed, and on what terms regarding costs?",
+    "Is the respondent liable to pay compensation?",
+    "What was decided about the bench's earlier order?",
+    "Which sections of the Limitation Act were held inapplicable?",
+    "Who are the parties to the arbitration agreement?",
+    "Where is the arbitration clause discussed and why was it ignored?",
+]
+
+
+@pytest.fixture(scope="module")
+def facts():
+    return FactIndex.from_pages(PAGES)
+
+
+@pytest.mark.parametrize("question", ANALYTICAL)
+def test_analytical_questions_are_not_lookups(question):
+    assert question_kind(question) is None
+    assert classify_question(question) == "analytical"
+
+
+@pytest.mark.parametrize("question", ANALYTICAL)
+def test_analytical_questions_go_to_rag(facts, question):
+    decision = route_question(question, facts, PAGES)
+    assert decision["route"] == "analytical"
+    assert decision["answer"] is None
+
+
+@pytest.mark.parametrize("question, kind", [
+    ("What is the case number?", ("case_number", None)),
+    ("Who are the parties in this case?", ("party", None)),
+    ("Who are the respondents?", ("party", "respondent")),
+    ("Who were the judges?", ("judge", None)),
+    ("What was the date of the judgment?", ("judgment_date", None)),
+    ("Which sections were cited?", ("provision", None)),
+])
+def test_lookup_questions(question, kind):
+    assert question_kind(question) == kind
+    assert classify_question(question) == "fact"
+
+
+@pytest.mark.parametrize("question", [
+    "What page mentions the arbitration clause?",
+    "Where is the arbitration clause mentioned?",
+    "Is there any reference to Section 9?",
+])
+def test_search_questions(facts, question):
+    decision = route_question(question, facts, PAGES)
+    assert decision["route"] == "search"
+    assert decision["pages"] == [2]
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from rate_limiter import ProviderLimiter, TokenBucket, estimate_tokens, get_limiter, limited_call
+
+
+def limiter(rpm=10000, tpm=1000000, concurrency=1):
+    return ProviderLimiter("test", "model", requests_per_minute=rpm, tokens_per_minute=tpm,
+                           max_concurrency=concurrency)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_callers_are_served_first_in_first_out():
+    shared = limiter(concurrency=1)
+    shared.acquire()
+    order = []
+
+    def call(name):
+        with shared.limit():
+            order.append(name)
+
+    threads = []
+    for name in "abcde":
+        thread = threading.Thread(target=call, args=(name,))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: shared.stats()["queue_depth"] == len(threads))
+    shared.release()
+    for thread in threads:
+        thread.join()
+    assert order == list("abcde")
+
+
+def test_concurrency_cap():
+    shared = limiter(concurrency=2)
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def call():
+        with shared.limit():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert shared.stats()["total_requests"] == 8 and shared.in_flight == 0
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(600, period=60)  # 10 tokens per second
+    now = time.monotonic()
+    assert bucket.time_until(600, now) == 0
+    bucket.take(600)
+    assert abs(bucket.time_until(10, now) - 1.0) < 0.01
+
+
+def test_completion_tokens_are_charged_after_the_call():
+    shared = limiter(tpm=600)
+    shared.acquire(100)
+    shared.release()
+    shared.charge(450)
+    assert shared.stats()["total_tokens"] == 550
+    # 50 tokens left of 600: a 100-token prompt has to wait about 5 seconds of refill
+    assert shared.tokens.time_until(100, time.monotonic()) > 4
+
+
+def test_limited_call_charges_prompt_and_completion():
+    result = limited_call("test", "limited-call", "x" * 400, lambda: "y" * 800)
+    assert result == "y" * 800
+    assert get_limiter("test", "limited-call").stats()["total_tokens"] == estimate_tokens("x" * 400) + estimate_tokens("y" * 800)
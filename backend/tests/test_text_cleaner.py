@@ -0,0 +1,51 @@
+from text_cleaner import clean_pages, clean_text, find_repeated_lines
+
+BANNER = "Indian Kanoon - http://indiankanoon.org/doc/168886022/"
+TITLE = "Mr.Vijay Agarwal & Ors vs Harinarayan G.Bajaj & Ors on 27 February, 2013"
+
+
+def judgment_page(number, body):
+    return "\n".join([TITLE, f"VBC {number}/4 app200.12", *body, TITLE, BANNER, str(number)])
+
+
+def test_short_order_keeps_repeated_body_text():
+    pages = [
+        "ORDER\nThe Respondent No.1 shall file a reply.\nSection 9 of the Arbitration Act applies.\n1",
+        "ORDER\nThe Respondent No.1 shall file a reply.\nSection 9 of the Arbitration Act applies.\n2",
+    ]
+    assert find_repeated_lines(pages) == set()
+    cleaned, stats = clean_pages(pages)
+    for page in cleaned:
+        assert page == "ORDER\nThe Respondent No.1 shall file a reply.\nSection 9 of the Arbitration Act applies."
+    assert stats["removed_lines"] == 2  # only the page numbers
+
+
+def test_headers_and_footers_are_removed_after_the_first():
+    pages = [judgment_page(n, ["The appellants filed a chamber summons.",
+                               "The respondents opposed it.",
+                               "The appellants rely on Section 5.",
+                               "Paragraph %d of the judgment." % n]) for n in range(1, 5)]
+    cleaned, stats = clean_pages(pages)
+
+    assert cleaned[0].startswith(TITLE)
+    assert all(TITLE not in page and "VBC" not in page for page in cleaned[1:])
+    assert all(BANNER not in page for page in cleaned)
+    assert all(page.splitlines()[-1].startswith("Paragraph") for page in cleaned[1:])
+    # Body lines repeated on every page are not header/footer candidates
+    assert all("The respondents opposed it." in page for page in cleaned)
+    assert stats["tokens_after"] < stats["tokens_before"] and stats["reduction_pct"] > 0
+
+
+def test_repeated_body_line_in_the_middle_of_a_page_is_kept():
+    body = ["Line one of the page.", "Line two of the page.", "Line three of the page.",
+            "The Respondent No.1 shall file a reply.",
+            "Line five of the page.", "Line six of the page.", "Line seven of the page."]
+    pages = ["\n".join(body)] * 4
+    cleaned, _ = clean_pages(pages)
+    assert all("The Respondent No.1 shall file a reply." in page for page in cleaned)
+
+
+def test_clean_text_joins_pages_and_collapses_whitespace():
+    text, stats = clean_text(["  First   page  \n\n\n\nstill first", "", BANNER + "\nSecond page"])
+    assert text == "First page\nstill first\n\nSecond page"
+    assert stats["pages"] == 3
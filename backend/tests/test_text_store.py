@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import text_store
+from text_store import delete_store, has_store, join_pages, open_store, read_pages, write_store
+
+# Multi-byte characters so byte and character offsets differ
+PAGES = ["Page one — ₹20,000/- awarded. " * 80, "", "Page three: Section 446(1) " * 120, "Last page é."]
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_store, "TEXT_STORE_DIR", str(tmp_path))
+    yield
+    with text_store._open_lock:
+        text_store._open_stores.clear()
+
+
+def test_pages_and_ranges_match_the_joined_text():
+    text, spans = join_pages(PAGES)
+    write_store("doc", PAGES, {"text_cleanup": {"tokens_before": 10}})
+    store = open_store("doc")
+
+    assert store.page_count == 4 and store.char_count == len(text)
+    for number, page in enumerate(PAGES, start=1):
+        assert store.page(number) == page
+        assert store.page_span(number) == spans[number - 1]
+    for start, end in [(0, 10), (1000, 1100), (1020, 3100), (len(text) - 5, len(text) + 50), (5, 5)]:
+        assert store.text(start, end) == text[start:end]
+    assert store.page_at(spans[2][0] + 3) == 3
+    assert store.metadata == {"text_cleanup": {"tokens_before": 10}}
+    with pytest.raises(IndexError):
+        store.page(5)
+
+
+def test_range_limit(monkeypatch):
+    monkeypatch.setattr(text_store, "MAX_RANGE_CHARS", 100)
+    write_store("doc", PAGES)
+    assert len(open_store("doc").text(0, 100)) == 100
+    with pytest.raises(ValueError):
+        open_store("doc").text(0, 101)
+
+
+def test_read_pages_round_trip():
+    write_store("doc", PAGES)
+    text, spans, metadata = read_pages("doc")
+    assert (text, spans, metadata) == (*join_pages(PAGES), {})
+
+
+def test_delete_store():
+    write_store("doc", PAGES)
+    open_store("doc")
+    delete_store("doc")
+    assert not has_store("doc")
+    with pytest.raises(FileNotFoundError):
+        open_store("doc")
+
+
+def test_reads_survive_eviction(monkeypatch):
+    monkeypatch.setattr(text_store, "MAX_OPEN_STORES", 1)
+    for name in ("a", "b", "c"):
+        write_store(name, PAGES)
+    errors, stop = [], threading.Event()
+
+    def read():
+        while not stop.is_set():
+            for name in ("a", "b", "c"):
+                try:
+                    store = open_store(name)
+                    store.page(3)
+                    store.text(1000, 3000)
+                except Exception as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    stop.wait(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_a_closed_store_maps_the_file_again():
+    write_store("doc", PAGES)
+    store = open_store("doc")
+    store.close()
+    assert store.page(4) == PAGES[3]
@@ -0,0 +1,77 @@
+import pytest
+
+from token_budget import (TRUNCATION_MARKER, PromptTooLarge, count_tokens, end_usage, fit_to_budget, guard_prompt,
+                          input_budget, record_usage, split_to_budget, start_usage, truncate_to_budget)
+
+PARAGRAPH = "The appellants moved a chamber summons to amend the plaint under Order VI Rule 17. "
+
+
+def document(tokens):
+    text = ""
+    while count_tokens(text) < tokens:
+        text += PARAGRAPH + "\n\n"
+    return text
+
+
+def test_text_that_fits_is_passed_through():
+    text = document(100)
+    assert fit_to_budget(text, 200, map_fn=lambda chunk: pytest.fail("no condensing needed")) == (text, "single")
+
+
+def test_slight_overflow_is_truncated_keeping_start_and_end():
+    text = "START " + document(1100) + " END"
+    fitted, strategy = fit_to_budget(text, 1000, map_fn=lambda chunk: pytest.fail("should truncate"))
+    assert strategy == "truncate"
+    assert count_tokens(fitted) <= 1000
+    assert fitted.startswith("START") and fitted.endswith("END") and TRUNCATION_MARKER in fitted
+
+
+def test_without_map_fn_any_overflow_is_truncated():
+    fitted, strategy = fit_to_budget(document(5000), 1000)
+    assert strategy == "truncate" and count_tokens(fitted) <= 1000
+
+
+def test_large_overflow_is_condensed_chunk_by_chunk():
+    chunks = []
+
+    def condense(chunk):
+        chunks.append(chunk)
+        assert count_tokens(chunk) <= 300
+        return "key facts"
+
+    fitted, strategy = fit_to_budget(document(3000), 1000, map_fn=condense, chunk_budget=300)
+    assert strategy == "map_reduce"
+    assert len(chunks) >= 10
+    assert fitted == "\n\n".join(["key facts"] * len(chunks))
+
+
+def test_condensing_that_does_not_shrink_enough_is_truncated():
+    fitted, strategy = fit_to_budget(document(3000), 1000, map_fn=lambda chunk: chunk)
+    assert strategy == "map_reduce" and count_tokens(fitted) <= 1000
+
+
+def test_split_prefers_paragraph_breaks():
+    pieces = split_to_budget(document(500), 100)
+    assert all(count_tokens(piece) <= 100 for piece in pieces)
+    assert all(piece.endswith(PARAGRAPH.strip()) for piece in pieces)
+
+
+def test_truncate_without_tail():
+    text = document(500)
+    assert truncate_to_budget(text, 100, keep_tail=False) == text[:400 - len(TRUNCATION_MARKER)]
+
+
+def test_budget_accounts_for_template_and_guard_rejects_oversized_prompts():
+    assert input_budget("groq", "llama3-8b-8192", "x" * 400) == input_budget("groq", "llama3-8b-8192") - 100
+    guard_prompt("groq", "llama3-8b-8192", document(1000))
+    with pytest.raises(PromptTooLarge):
+        guard_prompt("groq", "llama3-8b-8192", document(8000))
+
+
+def test_usage_is_recorded_per_request():
+    token = start_usage()
+    record_usage("groq", "llama3-8b-8192", prompt_tokens=100, completion_tokens=20)
+    record_usage("gemini", "gemini-2.5-flash-preview-05-20", prompt_tokens=50)
+    usage = end_usage(token)
+    assert (usage["calls"], usage["prompt_tokens"], usage["completion_tokens"]) == (2, 150, 20)
+    assert usage["models"]["llama3-8b-8192"]["completion_tokens"] == 20
@@ -0,0 +1,133 @@
+"""
+Boilerplate stripping for extracted document text.
+
+Downloaded judgments repeat the case title, the "Indian Kanoon - http://..."
+banner, running headers such as "VBC 3/14 app200.12-27.2" and a page number on
+every page. None of that helps the LLM or retrieval, so it is removed before
+prompting and embedding:
+
+    pages, stats = clean_pages(page_texts)
+    stats -> {"tokens_before": 10250, "tokens_after": 9320, "reduction_pct": 9.1, ...}
+
+A line counts as boilerplate when (after masking digits) it is among the first
+or last EDGE_LINES lines of at least half of the pages, in documents of at least
+MIN_REPEAT_PAGES pages. Only those header/footer positions are stripped, so a
+party name or "ORDER" repeated in the body stays. The first occurrence is kept
+so the title survives once.
+"""
+import re
+from typing import Dict, List, Tuple
+
+from rate_limiter import estimate_tokens
+
+# Repeated lines must appear on at least this share of pages, in documents this long or longer
+REPEAT_THRESHOLD = 0.5
+MIN_REPEAT_PAGES = 3
+# Header/footer candidates: this many non-blank lines at the top and bottom of each page
+EDGE_LINES = 3
+MAX_BOILERPLATE_LINE = 200  # longer lines are body text even if repeated
+
+# Always removed, even in single-page documents
+KNOWN_BOILERPLATE = [
+    re.compile(r"^indian kanoon\s*-\s*https?://(www\.)?indiankanoon\.org/\S*$", re.IGNORECASE),
+    re.compile(r"^downloaded (from|on)\b.*\b(indiankanoon|scc online|manupatra)\b.*$", re.IGNORECASE),
+]
+# Page numbers, removed only as the first or last line of a page
+PAGE_NUMBER = re.compile(r"^(page\s*)?[-– ]*\d{1,4}[-– ]*((of|/)\s*\d{1,4})?$", re.IGNORECASE)
+
+_SPACES = re.compile(r"[ \t ]+")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_DIGITS = re.compile(r"\d+")
+_LETTERS = re.compile(r"[a-zA-Z]")
+
+
+def _line_key(line: str) -> str:
+    """Comparison key: lowercased, whitespace collapsed, digits masked (page 3/14 == page 4/14)."""
+    return _DIGITS.sub("#", _SPACES.sub(" ", line.strip().lower()))
+
+
+def collapse_whitespace(text: str) -> str:
+    """Strips lines, collapses space runs and keeps at most one blank line between paragraphs."""
+    lines = [_SPACES.sub(" ", line).strip() for line in text.splitlines()]
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _is_edge(index: int, count: int) -> bool:
+    """Whether line `index` of `count` non-blank lines is in a page's header or footer."""
+    return index < EDGE_LINES or index >= count - EDGE_LINES
+
+
+def find_repeated_lines(pages: List[str]) -> set:
+    """Header/footer line keys that occur on at least REPEAT_THRESHOLD of the pages."""
+    if len(pages) < MIN_REPEAT_PAGES:
+        return set()
+    page_counts: Dict[str, int] = {}
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        for key in {_line_key(line) for index, line in enumerate(lines) if _is_edge(index, len(lines))}:
+            if len(key) <= MAX_BOILERPLATE_LINE and len(_LETTERS.findall(key)) >= 3:
+                page_counts[key] = page_counts.get(key, 0) + 1
+    minimum = max(2, int(len(pages) * REPEAT_THRESHOLD + 0.5))
+    return {key for key, count in page_counts.items() if count >= minimum}
+
+
+def clean_pages(pages: List[str]) -> Tuple[List[str], Dict]:
+    """
+    Removes repeated headers/footers, known banners and page numbers from each
+    page and collapses whitespace. Returns (cleaned pages, stats).
+    """
+    repeated = find_repeated_lines(pages)
+    seen = set()
+    removed_lines = 0
+    cleaned = []
+
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        kept = []
+        for index, line in enumerate(lines):
+            stripped = line.strip()
+            key = _line_key(stripped)
+            if any(pattern.match(stripped) for pattern in KNOWN_BOILERPLATE):
+                removed_lines += 1
+                continue
+            if key in repeated and _is_edge(index, len(lines)):
+                if key in seen:
+                    removed_lines += 1
+                    continue
+                seen.add(key)
+            if PAGE_NUMBER.match(stripped) and index in (0, len(lines) - 1):
+                removed_lines += 1
+                continue
+            kept.append(line)
+        cleaned.append(collapse_whitespace("\n".join(kept)))
+
+    before = "".join(pages)
+    after = "\n\n".join(cleaned)
+    tokens_before, tokens_after = estimate_tokens(before), estimate_tokens(after)
+    stats = {
+        "pages": len(pages),
+        "removed_lines": removed_lines,
+        "chars_before": len(before),
+        "chars_after": len(after),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "reduction_pct": round((1 - tokens_after / tokens_before) * 100, 1) if tokens_before else 0.0,
+    }
+    return cleaned, stats
+
+
+def clean_text(pages: List[str]) -> Tuple[str, Dict]:
+    """clean_pages, joined into one string with blank lines between pages."""
+    cleaned, stats = clean_pages(pages)
+    return "\n\n".join(page for page in cleaned if page), stats
+
+
+if __name__ == "__main__":
+    import sys
+    import fitz  # PyMuPDF
+
+    for path in sys.argv[1:]:
+        with fitz.open(path) as pdf_document:
+            _, result = clean_pages([page.get_text() for page in pdf_document])
+        print(f"{path}: {result['tokens_before']} -> {result['tokens_after']} tokens "
+              f"(-{result['reduction_pct']}%), {result['removed_lines']} lines removed")
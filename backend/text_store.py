@@ -0,0 +1,247 @@
+"""
+Page-addressable store for extracted document text.
+
+One file per document, named after the upload's sha256, memory-mapped on read:
+
+    header       magic b"LTXS", version, page count, checkpoint interval,
+                 checkpoint count, metadata length (bytes), text length (chars)
+    pages        uint64 x 4 per page: char start, char end, byte start, byte end
+    checkpoints  uint64 byte offset of every CHECKPOINT_CHARS-th character
+    metadata     JSON (e.g. the boilerplate-stripping stats)
+    text         UTF-8, pages joined by blank lines (same offsets as the
+                 document text main.py hands to the prompts)
+
+    path = write_store(sha256, pages, metadata={"text_cleanup": stats})
+    store = open_store(sha256)
+    store.page(37)            # text of page 37, one slice
+    store.text(10500, 11200)  # characters 10500-11200: one checkpoint + a short decode
+
+Both lookups cost the same whatever the document size, so snippets for
+citations never need the PDF again.
+"""
+import os
+import json
+import mmap
+import struct
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+TEXT_STORE_DIR = os.getenv("TEXT_STORE_DIR", "text_store")
+CHECKPOINT_CHARS = 1024
+MAX_RANGE_CHARS = int(os.getenv("TEXT_STORE_MAX_RANGE_CHARS", "20000"))
+MAX_OPEN_STORES = int(os.getenv("TEXT_STORE_MAX_OPEN", "64"))  # mapped files kept open, least recently used closed
+PAGE_SEPARATOR = "\n\n"
+
+MAGIC = b"LTXS"
+VERSION = 1
+# magic, version, reserved, pages, checkpoint interval, checkpoints, metadata bytes, text chars
+HEADER = struct.Struct("<4sHHIIIIQ")
+
+
+def store_path(document_hash: str) -> str:
+    return os.path.join(TEXT_STORE_DIR, f"{document_hash}.ltxs")
+
+
+def join_pages(pages: List[str]) -> Tuple[str, List[Tuple[int, int]]]:
+    """Joins non-empty pages with blank lines. Returns (text, (char start, char end) of each page)."""
+    parts, spans, offset = [], [], 0
+    for page in pages:
+        if page and parts:
+            parts.append(PAGE_SEPARATOR)
+            offset += len(PAGE_SEPARATOR)
+        if page:
+            parts.append(page)
+        spans.append((offset, offset + len(page)))
+        offset += len(page)
+    return "".join(parts), spans
+
+
+# ------------------ Writing ------------------ #
+def write_store(document_hash: str, pages: List[str], metadata: Optional[Dict] = None) -> str:
+    """Writes (atomically) the store for a document. Returns its path."""
+    text, spans = join_pages(pages)
+    data = text.encode("utf-8")
+
+    # Byte offset of every CHECKPOINT_CHARS-th character, plus the end
+    checkpoints = array("Q")
+    byte_offset = 0
+    for start in range(0, len(text), CHECKPOINT_CHARS):
+        checkpoints.append(byte_offset)
+        byte_offset += len(text[start:start + CHECKPOINT_CHARS].encode("utf-8"))
+    checkpoints.append(len(data))
+
+    page_table = array("Q")
+    for char_start, char_end in spans:
+        page_table.extend((char_start, char_end,
+                           _byte_offset(text, checkpoints, char_start), _byte_offset(text, checkpoints, char_end)))
+
+    meta = json.dumps(metadata or {}).encode("utf-8")
+    path = store_path(document_hash)
+    os.makedirs(TEXT_STORE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(spans), CHECKPOINT_CHARS, len(checkpoints), len(meta), len(text)))
+        f.write(page_table.tobytes())
+        f.write(checkpoints.tobytes())
+        f.write(meta)
+        f.write(data)
+    os.replace(tmp, path)
+    _forget(document_hash)
+    return path
+
+
+def _byte_offset(text: str, checkpoints: array, char_offset: int) -> int:
+    checkpoint = min(char_offset // CHECKPOINT_CHARS, len(checkpoints) - 1)
+    start = checkpoint * CHECKPOINT_CHARS
+    return checkpoints[checkpoint] + len(text[start:char_offset].encode("utf-8"))
+
+
+# ------------------ Reading ------------------ #
+class TextStore:
+    """
+    Read-only, memory-mapped view of one document's store. Safe to share between
+    threads: close() waits for running reads, and a read on a closed store maps
+    the file again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._closing = False
+        self._mmap = self._map()
+        (magic, version, _, self.page_count, self.interval, count, meta_length,
+         self.char_count) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} text store")
+        offset = HEADER.size
+
+        self._pages = array("Q")
+        self._pages.frombytes(self._mmap[offset:offset + self.page_count * 32])
+        offset += self.page_count * 32
+        self._checkpoints = array("Q")
+        self._checkpoints.frombytes(self._mmap[offset:offset + count * 8])
+        offset += count * 8
+        self.metadata = json.loads(self._mmap[offset:offset + meta_length] or b"{}")
+        self._text_start = offset + meta_length
+        self._page_starts = [self._pages[i * 4] for i in range(self.page_count)]
+
+    def _map(self) -> mmap.mmap:
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @contextmanager
+    def _reading(self):
+        """The mapping, kept open until the read is done"""
+        with self._lock:
+            if self._mmap.closed:
+                # Evicted or deleted after the caller got this store; FileNotFoundError once deleted
+                self._mmap = self._map()
+            self._readers += 1
+            mapped = self._mmap
+        try:
+            yield mapped
+        finally:
+            with self._lock:
+                self._readers -= 1
+                if self._closing and not self._readers:
+                    self._mmap.close()
+
+    def page_span(self, number: int) -> Tuple[int, int]:
+        """(char start, char end) of a 1-based page."""
+        if not 1 <= number <= self.page_count:
+            raise IndexError(f"Page {number} out of range 1-{self.page_count}")
+        base = (number - 1) * 4
+        return self._pages[base], self._pages[base + 1]
+
+    def page(self, number: int) -> str:
+        """Text of a 1-based page."""
+        self.page_span(number)
+        base = (number - 1) * 4
+        start, end = self._text_start + self._pages[base + 2], self._text_start + self._pages[base + 3]
+        with self._reading() as mapped:
+            return mapped[start:end].decode("utf-8")
+
+    def page_at(self, char_offset: int) -> int:
+        """1-based page containing a character offset."""
+        return max(1, bisect.bisect_right(self._page_starts, char_offset))
+
+    def text(self, start: int, end: int) -> str:
+        """Characters [start, end) of the document text, at most MAX_RANGE_CHARS of them."""
+        start, end = max(0, start), min(end, self.char_count)
+        if end <= start:
+            return ""
+        if end - start > MAX_RANGE_CHARS:
+            raise ValueError(f"Range of {end - start} chars exceeds the limit of {MAX_RANGE_CHARS}")
+        checkpoint = start // self.interval
+        skip = start - checkpoint * self.interval
+        # A UTF-8 character is at most 4 bytes; the cut-off partial character is dropped
+        byte_start = self._text_start + self._checkpoints[checkpoint]
+        with self._reading() as mapped:
+            byte_end = min(len(mapped), byte_start + 4 * (skip + end - start))
+            return mapped[byte_start:byte_end].decode("utf-8", errors="ignore")[skip:skip + end - start]
+
+    def full_text(self) -> str:
+        with self._reading() as mapped:
+            return mapped[self._text_start:].decode("utf-8")
+
+    def close(self):
+        """Unmaps the file now, or when the last running read finishes."""
+        with self._lock:
+            self._closing = True
+            if not self._readers:
+                self._mmap.close()
+
+
+_open_stores: "OrderedDict[str, TextStore]" = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def has_store(document_hash: str) -> bool:
+    return os.path.exists(store_path(document_hash))
+
+
+def open_store(document_hash: str) -> TextStore:
+    """
+    Opens the store of a document, keeping the MAX_OPEN_STORES most recently used
+    open. Raises FileNotFoundError if missing.
+    """
+    with _open_lock:
+        store = _open_stores.get(document_hash)
+        if store is None:
+            store = _open_stores[document_hash] = TextStore(store_path(document_hash))
+            while len(_open_stores) > MAX_OPEN_STORES:
+                _, evicted = _open_stores.popitem(last=False)
+                evicted.close()
+        else:
+            _open_stores.move_to_end(document_hash)
+        return store
+
+
+def _forget(document_hash: str, close: bool = False):
+    # Without close, readers holding the old mapping keep working (it is freed with
+    # the last reference); new readers get the rewritten file
+    with _open_lock:
+        store = _open_stores.pop(document_hash, None)
+    if store is not None and close:
+        store.close()
+
+
+def delete_store(document_hash: str):
+    """Closes and removes a document's store, e.g. when its session is deleted."""
+    _forget(document_hash, close=True)
+    try:
+        os.remove(store_path(document_hash))
+    except FileNotFoundError:
+        pass
+
+
+def read_pages(document_hash: str) -> Tuple[str, List[Tuple[int, int]], Dict]:
+    """(text, page spans, metadata) of a stored document, e.g. to skip re-extracting a re-upload."""
+    store = open_store(document_hash)
+    text = store.full_text()
+    return text, [store.page_span(n) for n in range(1, store.page_count + 1)], store.metadata
@@ -0,0 +1,169 @@
+"""
+Token accounting and context-window guard shared by every prompt builder.
+
+    budget = input_budget("groq", "llama3-8b-8192", prompt_template)
+    text, strategy = fit_to_budget(document_text, budget, map_fn=condense)
+
+fit_to_budget() passes text through when it fits, truncates it (keeping the
+start and the end) when it overflows by a little, and otherwise condenses it
+chunk by chunk with `map_fn` (map-reduce) until it fits. Prompts that still
+would not fit raise PromptTooLarge before any provider is called.
+
+Token usage of every provider call made while handling a request is added up
+by record_usage() and reported by main.py (X-Token-Usage header, access log).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+from rate_limiter import estimate_tokens, provider_env_key
+from metrics import register, Counter
+
+# ------------------ Per-model budgets ------------------ #
+# (context window, tokens reserved for the completion)
+# Override with env vars, e.g. GROQ_LLAMA3_8B_8192_CONTEXT=8192, GEMINI_..._MAX_INPUT=200000
+MODEL_LIMITS = {
+    ("groq", "llama3-8b-8192"): (8192, 1024),
+    ("gemini", "gemini-2.5-flash-preview-05-20"): (1048576, 8192),
+    ("gemini", "models/embedding-001"): (2048, 0),
+}
+FALLBACK_LIMITS = (8192, 1024)
+# Cap on prompt size regardless of context window, so one huge document can't burn the quota
+DEFAULT_MAX_INPUT = 200000
+# estimate_tokens() is approximate; leave headroom below the real window
+SAFETY_MARGIN = 0.9
+# Overflow up to this factor is truncated; beyond it the text is condensed chunk by chunk
+TRUNCATE_SLACK = 1.25
+MAX_REDUCE_ROUNDS = 3
+
+TRUNCATION_MARKER = "\n\n[... text omitted to fit the model's context window ...]\n\n"
+
+PROMPT_FIT = register(Counter("legal_ai_prompt_fit_total",
+                              "Prompt fitting decisions by model and strategy (single/truncate/map_reduce)."))
+COMPLETION_TOKENS = register(Counter("legal_ai_provider_completion_tokens_total",
+                                     "Estimated completion tokens received per provider/model."))
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+def model_limits(provider: str, model: str) -> Tuple[int, int, int]:
+    """(context window, completion reserve, max input) for a model."""
+    context, reserve = MODEL_LIMITS.get((provider, model), FALLBACK_LIMITS)
+    context = int(os.getenv(provider_env_key(provider, model, "CONTEXT"), context))
+    max_input = int(os.getenv(provider_env_key(provider, model, "MAX_INPUT"), DEFAULT_MAX_INPUT))
+    return context, reserve, max_input
+
+
+def input_budget(provider: str, model: str, template: str = "") -> int:
+    """Tokens left for the document in one prompt built from `template` (the prompt without the document)."""
+    context, reserve, max_input = model_limits(provider, model)
+    available = min(int((context - reserve) * SAFETY_MARGIN), max_input)
+    return max(0, available - count_tokens(template))
+
+
+def guard_prompt(provider: str, model: str, prompt: str):
+    """Raises PromptTooLarge instead of sending a prompt the model would reject."""
+    if count_tokens(prompt) > input_budget(provider, model):
+        raise PromptTooLarge(f"Prompt of ~{count_tokens(prompt)} tokens exceeds the {model} budget of "
+                             f"{input_budget(provider, model)} tokens")
+
+
+# ------------------ Fitting text ------------------ #
+def truncate_to_budget(text: str, budget: int, keep_tail: bool = True) -> str:
+    """Cuts text to about `budget` tokens, keeping the start (and the last fifth when keep_tail)."""
+    if count_tokens(text) <= budget:
+        return text
+    chars = max(0, budget * 4 - len(TRUNCATION_MARKER))
+    if not keep_tail:
+        return text[:chars]
+    head = int(chars * 0.8)
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (chars - head):]
+
+
+def split_to_budget(text: str, budget: int) -> List[str]:
+    """Splits text into pieces of at most `budget` tokens, preferring paragraph and line breaks."""
+    max_chars = max(1, budget * 4)
+    chunks = []
+    while len(text) > max_chars:
+        cut = max(text.rfind("\n\n", 0, max_chars), text.rfind("\n", 0, max_chars))
+        if cut < max_chars // 2:
+            cut = text.rfind(" ", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = max_chars
+        chunks.append(text[:cut].strip())
+        text = text[cut:]
+    if text.strip():
+        chunks.append(text.strip())
+    return chunks
+
+
+def fit_to_budget(text: str, budget: int, map_fn: Optional[Callable[[str], str]] = None,
+                  model: str = "unknown", chunk_budget: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Returns (text that fits in `budget` tokens, strategy used).
+
+    Args:
+        map_fn: condenses one chunk (e.g. an LLM call extracting key facts). Without
+            it, overflowing text is always truncated.
+        chunk_budget: tokens per chunk passed to map_fn (defaults to `budget`).
+    """
+    if count_tokens(text) <= budget:
+        PROMPT_FIT.inc(model=model, strategy="single")
+        return text, "single"
+    if map_fn is None or count_tokens(text) <= budget * TRUNCATE_SLACK:
+        PROMPT_FIT.inc(model=model, strategy="truncate")
+        return truncate_to_budget(text, budget), "truncate"
+
+    for _ in range(MAX_REDUCE_ROUNDS):
+        chunks = split_to_budget(text, chunk_budget or budget)
+        # One context copy per chunk so usage and trace spans reach the current request
+        contexts = [copy_context() for _ in chunks]
+        with ThreadPoolExecutor(max_workers=min(4, len(chunks))) as pool:
+            text = "\n\n".join(pool.map(lambda ctx, chunk: ctx.run(map_fn, chunk), contexts, chunks))
+        if count_tokens(text) <= budget:
+            break
+    PROMPT_FIT.inc(model=model, strategy="map_reduce")
+    return truncate_to_budget(text, budget), "map_reduce"
+
+
+# ------------------ Per-request usage ------------------ #
+_usage: ContextVar = ContextVar("token_usage", default=None)
+_usage_lock = threading.Lock()
+
+
+def start_usage():
+    """Starts counting usage for the current context (a request). Returns a token for end_usage()."""
+    return _usage.set({"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "models": {}})
+
+
+def end_usage(token) -> Dict:
+    usage = _usage.get()
+    _usage.reset(token)
+    return usage
+
+
+def current_usage() -> Optional[Dict]:
+    return _usage.get()
+
+
+def record_usage(provider: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0, calls: int = 1):
+    """Adds one provider call to the current request's usage (no-op outside a request)."""
+    if completion_tokens:
+        COMPLETION_TOKENS.inc(completion_tokens, provider=provider, model=model)
+    usage = _usage.get()
+    if usage is None:
+        return
+    with _usage_lock:
+        per_model = usage["models"].setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        for entry in (usage, per_model):
+            entry["calls"] += calls
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
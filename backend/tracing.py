@@ -0,0 +1,175 @@
+"""
+Lightweight per-request tracing.
+
+Each HTTP request gets a trace with a root span; `span("name")` blocks nested
+inside it (including work moved to threads with asyncio.to_thread, which copies
+the context) become child spans. The finished span tree is returned in the
+Server-Timing header, optionally as debug JSON, and can be appended to a file
+as OpenTelemetry-compatible JSON records (TRACE_EXPORT_FILE).
+"""
+import os
+import json
+import time
+import queue
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.add(self)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """OTLP/JSON-style span record."""
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def tree(self) -> List[Dict[str, Any]]:
+        """Finished spans as a nested tree of {name, duration_ms, attributes, children}."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        nodes = {
+            s.span_id: {"name": s.name, "duration_ms": round(s.duration_ms, 3),
+                        "attributes": s.attributes, "error": s.error, "children": []}
+            for s in spans
+        }
+        roots = []
+        for s in spans:
+            parent = nodes.get(s.parent_id)
+            (parent["children"] if parent else roots).append(nodes[s.span_id])
+        return roots
+
+    def server_timing(self) -> str:
+        """Server-Timing header value with one entry per span, in start order."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        entries = []
+        for s in spans:
+            token = "total" if s.parent_id is None else "".join(c if c.isalnum() or c in "_-" else "_" for c in s.name)
+            desc = s.name.replace('"', "'")
+            entries.append(f'{token};dur={s.duration_ms:.1f};desc="{desc}"')
+        return ", ".join(entries)
+
+
+# ------------------ API ------------------ #
+def start_trace(name: str, **attributes):
+    """Starts a new trace whose root span becomes current. Returns (span, context token)."""
+    root = Span(name, Trace(), **attributes)
+    return root, _current_span.set(root)
+
+
+def end_trace(root: Span, token, error: Optional[BaseException] = None):
+    root.finish(error)
+    _current_span.reset(token)
+    export(root.trace)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current span. A no-op (yields None) outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, parent, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Manual span for callback-style APIs: child of the current span, not made current."""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace, parent, **attributes)
+
+
+# ------------------ Export ------------------ #
+_export_queue: "queue.Queue" = queue.Queue()
+_writer_started = False
+_writer_lock = threading.Lock()
+
+
+def _writer():
+    while True:
+        records = [_export_queue.get()]
+        while not _export_queue.empty():
+            records.append(_export_queue.get_nowait())
+        with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+
+def export(trace: Trace):
+    """Queue the trace's spans for the export file (written by a background thread)."""
+    global _writer_started
+    if not TRACE_EXPORT_FILE:
+        return
+    with _writer_lock:
+        if not _writer_started:
+            threading.Thread(target=_writer, daemon=True).start()
+            _writer_started = True
+    _export_queue.put({
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "legal-document-ai"}}]},
+            "scopeSpans": [{"scope": {"name": "legal_ai.tracing"}, "spans": [s.to_otel() for s in trace.spans]}],
+        }]
+    })
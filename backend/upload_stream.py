@@ -0,0 +1,301 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# ------------------ Upload Settings ------------------ #
+MB = 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50")) * MB
+# Whole request body of /upload-batch (all files together)
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE_MB", "500")) * MB
+FORM_OVERHEAD = 64 * 1024  # multipart boundaries, part headers and small form fields
+MAX_FIELD_SIZE = 64 * 1024
+# Uploads up to this size are also kept in memory so extraction can skip the disk
+MEMORY_CACHE_SIZE = int(os.getenv("UPLOAD_MEMORY_CACHE_MB", "20")) * MB
+# ...as long as all of them together stay under this, and for at most this long
+MEMORY_CACHE_TOTAL = int(os.getenv("UPLOAD_MEMORY_CACHE_TOTAL_MB", "200")) * MB
+MEMORY_CACHE_TTL = float(os.getenv("UPLOAD_MEMORY_CACHE_TTL_SECONDS", "600"))
+
+MAGIC_BYTES = {
+    ".pdf": [b"%PDF-"],
+    ".jpg": [b"\xff\xd8\xff"],
+    ".jpeg": [b"\xff\xd8\xff"],
+}
+MAGIC_LENGTH = 16
+
+
+class UploadRejected(Exception):
+    """Raised when an upload fails validation. `status_code` is the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_magic_bytes(head: bytes, file_extension: str):
+    """
+    Checks the first bytes of the file against the declared extension.
+    """
+    if file_extension == ".txt":
+        if b"\x00" in head:
+            raise UploadRejected("File content does not look like plain text.")
+        return
+    signatures = MAGIC_BYTES.get(file_extension, [])
+    if not any(head.startswith(sig) for sig in signatures):
+        raise UploadRejected(f"File content does not match the {file_extension} extension.")
+
+
+def too_large(max_size: int) -> UploadRejected:
+    return UploadRejected(f"File is larger than the {max_size // MB}MB limit.", status_code=413)
+
+
+# ------------------ Writing one file ------------------ #
+class _FileWriter:
+    """Writes one file part to disk off the event loop, hashing and validating it on the way."""
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.extension = os.path.splitext(path)[1].lower()
+        self.max_size = max_size
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.chunks: Optional[List[bytes]] = []
+        self.out = None
+
+    async def write(self, chunk: bytes):
+        if self.out is None:
+            self.out = await asyncio.to_thread(open, self.path, "wb")
+        if len(self.head) < MAGIC_LENGTH:
+            self.head += chunk[:MAGIC_LENGTH - len(self.head)]
+            if len(self.head) == MAGIC_LENGTH:
+                check_magic_bytes(self.head, self.extension)
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise too_large(self.max_size)
+        self.sha256.update(chunk)
+        if self.chunks is not None:
+            if self.size <= MEMORY_CACHE_SIZE:
+                self.chunks.append(chunk)
+            else:
+                self.chunks = None
+        await asyncio.to_thread(self.out.write, chunk)
+
+    async def finish(self) -> Dict[str, Any]:
+        if self.size == 0:
+            raise UploadRejected("Uploaded file is empty.")
+        if len(self.head) < MAGIC_LENGTH:
+            check_magic_bytes(self.head, self.extension)
+        await asyncio.to_thread(self.out.close)
+        return {
+            "size": self.size,
+            "sha256": self.sha256.hexdigest(),
+            "content": b"".join(self.chunks) if self.chunks is not None else None,
+        }
+
+    async def discard(self):
+        if self.out is not None:
+            await asyncio.to_thread(self.out.close)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ------------------ Streaming multipart ------------------ #
+async def stream_multipart(request, destination: Callable[[str], Tuple[str, str]],
+                           max_size: int = MAX_UPLOAD_SIZE,
+                           max_request_size: int = MAX_UPLOAD_SIZE + FORM_OVERHEAD) -> Tuple[Dict[str, str], List[Dict]]:
+    """
+    Parses a multipart/form-data request straight from `request.stream()`, writing
+    each file to disk as its bytes arrive: nothing is spooled, and a body over
+    `max_request_size` (by Content-Length, or once that many bytes have arrived)
+    is rejected with 413 without reading the rest.
+
+    `destination(filename)` returns (id, path) for a file, or raises UploadRejected.
+    Returns (form fields, files). Each file is a dict with `field`, `filename`,
+    `content_type`, `id`, `file_path`, `size`, `sha256` and `content` (the raw bytes
+    if the file fits in MEMORY_CACHE_SIZE), or with `error`/`status_code` if that
+    file was rejected; a rejected file is not left on disk.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected("Expected a multipart/form-data upload.")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_request_size:
+        raise UploadRejected(f"Upload is larger than the {max_request_size // MB}MB limit.", status_code=413)
+
+    # The parser is synchronous: its callbacks queue events that are handled
+    # (with awaits for the disk writes) after each network chunk
+    events = []
+    header = {"field": b"", "value": b"", "headers": {}}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        header["headers"][header["field"].lower()] = header["value"]
+        header["field"], header["value"] = b"", b""
+
+    def on_headers_finished():
+        events.append(("part", header["headers"]))
+        header["headers"] = {}
+
+    callbacks = {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = multipart.MultipartParser(boundary, callbacks)
+
+    fields: Dict[str, str] = {}
+    files: List[Dict] = []
+    part: Optional[Dict] = None
+    writer: Optional[_FileWriter] = None
+    received = 0
+
+    async def reject(error: UploadRejected):
+        nonlocal writer
+        if writer is not None:
+            await writer.discard()
+            writer = None
+        part.update(error=str(error), status_code=error.status_code)
+
+    async def handle(kind: str, value):
+        nonlocal part, writer
+        if kind == "part":
+            _, options = parse_options_header(value.get(b"content-disposition", b""))
+            name = options.get(b"name", b"").decode("utf-8", "replace")
+            filename = options.get(b"filename")
+            part = {"field": name}
+            if filename is None:
+                part["value"] = b""
+                return
+            part.update(filename=os.path.basename(filename.decode("utf-8", "replace")),
+                        content_type=value.get(b"content-type", b"").decode("latin-1") or None)
+            files.append(part)
+            try:
+                if not part["filename"]:
+                    raise UploadRejected("No file selected")
+                part["id"], part["file_path"] = destination(part["filename"])
+                writer = _FileWriter(part["file_path"], max_size)
+            except UploadRejected as e:
+                await reject(e)
+        elif kind == "data":
+            if "value" in part:
+                part["value"] += value
+                if len(part["value"]) > MAX_FIELD_SIZE:
+                    raise UploadRejected(f"Form field '{part['field']}' is too large.", status_code=413)
+            elif writer is not None:
+                try:
+                    await writer.write(value)
+                except UploadRejected as e:
+                    await reject(e)  # the rest of this file is skipped
+        elif kind == "end":
+            if "value" in part:
+                fields[part["field"]] = part.pop("value").decode("utf-8", "replace")
+            elif writer is not None:
+                try:
+                    part.update(await writer.finish())
+                except UploadRejected as e:
+                    await reject(e)
+                writer = None
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_request_size:
+                raise UploadRejected(f"Upload is larger than the {max_request_size // MB}MB limit.",
+                                     status_code=413)
+            parser.write(chunk)
+            for event in events:
+                await handle(*event)
+            events.clear()
+        parser.finalize()
+        for event in events:
+            await handle(*event)
+        if writer is not None:
+            raise UploadRejected("Upload ended in the middle of a file.")
+    except BaseException:
+        if writer is not None:
+            await writer.discard()
+        discard_files(files)
+        raise
+    return fields, files
+
+
+def discard_files(files: List[Dict]):
+    """Deletes the files written for these parts (e.g. when the request as a whole is rejected)."""
+    for file in files:
+        path = file.get("file_path")
+        if path and "error" not in file and os.path.exists(path):
+            os.remove(path)
+
+
+# ------------------ In-memory copies ------------------ #
+class ContentCache:
+    """
+    Raw bytes of recent small uploads, so the first extraction can skip the disk.
+    Bounded by MEMORY_CACHE_TOTAL (oldest dropped first) and MEMORY_CACHE_TTL;
+    a dropped upload is simply read from its file instead.
+    """
+
+    def __init__(self, max_bytes: int = MEMORY_CACHE_TOTAL, ttl: float = MEMORY_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._items: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _drop(self, key: str):
+        content, _ = self._items.pop(key)
+        self.bytes -= len(content)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._items:
+            key, (_, expires) = next(iter(self._items.items()))
+            if expires > now:
+                break
+            self._drop(key)
+
+    def put(self, key: str, content: Optional[bytes]):
+        if not content or len(content) > self.max_bytes:
+            return
+        with self._lock:
+            self._expire()
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (content, time.monotonic() + self.ttl)
+            self.bytes += len(content)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+
+    def pop(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._expire()
+            if key not in self._items:
+                return None
+            content, _ = self._items[key]
+            self._drop(key)
+            return content
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire()
+            return {"uploads": len(self._items), "bytes": self.bytes}
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+WebSocket chat load generator.
+
+Creates N RAG sessions, opens one /ws/{session_id} connection per session and
+replays a question script at a target rate. Ramps N up until the latency SLO
+or error budget breaks, then reports the last level that held.
+
+Usage (everything local, app and mock providers spawned automatically):
+    python ws_loadgen.py --spawn --start 1 --max 256 --slo-p95-ms 3000
+
+Against an already running app:
+    python ws_loadgen.py --base-url http://127.0.0.1:8000 --rate 0.5 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_FIXTURE = os.path.join(os.path.dirname(BACKEND_DIR),
+                           "Mr_Vijay_Agarwal_Ors_vs_Harinarayan_G_Bajaj_Ors_on_27_February_2013.PDF")
+
+DEFAULT_QUESTIONS = [
+    "Who are the parties in this case?",
+    "What was the date of the judgment?",
+    "Which sections of which Act were discussed?",
+    "What was the court's final decision?",
+    "Summarise the arguments of the appellant.",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# ------------------ Local stack ------------------ #
+def wait_until_up(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=2)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_stack(app_port: int, mock_port: int, mock_args: List[str]) -> List[subprocess.Popen]:
+    """Starts mock_providers.py and the app pointed at it."""
+    mock = subprocess.Popen([sys.executable, "mock_providers.py", "--port", str(mock_port)] + mock_args,
+                            cwd=BACKEND_DIR)
+    wait_until_up(f"http://127.0.0.1:{mock_port}/mock/stats")
+
+    env = dict(os.environ,
+               GEMINI_API_BASE=f"http://127.0.0.1:{mock_port}",
+               GROQ_API_BASE=f"http://127.0.0.1:{mock_port}",
+               GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "loadtest"),
+               GROQ_API_KEY=os.getenv("GROQ_API_KEY", "loadtest"))
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port),
+                            "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+    wait_until_up(f"http://127.0.0.1:{app_port}/sessions")
+    return [app, mock]
+
+
+# ------------------ Load generation ------------------ #
+async def create_sessions(base_url: str, count: int, concurrency: int = 8) -> List[str]:
+    """Uploads the fixture PDF and creates a RAG session, `count` times."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(client: httpx.AsyncClient) -> str:
+        async with semaphore:
+            with open(PDF_FIXTURE, "rb") as f:
+                response = await client.post(f"{base_url}/upload",
+                                             files={"file": (os.path.basename(PDF_FIXTURE), f, "application/pdf")})
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+            response = await client.post(f"{base_url}/create-rag/{session_id}")
+            response.raise_for_status()
+            return session_id
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        return await asyncio.gather(*(create(client) for _ in range(count)))
+
+
+async def run_client(ws_url: str, questions: List[str], rate: float, duration: float,
+                     results: Dict, rng: random.Random):
+    """
+    One chat user: connect, then ask questions with exponential think time.
+    Records the handshake time (up to the server's "ready" message), the time from
+    sending the first question to its answer, and every answer's latency.
+    """
+    start = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, max_size=None, open_timeout=30) as websocket:
+            ready = await websocket.recv()
+            results["connect_ms"].append((time.perf_counter() - start) * 1000)
+            if ready.startswith("Error"):
+                results["errors"] += 1
+                return
+
+            end = time.perf_counter() + duration
+            i = rng.randrange(len(questions))
+            first = True
+            while time.perf_counter() < end:
+                sent = time.perf_counter()
+                await websocket.send(questions[i % len(questions)])
+                answer = await websocket.recv()
+                answer_ms = (time.perf_counter() - sent) * 1000
+                results["answer_ms"].append(answer_ms)
+                if first:
+                    results["first_answer_ms"].append(answer_ms)
+                    first = False
+                results["questions"] += 1
+                if answer.startswith("Error"):
+                    results["errors"] += 1
+                i += 1
+                await asyncio.sleep(rng.expovariate(rate) if rate > 0 else 0)
+    except Exception as e:
+        results["errors"] += 1
+        results["connection_failures"].append(f"{type(e).__name__}: {e}")
+
+
+async def run_level(base_url: str, session_ids: List[str], questions: List[str], rate: float,
+                    duration: float, seed: int) -> Dict:
+    ws_base = base_url.replace("http://", "ws://").replace("https://", "wss://")
+    results = {"connect_ms": [], "first_answer_ms": [], "answer_ms": [], "questions": 0, "errors": 0,
+               "connection_failures": []}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(f"{ws_base}/ws/{session_id}", questions, rate, duration, results, random.Random(seed + n))
+        for n, session_id in enumerate(session_ids)
+    ))
+    elapsed = time.perf_counter() - started
+    attempts = results["questions"] + len(results["connection_failures"])
+    return {
+        "connections": len(session_ids),
+        "questions": results["questions"],
+        "throughput_qps": round(results["questions"] / elapsed, 3),
+        "error_rate": round(results["errors"] / attempts, 4) if attempts else 1.0,
+        "connect_p95_ms": round(percentile(results["connect_ms"], 95), 1),
+        "first_answer_p50_ms": round(percentile(results["first_answer_ms"], 50), 1),
+        "first_answer_p95_ms": round(percentile(results["first_answer_ms"], 95), 1),
+        "answer_p50_ms": round(percentile(results["answer_ms"], 50), 1),
+        "answer_p95_ms": round(percentile(results["answer_ms"], 95), 1),
+        "answer_p99_ms": round(percentile(results["answer_ms"], 99), 1),
+        "connection_failures": results["connection_failures"][:5],
+    }
+
+
+async def ramp(args, questions: List[str]) -> Dict:
+    levels = []
+    session_ids: List[str] = []
+    sustained: Optional[Dict] = None
+    connections = args.start
+
+    while connections <= args.max:
+        if len(session_ids) < connections:
+            session_ids += await create_sessions(args.base_url, connections - len(session_ids))
+        level = await run_level(args.base_url, session_ids[:connections], questions,
+                                args.rate, args.duration, args.seed)
+        levels.append(level)
+        print(f"{connections:>5} conns | {level['throughput_qps']:>7.2f} q/s | "
+              f"answer p50 {level['answer_p50_ms']:>8.1f} ms p95 {level['answer_p95_ms']:>8.1f} ms | "
+              f"first answer p95 {level['first_answer_p95_ms']:>8.1f} ms | errors {level['error_rate']:.2%}")
+
+        if level["answer_p95_ms"] > args.slo_p95_ms or level["error_rate"] > args.max_error_rate:
+            print(f"SLO broken at {connections} connections")
+            break
+        sustained = level
+        connections = max(connections + 1, int(connections * args.factor))
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "questions"},
+        "levels": levels,
+        "max_sustained_connections": sustained["connections"] if sustained else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent WebSocket chat load generator.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="Start the app and mock providers locally.")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--mock-latency-ms", type=float, default=800)
+    parser.add_argument("--questions", help="File with one question per line.")
+    parser.add_argument("--rate", type=float, default=0.2, help="Questions per second per connection.")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per load level.")
+    parser.add_argument("--start", type=int, default=1, help="Initial number of connections.")
+    parser.add_argument("--max", type=int, default=256, help="Maximum number of connections.")
+    parser.add_argument("--factor", type=float, default=2.0, help="Connection multiplier between levels.")
+    parser.add_argument("--slo-p95-ms", type=float, default=5000, help="p95 answer latency SLO.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    processes = []
+    try:
+        if args.spawn:
+            port = int(args.base_url.rsplit(":", 1)[-1])
+            processes = spawn_stack(port, args.mock_port, ["--latency-ms", str(args.mock_latency_ms),
+                                                           "--dist", "lognormal"])
+        results = asyncio.run(ramp(args, questions))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    print(f"\nMax sustained connections within SLO: {results['max_sustained_connections']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()